@@ -0,0 +1,189 @@
+# api/authentication.py
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from .models import Usuario
+
+# Atributo del HttpRequest donde se guarda el Usuario ya resuelto: (correo, Usuario o None)
+USUARIO_ATTR = '_usuario_condominio'
+
+
+def get_usuario(request) -> Optional[Usuario]:
+    """
+    Usuario del condominio (con su Rol) que corresponde al usuario autenticado.
+
+    Se consulta una sola vez por request (con select_related del rol) y se
+    guarda en el HttpRequest, así los permisos, get_queryset, perform_create y
+    la bitácora comparten el mismo objeto. Funciona con el Request de DRF o
+    con el HttpRequest de Django.
+    """
+    http_request = getattr(request, '_request', request)
+    user = getattr(request, 'user', None)
+    email = user.email if user is not None and user.is_authenticated else None
+
+    cached = getattr(http_request, USUARIO_ATTR, None)
+    if cached is not None and cached[0] == email:
+        return cached[1]
+
+    usuario = None
+    if email:
+        usuario = Usuario.objects.select_related('idrol').filter(correo=email).first()
+    setattr(http_request, USUARIO_ATTR, (email, usuario))
+    return usuario
+
+
+def require_usuario(request) -> Usuario:
+    """Como get_usuario, pero lanza Usuario.DoesNotExist si no hay Usuario (igual que .get())"""
+    usuario = get_usuario(request)
+    if usuario is None:
+        raise Usuario.DoesNotExist("El usuario autenticado no está registrado en el catálogo")
+    return usuario
+
+
+def es_admin(request) -> bool:
+    """True si el usuario autenticado tiene un rol de tipo 'admin'"""
+    usuario = get_usuario(request)
+    return bool(usuario and usuario.idrol and usuario.idrol.tipo == 'admin')
+
+
+# (User, Token, Usuario o None)
+TokenEntry = Tuple[object, Token, Optional[Usuario]]
+
+
+class TokenCache:
+    """
+    token -> (User, Token, Usuario) con TTL. Por defecto es un LRU en memoria
+    del proceso; con TOKEN_CACHE_SHARED usa el cache de Django (compartido
+    entre procesos, así la invalidación llega a todos). El TTL acota cuánto
+    puede vivir una entrada en otro proceso que no se enteró de un cambio.
+    """
+
+    def __init__(self, ttl_seconds: int = 60, max_entries: int = 10000, shared_alias: Optional[str] = None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.shared_alias = shared_alias
+        self._entries: "OrderedDict[str, Tuple[float, TokenEntry]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def _shared(self):
+        return caches[self.shared_alias] if self.shared_alias else None
+
+    def _shared_key(self, key: str) -> str:
+        return f"authtoken:{key}"
+
+    def get(self, key: str) -> Optional[TokenEntry]:
+        if self._shared is not None:
+            return self._shared.get(self._shared_key(key))
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, entry = item
+            if time.monotonic() > expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: TokenEntry):
+        if self._shared is not None:
+            self._shared.set(self._shared_key(key), entry, self.ttl_seconds)
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete_many(self, keys: Iterable[str]):
+        keys = list(keys)
+        if self._shared is not None:
+            self._shared.delete_many([self._shared_key(key) for key in keys])
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def delete_where(self, predicate):
+        """Borra las entradas locales que cumplen `predicate(entry)`"""
+        with self._lock:
+            for key in [key for key, (_, entry) in self._entries.items() if predicate(entry)]:
+                del self._entries[key]
+
+
+token_cache = TokenCache(
+    settings.TOKEN_CACHE_TTL,
+    settings.TOKEN_CACHE_MAX_ENTRIES,
+    'default' if settings.TOKEN_CACHE_SHARED else None
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication que no consulta authtoken_token + auth_user en cada
+    llamada: guarda el usuario del token (y su Usuario con el Rol) en
+    `token_cache`. Las señales de api/signals.py invalidan las entradas al
+    cerrar sesión, borrar el usuario o cambiar su rol.
+
+    Las instancias del cache las comparten todos los requests (y hilos) del
+    proceso: cada request recibe su propia copia del User, el Token y el
+    Usuario, así lo que una vista les cambie no se filtra a otros requests.
+    """
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            user, token = result
+            entry = token_cache.get(token.key)
+            if entry is not None:
+                # get_usuario no vuelve a consultar el Usuario en este request (el Rol se comparte: solo lectura)
+                http_request = getattr(request, '_request', request)
+                setattr(http_request, USUARIO_ATTR, (user.email, copy.copy(entry[2])))
+        return result
+
+    def authenticate_credentials(self, key):
+        entry = token_cache.get(key)
+        if entry is None:
+            model = self.get_model()
+            try:
+                token = model.objects.select_related('user').get(key=key)
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            if not token.user.is_active:
+                raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+            usuario = Usuario.objects.select_related('idrol').filter(correo=token.user.email).first()
+            entry = (token.user, token, usuario)
+            token_cache.set(key, entry)
+
+        user, token, _usuario = entry
+        user, token = copy.copy(user), copy.copy(token)
+        token.user = user
+        return user, token
+
+
+def invalidate_tokens(keys: Iterable[str]):
+    token_cache.delete_many(keys)
+
+
+def invalidate_user(user_id: int):
+    """Todas las entradas de un usuario de Django (cambió, se desactivó o se borró)"""
+    invalidate_tokens(Token.objects.filter(user_id=user_id).values_list('key', flat=True))
+    token_cache.delete_where(lambda entry: entry[0].pk == user_id)
+
+
+def invalidate_usuarios(usuarios: Iterable[Usuario]):
+    """Entradas de estos Usuario del condominio (cambió su rol, su correo o se borraron)"""
+    usuarios = list(usuarios)
+    codigos = {usuario.pk for usuario in usuarios}
+    correos = {usuario.correo for usuario in usuarios if usuario.correo}
+    invalidate_tokens(Token.objects.filter(user__email__in=correos).values_list('key', flat=True))
+    token_cache.delete_where(lambda entry: entry[2] is not None and entry[2].pk in codigos)
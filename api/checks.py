@@ -0,0 +1,43 @@
+# api/checks.py
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+
+# Backends de cache que viven dentro de cada proceso: lo que se invalida en uno no llega a los demás
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register()
+def cache_compartido(app_configs, **kwargs):
+    """
+    El cache de tokens (TOKEN_CACHE_SHARED) y la versión de los catálogos se
+    invalidan a través del cache de Django: con un cache local por proceso
+    solo son correctos si hay un único proceso web.
+    """
+    if settings.CACHES['default']['BACKEND'] not in LOCAL_CACHE_BACKENDS:
+        return []
+
+    errors = []
+    if settings.TOKEN_CACHE_SHARED:
+        errors.append(Error(
+            "TOKEN_CACHE_SHARED necesita un cache compartido entre procesos",
+            hint="Configurar CACHE_URL (p. ej. redis://host:6379/0) o quitar TOKEN_CACHE_SHARED.",
+            id='api.E001',
+        ))
+    if settings.WEB_CONCURRENCY > 1:
+        errors.append(Error(
+            f"WEB_CONCURRENCY={settings.WEB_CONCURRENCY} con un cache local por proceso: los cambios de "
+            f"catálogos (Pagos, Rol...) y los cierres de sesión no llegarían a los demás procesos",
+            hint="Configurar CACHE_URL o usar un solo proceso (WEB_CONCURRENCY=1).",
+            id='api.E002',
+        ))
+    elif not settings.DEBUG:
+        errors.append(Warning(
+            "Cache de Django local al proceso: la invalidación de catálogos y tokens solo es correcta con un "
+            "único proceso web",
+            hint="Configurar CACHE_URL si se corre más de un proceso.",
+            id='api.W001',
+        ))
+    return errors
@@ -0,0 +1,23 @@
+# api/hashers.py
+"""
+Hashers de contraseñas con el costo configurable por entorno (ver
+PASSWORD_HASHER_* en settings). Al subir o bajar el costo, check_password
+detecta que el hash guardado usa otros parámetros y lo regenera en el
+siguiente login; si no cambió nada no se vuelve a hashear ni a guardar.
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, PBKDF2PasswordHasher
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """Argon2id (requiere argon2-cffi) con time/memory cost y paralelismo de settings"""
+    # Mismo algoritmo que el de Django: los hashes existentes se verifican igual
+    algorithm = 'argon2'
+    time_cost = settings.PASSWORD_HASHER_ARGON2['time_cost']
+    memory_cost = settings.PASSWORD_HASHER_ARGON2['memory_cost']
+    parallelism = settings.PASSWORD_HASHER_ARGON2['parallelism']
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 con el número de iteraciones de settings (respaldo sin argon2-cffi)"""
+    iterations = settings.PASSWORD_HASHER_PBKDF2_ITERATIONS
@@ -0,0 +1,15 @@
+# api/management/commands/actualizar_esquema.py
+
+from django.core.management.base import BaseCommand
+from api.schema import ensure_model_schema, schema_changes
+
+
+class Command(BaseCommand):
+    help = ('Crea las columnas e índices agregados a tablas existentes que no tienen migración '
+            '(ver api/schema.py). Es idempotente: se corre en cada despliegue después de migrate.')
+
+    def handle(self, *args, **options):
+        created = []
+        for model, fields, indexes in schema_changes():
+            created += ensure_model_schema(model, fields, indexes, log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(f"Esquema al día ({len(created)} cambios aplicados)"))
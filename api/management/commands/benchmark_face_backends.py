@@ -0,0 +1,104 @@
+# api/management/commands/benchmark_face_backends.py
+
+import os
+import time
+import numpy as np
+from PIL import Image
+from django.core.management.base import BaseCommand, CommandError
+from api.services.face_backends import FACE_BACKENDS, get_face_backend
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+class Command(BaseCommand):
+    help = ('Compara los backends faciales sobre un directorio etiquetado (una carpeta por persona): '
+            'latencia de detección y embedding, y precisión leave-one-out con la tolerancia de cada backend.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', required=True, help='Directorio con una subcarpeta de imágenes por persona.')
+        parser.add_argument('--backends', nargs='+', default=list(FACE_BACKENDS),
+                            help=f"Backends a comparar (por defecto: {' '.join(FACE_BACKENDS)}).")
+
+    def handle(self, *args, **options):
+        samples = self._load_samples(options['images'])
+        if not samples:
+            raise CommandError(f"No se encontraron imágenes en {options['images']}")
+        self.stdout.write(f"{len(samples)} imágenes de {len({label for label, _ in samples})} personas")
+
+        for name in options['backends']:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\nBackend '{name}'"))
+            try:
+                backend = get_face_backend(name)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"  No se pudo inicializar: {e}"))
+                continue
+            self._benchmark(backend, samples)
+
+    def _load_samples(self, root):
+        samples = []
+        for label in sorted(os.listdir(root)):
+            folder = os.path.join(root, label)
+            if not os.path.isdir(folder):
+                continue
+            for filename in sorted(os.listdir(folder)):
+                if filename.lower().endswith(IMAGE_EXTENSIONS):
+                    image = Image.open(os.path.join(folder, filename)).convert('RGB')
+                    samples.append((label, np.array(image)))
+        return samples
+
+    def _benchmark(self, backend, samples):
+        detect_ms, encode_ms = [], []
+        labels, embeddings = [], []
+        missed = 0
+
+        for label, image in samples:
+            start = time.perf_counter()
+            boxes = backend.detect(image)
+            detected = time.perf_counter()
+            detect_ms.append((detected - start) * 1000)
+            if not boxes:
+                missed += 1
+                continue
+
+            # La cara más grande de la imagen es la de la persona etiquetada
+            box = max(boxes, key=lambda b: (b[2] - b[0]) * (b[1] - b[3]))
+            encodings = backend.encode(image, [box])
+            encode_ms.append((time.perf_counter() - detected) * 1000)
+            if encodings:
+                labels.append(label)
+                embeddings.append(encodings[0])
+
+        self.stdout.write(f"  Detección: media {np.mean(detect_ms):.1f} ms, p95 {np.percentile(detect_ms, 95):.1f} ms")
+        if encode_ms:
+            self.stdout.write(f"  Embedding: media {np.mean(encode_ms):.1f} ms, p95 {np.percentile(encode_ms, 95):.1f} ms")
+        self.stdout.write(f"  Sin cara detectada: {missed}/{len(samples)}")
+
+        if len(embeddings) < 2:
+            self.stdout.write(self.style.WARNING("  Muy pocos embeddings para evaluar precisión"))
+            return
+
+        known = np.asarray(embeddings)
+        labels = np.asarray(labels)
+        rank1 = accepted = false_accepts = evaluated = 0
+        for i, embedding in enumerate(known):
+            if np.count_nonzero(labels == labels[i]) < 2:
+                continue
+            evaluated += 1
+            distances = backend.distance(known, embedding)
+            distances[i] = np.inf
+            nearest = int(np.argmin(distances))
+            same_person = labels[nearest] == labels[i]
+            rank1 += same_person
+            if distances[nearest] <= backend.tolerance:
+                accepted += same_person
+                false_accepts += not same_person
+
+        if not evaluated:
+            self.stdout.write(self.style.WARNING("  Ninguna persona tiene dos imágenes válidas"))
+            return
+
+        self.stdout.write(
+            f"  Leave-one-out ({evaluated} consultas, métrica {backend.metric}, tolerancia {backend.tolerance}): "
+            f"rank-1 {rank1 / evaluated:.1%}, aceptados correctos {accepted / evaluated:.1%}, "
+            f"falsos aceptados {false_accepts / evaluated:.1%}"
+        )
@@ -0,0 +1,67 @@
+# api/management/commands/benchmark_image_presets.py
+
+import io
+import os
+import time
+import numpy as np
+from PIL import Image
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from api.services.image_processing import IMAGE_PRESETS, ImagePreset
+
+
+class Command(BaseCommand):
+    help = ('Compara tiempo y tamaño de salida de los presets de imagen contra el procesado anterior '
+            '(decodificación completa + LANCZOS + optimize) con imágenes reales o sintéticas.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', default=None, help='Directorio con imágenes (por defecto, sintéticas).')
+        parser.add_argument('--count', type=int, default=20, help='Imágenes sintéticas a generar.')
+        parser.add_argument('--size', type=int, nargs=2, default=[1920, 1080], help='Tamaño de las sintéticas.')
+        parser.add_argument('--repeat', type=int, default=3, help='Pasadas sobre el conjunto.')
+
+    def handle(self, *args, **options):
+        samples = self._load_samples(options)
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{len(samples)} imágenes, {sum(len(s) for s in samples) / len(samples) / 1024:.0f} KB de media"
+        ))
+
+        ai_settings = settings.AI_IMAGE_SETTINGS
+        # Lo que hacía SupabaseStorageService antes de los presets
+        legacy = ImagePreset('anterior', ai_settings['THUMBNAIL_SIZE'], ai_settings['JPEG_QUALITY'],
+                             optimize=True, resample='lanczos', draft=False)
+        for preset in [legacy] + list(IMAGE_PRESETS.values()):
+            self._run(preset, samples, options['repeat'])
+
+    def _load_samples(self, options):
+        if options['images']:
+            directory = options['images']
+            return [open(os.path.join(directory, name), 'rb').read() for name in sorted(os.listdir(directory))
+                    if name.lower().endswith(('.jpg', '.jpeg', '.png'))]
+
+        rng = np.random.default_rng(42)
+        width, height = options['size']
+        samples = []
+        for _ in range(options['count']):
+            # Gradiente con ruido: se comprime parecido a una foto de cámara
+            gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+            pixels = np.clip(gradient + rng.normal(0, 25, size=(height, width, 3)), 0, 255).astype(np.uint8)
+            output = io.BytesIO()
+            Image.fromarray(pixels).save(output, format='JPEG', quality=90)
+            samples.append(output.getvalue())
+        return samples
+
+    def _run(self, preset, samples, repeat):
+        elapsed = []
+        sizes = []
+        for _ in range(repeat):
+            for data in samples:
+                start = time.perf_counter()
+                result = preset.process(data)
+                elapsed.append(time.perf_counter() - start)
+                sizes.append(len(result) if result else 0)
+        elapsed_ms = np.array(elapsed) * 1000
+        self.stdout.write(
+            f"  {preset.name:<10} media={elapsed_ms.mean():8.2f} ms  p95={np.percentile(elapsed_ms, 95):8.2f} ms  "
+            f"salida={np.mean(sizes) / 1024:7.1f} KB"
+        )
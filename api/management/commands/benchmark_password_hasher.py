@@ -0,0 +1,60 @@
+# api/management/commands/benchmark_password_hasher.py
+
+import time
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ('Mide cuánto tarda una verificación de contraseña con distintos costos del hasher '
+            'y sugiere el mayor que entra en el objetivo de tiempo por login.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target-ms', type=float, default=100.0, help='Tiempo objetivo por verificación.')
+        parser.add_argument('--repeat', type=int, default=5, help='Verificaciones por costo.')
+
+    def handle(self, *args, **options):
+        target = options['target_ms']
+        repeat = options['repeat']
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Hasher activo: {settings.PASSWORD_HASHERS[0]}"))
+
+        if settings.ARGON2_AVAILABLE:
+            from django.contrib.auth.hashers import Argon2PasswordHasher
+            memory_cost = settings.PASSWORD_HASHER_ARGON2['memory_cost']
+            parallelism = settings.PASSWORD_HASHER_ARGON2['parallelism']
+            self.stdout.write(f"Argon2id (memory_cost={memory_cost} KiB, parallelism={parallelism}):")
+            candidates = []
+            for time_cost in (1, 2, 3, 4, 6, 8):
+                hasher = type('Argon2Candidate', (Argon2PasswordHasher,), {
+                    'time_cost': time_cost, 'memory_cost': memory_cost, 'parallelism': parallelism})()
+                candidates.append((f"time_cost={time_cost}", hasher))
+            self._calibrate(candidates, target, repeat, 'PASSWORD_ARGON2_TIME_COST')
+        else:
+            self.stdout.write(self.style.WARNING("argon2-cffi no está instalado: solo se mide PBKDF2"))
+
+        self.stdout.write("PBKDF2-SHA256:")
+        candidates = []
+        for iterations in (100_000, 200_000, 400_000, 600_000, 870_000, 1_200_000):
+            hasher = type('PBKDF2Candidate', (PBKDF2PasswordHasher,), {'iterations': iterations})()
+            candidates.append((f"iterations={iterations}", hasher))
+        self._calibrate(candidates, target, repeat, 'PASSWORD_PBKDF2_ITERATIONS')
+
+    def _calibrate(self, candidates, target, repeat, env_name):
+        best = None
+        for label, hasher in candidates:
+            encoded = hasher.encode('contraseña-de-prueba', hasher.salt())
+            elapsed = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                hasher.verify('contraseña-de-prueba', encoded)
+                elapsed.append(time.perf_counter() - start)
+            elapsed_ms = np.array(elapsed) * 1000
+            self.stdout.write(f"  {label:<20} media={elapsed_ms.mean():8.2f} ms  p95={np.percentile(elapsed_ms, 95):8.2f} ms")
+            if elapsed_ms.mean() <= target:
+                best = label
+        if best:
+            self.stdout.write(self.style.SUCCESS(f"  Sugerido para {target:.0f} ms: {best} ({env_name})"))
+        else:
+            self.stdout.write(self.style.WARNING(f"  Ningún costo entra en {target:.0f} ms"))
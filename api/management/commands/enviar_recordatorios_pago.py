@@ -7,6 +7,7 @@ from django.conf import settings
 # Se asegura de que todos los modelos necesarios estén importados
 from api.models import Usuario, Pagos, Factura, Notificaciones, Envio
 from django.utils import timezone
+from api.services.catalog_cache import catalog_all
 
 
 class Command(BaseCommand):
@@ -17,8 +18,8 @@ class Command(BaseCommand):
 
         today = timezone.now().date()
 
-        cargos_mensuales = Pagos.objects.all()
-        if not cargos_mensuales.exists():
+        cargos_mensuales = catalog_all(Pagos)
+        if not cargos_mensuales:
             self.stdout.write("No hay cargos mensuales configurados en el catálogo de Pagos.")
             return
 
@@ -0,0 +1,54 @@
+# api/management/commands/generar_encodings_faciales.py
+
+import io
+import requests
+import numpy as np
+from PIL import Image
+from django.core.management.base import BaseCommand, CommandError
+from api.models import PerfilFacial
+from api.services.face_backends import FACE_BACKENDS, get_face_backend, read_encoding, encoding_fields
+
+
+class Command(BaseCommand):
+    help = ('Genera los encodings de un backend facial para los perfiles existentes a partir de su imagen, '
+            'para poder cambiar de backend (o compararlos) sin volver a registrar a los residentes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', required=True, choices=list(FACE_BACKENDS))
+        parser.add_argument('--force', action='store_true', help='Recalcula también los perfiles que ya tienen encoding.')
+
+    def handle(self, *args, **options):
+        name = options['backend']
+        try:
+            backend = get_face_backend(name)
+        except Exception as e:
+            raise CommandError(f"No se pudo inicializar el backend '{name}': {e}")
+
+        generated = skipped = failed = 0
+        for perfil in PerfilFacial.objects.filter(activo=True).exclude(imagen_url__isnull=True):
+            if not options['force'] and read_encoding(perfil, name) is not None:
+                skipped += 1
+                continue
+            try:
+                response = requests.get(perfil.imagen_url, timeout=30)
+                response.raise_for_status()
+                image = np.array(Image.open(io.BytesIO(response.content)).convert('RGB'))
+
+                encodings = backend.encode(image, backend.detect(image)[:1])
+                if not encodings:
+                    self.stdout.write(self.style.WARNING(f"Perfil {perfil.id}: no se detectó ninguna cara"))
+                    failed += 1
+                    continue
+
+                fields = encoding_fields(name, encodings[0], perfil)
+                for field, value in fields.items():
+                    setattr(perfil, field, value)
+                perfil.save(update_fields=list(fields))
+                generated += 1
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"Perfil {perfil.id}: {e}"))
+                failed += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Backend '{name}': {generated} generados, {skipped} ya existentes, {failed} con error"
+        ))
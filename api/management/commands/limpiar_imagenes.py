@@ -0,0 +1,123 @@
+# api/management/commands/limpiar_imagenes.py
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from api.models import ReconocimientoFacial, DeteccionPlaca
+from api.services.storage_backends import get_storage_backend
+from api.services.supabase_storage import PATH_REFERENCES
+
+# (carpeta, tipo de evento) -> modelo y filtro de las filas de ese tipo
+RETENTION_TARGETS = {
+    ('facial', 'residente'): (ReconocimientoFacial, {'es_residente': True}),
+    ('facial', 'desconocido'): (ReconocimientoFacial, {'es_residente': False}),
+    ('plates', 'autorizada'): (DeteccionPlaca, {'es_autorizado': True}),
+    ('plates', 'no_autorizada'): (DeteccionPlaca, {'es_autorizado': False}),
+}
+
+
+class Command(BaseCommand):
+    help = ('Borra las imágenes de detección más viejas que la retención configurada (IMAGE_RETENTION_DAYS) '
+            'y limpia sus rutas en la BD. Conserva las ligadas a reportes de seguridad sin revisar y las que '
+            'otra fila sigue usando. Se puede ejecutar periódicamente: cada corrida sigue donde quedó la anterior.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=500, help='Filas por lote.')
+        parser.add_argument('--delete-chunk', type=int, default=100, help='Objetos por pedido de borrado.')
+        parser.add_argument('--concurrency', type=int, default=4, help='Pedidos de borrado en paralelo.')
+        parser.add_argument('--limit', type=int, default=None, help='Máximo de filas a procesar en esta corrida.')
+        parser.add_argument('--dry-run', action='store_true', help='Solo informa lo que se borraría.')
+
+    def handle(self, *args, **options):
+        self.backend = get_storage_backend()
+        self.options = options
+        retention = settings.AI_IMAGE_SETTINGS['IMAGE_RETENTION_DAYS']
+
+        total_rows = total_objects = total_bytes = 0
+        remaining = options['limit']
+        for folder, events in retention.items():
+            for event, days in events.items():
+                if (folder, event) not in RETENTION_TARGETS:
+                    raise CommandError(f"Retención para un tipo desconocido: {folder}/{event}")
+                if remaining is not None and remaining <= 0:
+                    break
+                model, filters = RETENTION_TARGETS[(folder, event)]
+                rows, objects, reclaimed = self._collect(model, filters, timezone.now() - timedelta(days=days),
+                                                         remaining)
+                if remaining is not None:
+                    remaining -= rows
+                self.stdout.write(
+                    f"{folder}/{event} (> {days} días): {rows} filas, {objects} objetos, "
+                    f"{reclaimed / 1024 / 1024:.2f} MB"
+                )
+                total_rows += rows
+                total_objects += objects
+                total_bytes += reclaimed
+
+        action = 'Se borrarían' if options['dry_run'] else 'Borrados'
+        self.stdout.write(self.style.SUCCESS(
+            f"{action}: {total_objects} objetos de {total_rows} filas, {total_bytes / 1024 / 1024:.2f} MB"
+        ))
+
+    def _expired(self, model, filters, cutoff):
+        return (model.objects
+                .filter(imagen_path__isnull=False, fecha_deteccion__lt=cutoff, **filters)
+                .exclude(reportes__revisado=False)
+                .order_by('pk'))
+
+    def _collect(self, model, filters, cutoff, limit):
+        """Recorre por lotes (por pk) las filas vencidas de un tipo de evento"""
+        rows = objects = reclaimed = 0
+        last_pk = 0
+        while limit is None or rows < limit:
+            size = self.options['batch'] if limit is None else min(self.options['batch'], limit - rows)
+            batch = list(self._expired(model, filters, cutoff)
+                         .filter(pk__gt=last_pk)
+                         .only('pk', 'imagen_path', 'imagenes_derivadas')[:size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            batch_objects, batch_bytes = self._release(model, batch)
+            rows += len(batch)
+            objects += batch_objects
+            reclaimed += batch_bytes
+        return rows, objects, reclaimed
+
+    def _release(self, model, batch):
+        """Borra los objetos de un lote que nadie más usa y limpia las rutas de sus filas"""
+        paths = {row.imagen_path for row in batch}
+        # Con nombres por hash, una fila que se conserva puede apuntar al mismo objeto
+        pks = [row.pk for row in batch]
+        for reference_model, field in PATH_REFERENCES:
+            shared = reference_model.objects.filter(**{f"{field}__in": paths})
+            if reference_model is model:
+                shared = shared.exclude(pk__in=pks)
+            paths -= set(shared.values_list(field, flat=True))
+
+        to_delete = []
+        for row in batch:
+            if row.imagen_path in paths:
+                to_delete.append(row.imagen_path)
+                if row.imagenes_derivadas:
+                    to_delete.extend(json.loads(row.imagenes_derivadas).values())
+        to_delete = sorted(set(to_delete))
+
+        sizes = self.backend.sizes(to_delete)
+        reclaimed = sum(size or 0 for size in sizes.values())
+        if self.options['dry_run']:
+            return len(to_delete), reclaimed
+
+        # Primero el almacenamiento y después la BD: si algo falla, la próxima corrida
+        # vuelve a encontrar estas filas y repite (borrar un objeto inexistente no falla)
+        chunk = self.options['delete_chunk']
+        chunks = [to_delete[i:i + chunk] for i in range(0, len(to_delete), chunk)]
+        with ThreadPoolExecutor(max(1, min(self.options['concurrency'], len(chunks) or 1))) as pool:
+            list(pool.map(self.backend.delete_many, chunks))
+
+        with transaction.atomic():
+            model.objects.filter(pk__in=pks).update(imagen_path=None, imagen_url=None, imagenes_derivadas=None)
+        return len(to_delete), reclaimed
@@ -0,0 +1,51 @@
+# api/management/commands/normalizar_placas.py
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from api.models import Vehiculo, DeteccionPlaca, normalize_plate
+from api.schema import ensure_model_schema, schema_changes
+
+
+class Command(BaseCommand):
+    help = ('Prepara la clave de placa normalizada: crea la columna PlacaNormalizada y sus índices en Vehiculo '
+            'y DeteccionPlaca si faltan (ninguna de las dos la recibe por migración) y rellena la clave.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=1000, help='Filas por lote al rellenar.')
+
+    def handle(self, *args, **options):
+        self._ensure_schema()
+        vehiculos = self._backfill(Vehiculo, 'nro_placa', options['batch'], null=True)
+        detecciones = self._backfill(DeteccionPlaca, 'placa_detectada', options['batch'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Placas normalizadas: {vehiculos} vehículos, {detecciones} detecciones"
+        ))
+
+    def _ensure_schema(self):
+        """Columna e índices de la clave en las dos tablas (los mismos que aplica actualizar_esquema)"""
+        for model, fields, indexes in schema_changes():
+            if 'placa_normalizada' in fields:
+                ensure_model_schema(model, fields, indexes, log=self.stdout.write)
+
+    def _backfill(self, model, source_field: str, batch: int, null: bool = False) -> int:
+        """Recalcula la clave de las filas donde falta o quedó desactualizada"""
+        updated = 0
+        pending = []
+        for row in model.objects.only('pk', source_field, 'placa_normalizada').iterator(chunk_size=batch):
+            key = normalize_plate(getattr(row, source_field))
+            if null:
+                key = key or None
+            if row.placa_normalizada != key:
+                row.placa_normalizada = key
+                pending.append(row)
+            if len(pending) >= batch:
+                updated += self._flush(model, pending)
+        return updated + self._flush(model, pending)
+
+    def _flush(self, model, rows) -> int:
+        count = len(rows)
+        if rows:
+            with transaction.atomic():
+                model.objects.bulk_update(rows, ['placa_normalizada'])
+            rows.clear()
+        return count
@@ -0,0 +1,162 @@
+# api/management/commands/particionar_bitacora.py
+
+import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from api.models import Bitacora
+from api.schema import REPLACED_INDEXES, ensure_model_schema
+
+TABLE = Bitacora._meta.db_table
+DEFAULT_PARTITION = f"{TABLE}_default"
+DATE_COLUMN = Bitacora._meta.get_field('fecha').column
+ID_COLUMN = Bitacora._meta.get_field('id').column
+
+
+def _add_months(day: datetime.date, months: int) -> datetime.date:
+    month = day.month - 1 + months
+    return datetime.date(day.year + month // 12, month % 12 + 1, 1)
+
+
+class Command(BaseCommand):
+    help = ('Bitácora particionada por mes (PostgreSQL). Con --convertir reconstruye la tabla como '
+            'particionada por Fecha y copia las filas; sin él, crea las particiones de los próximos meses '
+            '(correrlo una vez al mes; las filas de ese mes que hayan caído en la partición DEFAULT se mueven '
+            'a la nueva) y el índice (Fecha, Hora, Id) que usan el listado y los reportes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convertir', action='store_true',
+                            help='Convierte la tabla actual en particionada (bloquea la bitácora mientras copia).')
+        parser.add_argument('--meses', type=int, default=3, help='Meses futuros con partición creada de antemano.')
+        parser.add_argument('--conservar-original', action='store_true',
+                            help='Con --convertir, deja la tabla anterior como "Bitacora_anterior" en vez de borrarla.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("El particionado de la bitácora requiere PostgreSQL")
+
+        partitioned = self._is_partitioned()
+        if options['convertir'] and not partitioned:
+            self._convert(options['meses'], options['conservar_original'])
+            partitioned = True
+        elif options['convertir']:
+            self.stdout.write(f'"{TABLE}" ya está particionada')
+
+        if partitioned:
+            today = timezone.now().date().replace(day=1)
+            created = self._create_partitions(today, _add_months(today, options['meses'] + 1))
+            self.stdout.write(f"Particiones nuevas: {created}")
+        else:
+            self.stdout.write(self.style.WARNING(
+                f'"{TABLE}" no está particionada (usar --convertir); solo se asegura el índice'
+            ))
+
+        self._ensure_indexes()
+        self.stdout.write(self.style.SUCCESS("Bitácora lista"))
+
+    # --- esquema ---
+
+    def _is_partitioned(self) -> bool:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [f'"{TABLE}"'])
+            row = cursor.fetchone()
+        if row is None:
+            raise CommandError(f'No existe la tabla "{TABLE}"')
+        return row[0] == 'p'
+
+    def _ensure_indexes(self):
+        # La misma definición que aplica actualizar_esquema (reemplaza el índice anterior sin NULLS LAST)
+        ensure_model_schema(Bitacora, (), [index.name for index in Bitacora._meta.indexes], log=self.stdout.write)
+
+    def _create_partitions(self, start: datetime.date, end: datetime.date) -> int:
+        """Una partición por mes en [start, end); las que ya existen se saltan"""
+        created = 0
+        month = start
+        with connection.cursor() as cursor:
+            while month < end:
+                following = _add_months(month, 1)
+                name = f"{TABLE}_{month:%Y_%m}"
+                cursor.execute("SELECT to_regclass(%s)", [f'"{name}"'])
+                if cursor.fetchone()[0] is None:
+                    self._create_partition(cursor, name, month, following)
+                    created += 1
+                month = following
+        return created
+
+    def _create_partition(self, cursor, name: str, month: datetime.date, following: datetime.date):
+        """
+        Crea la partición de un mes. Si DEFAULT ya tiene filas de ese mes (escritas
+        antes de que existiera la partición) PostgreSQL no deja crearla: se sacan de
+        DEFAULT, se crea la partición y se vuelven a insertar, todo en una transacción.
+        """
+        with transaction.atomic():
+            cursor.execute("SELECT to_regclass(%s)", [f'"{DEFAULT_PARTITION}"'])
+            moved = 0
+            if cursor.fetchone()[0] is not None:
+                # Las escrituras de la bitácora que caerían en DEFAULT esperan a que termine
+                cursor.execute(f'LOCK TABLE "{DEFAULT_PARTITION}" IN ACCESS EXCLUSIVE MODE')
+                cursor.execute(f'CREATE TEMPORARY TABLE "{name}_mover" (LIKE "{TABLE}") ON COMMIT DROP')
+                cursor.execute(
+                    f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" '
+                    f'WHERE "{DATE_COLUMN}" >= %s AND "{DATE_COLUMN}" < %s RETURNING *) '
+                    f'INSERT INTO "{name}_mover" SELECT * FROM moved',
+                    [month, following]
+                )
+                moved = cursor.rowcount
+
+            cursor.execute(
+                f'CREATE TABLE "{name}" PARTITION OF "{TABLE}" FOR VALUES FROM (%s) TO (%s)',
+                [month, following]
+            )
+            if moved:
+                cursor.execute(f'INSERT INTO "{TABLE}" OVERRIDING SYSTEM VALUE SELECT * FROM "{name}_mover"')
+                self.stdout.write(f'{moved} filas de {month:%Y-%m} movidas de "{DEFAULT_PARTITION}" a "{name}"')
+
+    def _convert(self, months_ahead: int, keep_original: bool):
+        old = f"{TABLE}_anterior"
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Las escrituras de la bitácora esperan a que termine la copia
+            cursor.execute(f'LOCK TABLE "{TABLE}" IN ACCESS EXCLUSIVE MODE')
+            cursor.execute(f'SELECT min("{DATE_COLUMN}"), count(*) FROM "{TABLE}"')
+            first_date, total = cursor.fetchone()
+            cursor.execute("SELECT pg_get_serial_sequence(%s, %s)", [f'"{TABLE}"', ID_COLUMN])
+            old_sequence = cursor.fetchone()[0]
+
+            # Los nombres de índice son únicos por esquema: se recrean en la tabla nueva
+            for index in Bitacora._meta.indexes + [REPLACED_INDEXES[index.name] for index in Bitacora._meta.indexes
+                                                   if index.name in REPLACED_INDEXES]:
+                cursor.execute(f'DROP INDEX IF EXISTS "{index.name}"')
+            cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{old}"')
+            cursor.execute(
+                f'CREATE TABLE "{TABLE}" (LIKE "{old}" INCLUDING DEFAULTS INCLUDING IDENTITY) '
+                f'PARTITION BY RANGE ("{DATE_COLUMN}")'
+            )
+            # La clave única de una tabla particionada debe incluir la columna de partición
+            cursor.execute(f'CREATE UNIQUE INDEX "{TABLE}_id_fecha_uniq" ON "{TABLE}" ("{ID_COLUMN}", "{DATE_COLUMN}")')
+            # Fechas nulas o fuera de las particiones mensuales
+            cursor.execute(f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF "{TABLE}" DEFAULT')
+
+            today = timezone.now().date().replace(day=1)
+            start = (first_date or today).replace(day=1)
+            self._create_partitions(start, _add_months(today, months_ahead + 1))
+
+            cursor.execute(f'INSERT INTO "{TABLE}" OVERRIDING SYSTEM VALUE SELECT * FROM "{old}"')
+
+            # Id sigue numerándose donde iba: la secuencia serial pasa a la tabla nueva,
+            # o la identidad nueva arranca después del máximo copiado
+            cursor.execute("SELECT pg_get_serial_sequence(%s, %s)", [f'"{TABLE}"', ID_COLUMN])
+            new_sequence = cursor.fetchone()[0]
+            if new_sequence is None and old_sequence:
+                cursor.execute(f'ALTER SEQUENCE {old_sequence} OWNED BY "{TABLE}"."{ID_COLUMN}"')
+            elif new_sequence:
+                cursor.execute(
+                    f'SELECT setval(%s, COALESCE((SELECT max("{ID_COLUMN}") FROM "{TABLE}"), 0) + 1, false)',
+                    [new_sequence]
+                )
+
+            if not keep_original:
+                cursor.execute(f'DROP TABLE "{old}"')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'"{TABLE}" convertida a particiones mensuales desde {start:%Y-%m}: {total} filas copiadas'
+        ))
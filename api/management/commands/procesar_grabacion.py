@@ -0,0 +1,62 @@
+# api/management/commands/procesar_grabacion.py
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from api.services.offline_scan import OfflineScanner, parse_recording_start
+
+
+class Command(BaseCommand):
+    help = ('Re-procesa una grabación (video o directorio de imágenes) buscando placas y/o caras. '
+            'Guarda un checkpoint por tramo: si se interrumpe, volver a ejecutarlo continúa donde quedó.')
+
+    def add_arguments(self, parser):
+        ai_settings = settings.AI_IMAGE_SETTINGS
+        parser.add_argument('source', help='Ruta al video o al directorio de imágenes.')
+        parser.add_argument('--camera', default='Principal', help='Ubicación de cámara que se guarda en los registros.')
+        parser.add_argument('--tipo', choices=['placas', 'rostros', 'ambos'], default='ambos')
+        parser.add_argument('--stride', type=int, default=ai_settings['OFFLINE_SCAN_STRIDE'],
+                            help='Se analiza 1 de cada N frames.')
+        parser.add_argument('--workers', type=int, default=ai_settings['OFFLINE_SCAN_WORKERS'],
+                            help='Procesos de inferencia.')
+        parser.add_argument('--chunk', type=int, default=ai_settings['OFFLINE_SCAN_CHUNK_FRAMES'],
+                            help='Frames por tramo (unidad de trabajo y de checkpoint).')
+        parser.add_argument('--checkpoint', default=None, help='Archivo de checkpoint (por defecto <source>.scan.json).')
+        parser.add_argument('--reportes', action='store_true',
+                            help='Crea reportes de seguridad para placas no autorizadas y personas no identificadas.')
+        parser.add_argument('--tipo-acceso', default='entrada', choices=['entrada', 'salida'])
+        parser.add_argument('--inicio', default=None,
+                            help='Fecha y hora de inicio del video (ISO 8601). Por defecto, la fecha del archivo '
+                                 'menos su duración.')
+
+    def handle(self, *args, **options):
+        kinds = {'placas': ('plates',), 'rostros': ('faces',), 'ambos': ('plates', 'faces')}[options['tipo']]
+        try:
+            scanner = OfflineScanner(
+                options['source'],
+                options['camera'],
+                kinds=kinds,
+                stride=options['stride'],
+                workers=options['workers'],
+                chunk_frames=options['chunk'],
+                checkpoint_path=options['checkpoint'],
+                create_reports=options['reportes'],
+                access_type=options['tipo_acceso'],
+                progress=self._report_progress,
+                recorded_at=parse_recording_start(options['inicio'])
+            )
+            summary = scanner.run()
+        except (FileNotFoundError, ValueError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['frames_processed']} frames analizados, {summary['rows_written']} registros en total "
+            f"({summary['chunks_skipped']} de {summary['chunks_total']} tramos ya estaban hechos). "
+            f"Checkpoint: {summary['checkpoint']}"
+        ))
+
+    def _report_progress(self, progress):
+        self.stdout.write(
+            f"Tramo {progress['chunks_done']}/{progress['chunks_total']}: "
+            f"{progress['frames_processed']} frames, {progress['rows_written']} registros, "
+            f"{progress['frames_per_second']} frames/s"
+        )
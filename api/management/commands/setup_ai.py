@@ -14,6 +14,9 @@ class Command(BaseCommand):
         # Configurar Supabase Storage
         try:
             storage_service = SupabaseStorageService()
+            if not storage_service.ensure_bucket(force=True):
+                self.stdout.write('Error configurando Supabase: no se pudo verificar el bucket')
+                return
             self.stdout.write('Supabase Storage configurado exitosamente')
         except Exception as e:
             self.stdout.write(f'Error configurando Supabase: {e}')
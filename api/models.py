@@ -1,6 +1,13 @@
+import re
+from typing import Optional
 from django.db import models
 
 
+def normalize_plate(text: Optional[str]) -> str:
+    """Placa en mayúsculas y sin guiones, espacios ni otros separadores"""
+    return re.sub(r'[^A-Z0-9]', '', (text or '').upper())
+
+
 class Rol(models.Model):
     id = models.SmallAutoField(primary_key=True, db_column="Id")
     descripcion = models.TextField(null=True, blank=True, db_column="Descripcion")
@@ -134,16 +141,31 @@ class Vehiculo(models.Model):
         db_column="CodigoUsuario", related_name="vehiculos"
     )
     nro_placa = models.TextField(null=True, blank=True, db_column="NroPlaca")
+    # Clave de búsqueda: nro_placa normalizada (la columna e índices los crea `actualizar_esquema`)
+    placa_normalizada = models.TextField(null=True, blank=True, editable=False, db_column="PlacaNormalizada")
     descripcion = models.TextField(null=True, blank=True, db_column="Descripcion")
     estado = models.TextField(null=True, blank=True, db_column="Estado")
 
     class Meta:
         managed = False  # --- CAMBIO IMPORTANTE: DE False A True ---
         db_table = "Vehiculo"
+        indexes = [
+            models.Index(fields=['placa_normalizada'], name='vehiculo_placa_norm_idx'),
+            # Búsqueda por prefijo (LIKE 'ABC%') de placas parciales
+            models.Index(fields=['placa_normalizada'], name='vehiculo_placa_prefijo_idx',
+                         opclasses=['text_pattern_ops']),
+        ]
 
     def __str__(self):
         return self.nro_placa or f"Vehículo {self.id}"
 
+    def save(self, *args, **kwargs):
+        self.placa_normalizada = normalize_plate(self.nro_placa) or None
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'nro_placa' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'placa_normalizada'}
+        super().save(*args, **kwargs)
+
 
 class Pertenece(models.Model):
     # --- INICIO DE LA MODIFICACIÓN ---
@@ -410,6 +432,13 @@ class Bitacora(models.Model):
     class Meta:
         managed = False
         db_table = "Bitacora"
+        # La tabla no la gestionan las migraciones: el índice lo crean `actualizar_esquema` y
+        # `particionar_bitacora` (que además crea las particiones mensuales). Mismo orden que la paginación
+        # por cursor (DESC NULLS LAST), si no PostgreSQL no puede usarlo y ordena todo el rango
+        indexes = [
+            models.Index(models.F('fecha').desc(nulls_last=True), models.F('hora').desc(nulls_last=True),
+                         models.F('id').desc(nulls_last=True), name='bitacora_keyset_idx'),
+        ]
 
     def __str__(self):
         return f"Bitácora {self.id}"
@@ -424,8 +453,12 @@ class PerfilFacial(models.Model):
         related_name="perfil_facial"
     )
     encoding_facial = models.TextField(db_column="EncodingFacial")
+    # Encodings de otros backends faciales, JSON {"backend": [..]} (dlib usa EncodingFacial)
+    encodings_backend = models.TextField(null=True, blank=True, db_column="EncodingsBackend")
     imagen_path = models.TextField(null=True, blank=True, db_column="ImagenPath")
     imagen_url = models.URLField(null=True, blank=True, db_column="ImagenUrl")
+    # Rutas de las versiones reducidas, JSON {"tiny": ruta, "medium": ruta}
+    imagenes_derivadas = models.TextField(null=True, blank=True, editable=False, db_column="ImagenesDerivadas")
     fecha_registro = models.DateTimeField(auto_now_add=True, db_column="FechaRegistro")
     activo = models.BooleanField(default=True, db_column="Activo")
 
@@ -444,6 +477,8 @@ class ReconocimientoFacial(models.Model):
     )
     imagen_path = models.TextField(null=True, blank=True, db_column="ImagenPath")
     imagen_url = models.URLField(null=True, blank=True, db_column="ImagenUrl")
+    # Rutas de las versiones reducidas, JSON {"tiny": ruta, "medium": ruta}
+    imagenes_derivadas = models.TextField(null=True, blank=True, editable=False, db_column="ImagenesDerivadas")
     confianza = models.DecimalField(max_digits=5, decimal_places=2, db_column="Confianza")
     es_residente = models.BooleanField(default=False, db_column="EsResidente")
     fecha_deteccion = models.DateTimeField(auto_now_add=True, db_column="FechaDeteccion")
@@ -463,12 +498,15 @@ class ReconocimientoFacial(models.Model):
 class DeteccionPlaca(models.Model):
     id = models.BigAutoField(primary_key=True, db_column="Id")
     placa_detectada = models.TextField(db_column="PlacaDetectada")
+    placa_normalizada = models.TextField(default='', blank=True, editable=False, db_column="PlacaNormalizada")
     vehiculo = models.ForeignKey(
         Vehiculo, models.SET_NULL, null=True, blank=True,
         db_column="IdVehiculo", related_name="detecciones"
     )
     imagen_path = models.TextField(null=True, blank=True, db_column="ImagenPath")
     imagen_url = models.URLField(null=True, blank=True, db_column="ImagenUrl")
+    # Rutas de las versiones reducidas, JSON {"tiny": ruta, "medium": ruta}
+    imagenes_derivadas = models.TextField(null=True, blank=True, editable=False, db_column="ImagenesDerivadas")
     confianza = models.DecimalField(max_digits=5, decimal_places=2, db_column="Confianza")
     es_autorizado = models.BooleanField(default=False, db_column="EsAutorizado")
     fecha_deteccion = models.DateTimeField(auto_now_add=True, db_column="FechaDeteccion")
@@ -477,13 +515,29 @@ class DeteccionPlaca(models.Model):
         choices=[('entrada', 'Entrada'), ('salida', 'Salida')],
         db_column="TipoAcceso"
     )
+    # Lecturas repetidas de la misma placa en la misma cámara agrupadas en esta detección
+    lecturas = models.IntegerField(default=1, db_column="Lecturas")
+    ultima_deteccion = models.DateTimeField(null=True, blank=True, db_column="UltimaDeteccion")
 
     class Meta:
         db_table = "DeteccionPlaca"
+        indexes = [
+            # Historial de una placa, de la más reciente a la más antigua
+            models.Index(fields=['placa_normalizada', '-fecha_deteccion'], name='deteccion_placa_norm_idx'),
+            models.Index(fields=['placa_normalizada'], name='deteccion_placa_prefijo_idx',
+                         opclasses=['text_pattern_ops']),
+        ]
 
     def __str__(self):
         return f"Placa {self.placa_detectada} - {self.fecha_deteccion}"
 
+    def save(self, *args, **kwargs):
+        self.placa_normalizada = normalize_plate(self.placa_detectada)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'placa_detectada' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'placa_normalizada'}
+        super().save(*args, **kwargs)
+
 
 class ReporteSeguridad(models.Model):
     id = models.BigAutoField(primary_key=True, db_column="Id")
@@ -0,0 +1,160 @@
+# api/pagination.py
+import base64
+import json
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginación por clave (keyset) sobre un orden descendente fijo, p. ej.
+    (-fecha, -hora, -id): cada página se pide con un cursor que guarda la
+    clave de la última fila y se filtra con `clave < cursor`, así una página
+    profunda cuesta lo mismo que la primera (sin OFFSET ni COUNT). Las claves
+    nulas van al final (NULLS LAST) y el cursor las admite.
+
+    Es opcional: solo se usa si llega `?cursor=` (vacío para la primera
+    página). Sin él se responde con la paginación por número de página de
+    siempre (con `count`), así los clientes actuales no cambian.
+    """
+
+    ordering = ('-id',)
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    fallback_class = PageNumberPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.fallback = None
+        if self.cursor_query_param not in request.query_params or 'ordering' in request.query_params:
+            self.fallback = self.fallback_class()
+            return self.fallback.paginate_queryset(queryset, request, view)
+
+        self.fields = [field.lstrip('-') for field in self.ordering]
+        self.model = queryset.model
+        self.size = self._page_size(request)
+        key, reverse = self._decode_cursor(request)
+
+        queryset = queryset.order_by(*(F(field).desc(nulls_last=True) for field in self.fields))
+        if key is not None:
+            queryset = queryset.filter(self._after(key, reverse))
+        if reverse:
+            queryset = queryset.reverse()
+
+        rows = list(queryset[:self.size + 1])
+        has_more = len(rows) > self.size
+        rows = rows[:self.size]
+        if reverse:
+            rows.reverse()
+
+        # Hacia atrás: hay página siguiente (de donde venimos) y quizás anterior
+        self.has_next = has_more if not reverse else True
+        self.has_previous = key is not None and (has_more if reverse else True)
+        self.first_key = self._key(rows[0]) if rows else None
+        self.last_key = self._key(rows[-1]) if rows else None
+        return rows
+
+    def get_paginated_response(self, data):
+        if self.fallback is not None:
+            return self.fallback.get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if self.fallback is not None:
+            return self.fallback.get_next_link()
+        if not self.has_next or self.last_key is None:
+            return None
+        return self._link(self.last_key, reverse=False)
+
+    def get_previous_link(self):
+        if self.fallback is not None:
+            return self.fallback.get_previous_link()
+        if not self.has_previous or self.first_key is None:
+            return None
+        return self._link(self.first_key, reverse=True)
+
+    # --- cursor ---
+
+    def _page_size(self, request) -> int:
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def _key(self, row):
+        return [getattr(row, field) for field in self.fields]
+
+    def _link(self, key, reverse: bool) -> str:
+        payload = {'k': [value.isoformat() if hasattr(value, 'isoformat') else value for value in key],
+                   'r': reverse}
+        cursor = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, 'page')
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def _decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            values = payload['k']
+            if len(values) != len(self.fields):
+                raise ValueError
+            key = [self.model._meta.get_field(field).to_python(value) for field, value in zip(self.fields, values)]
+            return key, bool(payload.get('r'))
+        except Exception:
+            raise NotFound('Cursor inválido.')
+
+    def _after(self, key, reverse: bool) -> Q:
+        """
+        (a, b, c) < (ka, kb, kc) desarrollado en OR de igualdades; el primer
+        término acota el rango del índice (y las particiones por fecha).
+        Con NULLS LAST un nulo va después de cualquier valor.
+        """
+        condition = Q(pk__in=[])
+        for position in range(len(self.fields)):
+            term = Q()
+            for field, value in zip(self.fields[:position], key[:position]):
+                term &= Q(**{f"{field}__isnull": True}) if value is None else Q(**{field: value})
+            condition |= term & self._beyond(self.fields[position], key[position], reverse)
+        return self._beyond(self.fields[0], key[0], reverse, inclusive=True) & condition
+
+    @staticmethod
+    def _beyond(field: str, value, reverse: bool, inclusive: bool = False) -> Q:
+        """Filas después (o antes, si `reverse`) de `value` en `field` DESC NULLS LAST"""
+        suffix = 'e' if inclusive else ''
+        if reverse:
+            if value is None:
+                return Q() if inclusive else Q(**{f"{field}__isnull": False})
+            return Q(**{f"{field}__gt{suffix}": value})
+        if value is None:
+            return Q(**{f"{field}__isnull": True}) if inclusive else Q(pk__in=[])
+        return Q(**{f"{field}__lt{suffix}": value}) | Q(**{f"{field}__isnull": True})
+
+
+class BitacoraPagination(KeysetPagination):
+    # Coincide con el índice bitacora_keyset_idx: (fecha, hora, id) DESC NULLS LAST
+    ordering = ('-fecha', '-hora', '-id')
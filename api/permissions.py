@@ -1,7 +1,7 @@
 # En api/permissions.py
 
 from rest_framework import permissions
-from .models import Usuario
+from .authentication import es_admin
 
 class IsAdmin(permissions.BasePermission):
     """
@@ -10,12 +10,9 @@ class IsAdmin(permissions.BasePermission):
     def has_permission(self, request, view):
         if not request.user or not request.user.is_authenticated:
             return False
-        try:
-            # Verificamos en nuestro modelo Usuario si el rol es de tipo 'admin'
-            usuario = Usuario.objects.get(correo=request.user.email)
-            return usuario.idrol and usuario.idrol.tipo == 'admin'
-        except Usuario.DoesNotExist:
-            return False
+        # Verificamos en nuestro modelo Usuario si el rol es de tipo 'admin'
+        # (el Usuario queda resuelto en el request para la vista)
+        return es_admin(request)
 
 class IsAdminOrReadOnly(permissions.BasePermission):
     """
@@ -27,8 +24,4 @@ class IsAdminOrReadOnly(permissions.BasePermission):
         # Para métodos no seguros (POST, PUT, DELETE), usamos nuestra lógica IsAdmin.
         if not request.user or not request.user.is_authenticated:
             return False
-        try:
-            usuario = Usuario.objects.get(correo=request.user.email)
-            return usuario.idrol and usuario.idrol.tipo == 'admin'
-        except Usuario.DoesNotExist:
-            return False
\ No newline at end of file
+        return es_admin(request)
\ No newline at end of file
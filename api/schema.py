@@ -0,0 +1,68 @@
+# api/schema.py
+"""
+Columnas e índices agregados a tablas que ya existen en la base (el
+proyecto no versiona migraciones de `api`, así que `migrate` no los crea).
+Se aplican con `python manage.py actualizar_esquema`, que build.sh corre en
+cada despliegue; agregar una columna o índice a esos modelos implica
+registrarlo en SCHEMA_CHANGES.
+"""
+from typing import Callable, Iterable, List, Optional
+from django.db import connection, models
+
+# Índices con otra definición bajo otro nombre: al crear el nuevo se borra el anterior
+REPLACED_INDEXES = {
+    # Antes sin NULLS LAST: PostgreSQL no lo usaba para la paginación por cursor de la bitácora
+    'bitacora_keyset_idx': models.Index(fields=['-fecha', '-hora', '-id'], name='bitacora_fecha_hora_id_idx'),
+}
+
+
+def ensure_model_schema(model, field_names: Iterable[str] = (), index_names: Iterable[str] = (),
+                        log: Optional[Callable[[str], None]] = None) -> List[str]:
+    """Crea las columnas e índices de `model` que falten; devuelve los cambios hechos"""
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        columns = {column.name for column in connection.introspection.get_table_description(cursor, table)}
+        existing = set(connection.introspection.get_constraints(cursor, table))
+
+    created = []
+    indexes = {index.name: index for index in model._meta.indexes}
+    with connection.schema_editor() as editor:
+        for name in field_names:
+            field = model._meta.get_field(name)
+            if field.column not in columns:
+                editor.add_field(model, field)
+                created.append(f"Creado {table}.{field.column}")
+        for name in index_names:
+            if name not in existing:
+                replaced = REPLACED_INDEXES.get(name)
+                if replaced is not None and replaced.name in existing:
+                    editor.remove_index(model, replaced)
+                    created.append(f"Borrado {replaced.name}")
+                # En una tabla particionada el índice se crea en cada partición
+                editor.add_index(model, indexes[name])
+                created.append(f"Creado {name}")
+
+    for item in created:
+        if log:
+            log(item)
+    return created
+
+
+def schema_changes():
+    """(modelo, campos, índices) agregados sin migración, en el orden en que se introdujeron"""
+    from .models import Bitacora, DeteccionPlaca, PerfilFacial, ReconocimientoFacial, Vehiculo
+    return [
+        # Encodings de los backends faciales que no son dlib
+        (PerfilFacial, ('encodings_backend',), ()),
+        # Lecturas agrupadas por la deduplicación de placas
+        (DeteccionPlaca, ('lecturas', 'ultima_deteccion'), ()),
+        # Clave de placa normalizada (el relleno de las filas existentes lo hace `normalizar_placas`)
+        (Vehiculo, ('placa_normalizada',), ('vehiculo_placa_norm_idx', 'vehiculo_placa_prefijo_idx')),
+        (DeteccionPlaca, ('placa_normalizada',), ('deteccion_placa_norm_idx', 'deteccion_placa_prefijo_idx')),
+        # Rutas de las versiones reducidas de la imagen
+        (PerfilFacial, ('imagenes_derivadas',), ()),
+        (ReconocimientoFacial, ('imagenes_derivadas',), ()),
+        (DeteccionPlaca, ('imagenes_derivadas',), ()),
+        # Orden de la paginación por cursor de la bitácora (también lo asegura `particionar_bitacora`)
+        (Bitacora, (), ('bitacora_keyset_idx',)),
+    ]
@@ -6,6 +6,7 @@ from .models import (
     PerfilFacial, ReconocimientoFacial, DeteccionPlaca, ReporteSeguridad, SolicitudMantenimiento,
     MantenimientoPreventivo
 )
+from .services.supabase_storage import derived_image_url
 
 
 class RolSerializer(serializers.ModelSerializer):
@@ -191,18 +192,31 @@ class BitacoraSerializer(serializers.ModelSerializer):
 
 # Agregar al final de api/serializers.py
 
-class PerfilFacialSerializer(serializers.ModelSerializer):
+class ImagenDerivadaMixin(serializers.Serializer):
+    """
+    `imagen_preview_url`: la versión de la imagen adecuada para la vista. El
+    viewset indica el tamaño en el contexto (`image_size`: tiny, medium o full);
+    si la fila no tiene ese derivado se usa la imagen completa.
+    """
+    imagen_preview_url = serializers.SerializerMethodField()
+
+    def get_imagen_preview_url(self, obj):
+        return derived_image_url(obj, self.context.get('image_size', 'full'))
+
+
+class PerfilFacialSerializer(ImagenDerivadaMixin, serializers.ModelSerializer):
     usuario_nombre = serializers.SerializerMethodField()
 
     class Meta:
         model = PerfilFacial
-        fields = ['id', 'codigo_usuario', 'imagen_url', 'fecha_registro', 'activo', 'usuario_nombre']
+        fields = ['id', 'codigo_usuario', 'imagen_url', 'imagen_preview_url', 'fecha_registro', 'activo',
+                  'usuario_nombre']
 
     def get_usuario_nombre(self, obj):
         return f"{obj.codigo_usuario.nombre} {obj.codigo_usuario.apellido}"
 
 
-class ReconocimientoFacialSerializer(serializers.ModelSerializer):
+class ReconocimientoFacialSerializer(ImagenDerivadaMixin, serializers.ModelSerializer):
     usuario_nombre = serializers.SerializerMethodField()
 
     class Meta:
@@ -215,7 +229,7 @@ class ReconocimientoFacialSerializer(serializers.ModelSerializer):
         return "Desconocido"
 
 
-class DeteccionPlacaSerializer(serializers.ModelSerializer):
+class DeteccionPlacaSerializer(ImagenDerivadaMixin, serializers.ModelSerializer):
     vehiculo_info = serializers.SerializerMethodField()
 
     class Meta:
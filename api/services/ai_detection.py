@@ -17,41 +17,58 @@ import base64
 import io
 from PIL import Image
 import re
-from typing import List, Tuple, Optional, Dict
+from typing import Callable, List, Tuple, Optional, Dict
 from django.conf import settings
-from ..models import Usuario, PerfilFacial, ReconocimientoFacial, DeteccionPlaca, Vehiculo
-from .supabase_storage import SupabaseStorageService
+from concurrent.futures import Future
+from ..models import Usuario, PerfilFacial, ReconocimientoFacial, DeteccionPlaca, ReporteSeguridad
+from .supabase_storage import SupabaseStorageService, derived_images_value
+from .batch_writer import DetectionBatchWriter
+from .plate_index import plate_index
+from .ocr_batcher import OCRBatcher
+from .plate_dedup import PlateEvent, plate_events
+from .face_gallery import FaceGallery
+from .face_index import face_index
+from .face_backends import FACE_BACKENDS, FaceEmbeddingBackend, get_face_backend, encoding_fields
+from .face_tracking import IoUTracker, FaceTrack
 import logging
 from django.core.files.uploadedfile import InMemoryUploadedFile
 logger = logging.getLogger(__name__)
 
 
 class FacialRecognitionService:
-    """Servicio para reconocimiento facial usando face_recognition"""
+    """Servicio para reconocimiento facial con el backend de embeddings configurado"""
 
     def __init__(self):
-        self.tolerance = settings.AI_IMAGE_SETTINGS.get('FACE_TOLERANCE', 0.6)
-        self.known_encodings = []
-        self.known_users = []
+        self.backend_name = settings.AI_IMAGE_SETTINGS.get('FACE_BACKEND', 'dlib')
+        backend_class = FACE_BACKENDS[self.backend_name]
+        self.metric = backend_class.metric
+        self.tolerance = backend_class.configured_tolerance()
         self.storage_service = SupabaseStorageService()
+        self.sequence_stride = settings.AI_IMAGE_SETTINGS.get('FACE_SEQUENCE_STRIDE', 3)
+        self.sequence_max_frames = settings.AI_IMAGE_SETTINGS.get('FACE_SEQUENCE_MAX_FRAMES', 60)
+        self.track_iou_threshold = settings.AI_IMAGE_SETTINGS.get('FACE_TRACK_IOU', 0.3)
 
     def load_known_faces(self):
-        """Carga las caras conocidas desde la base de datos"""
+        """Construye ya la galería de caras conocidas (si no, se construye en el primer reconocimiento)"""
         try:
-            perfiles = PerfilFacial.objects.filter(activo=True).select_related('codigo_usuario')
-            self.known_encodings = []
-            self.known_users = []
-            for perfil in perfiles:
-                try:
-                    encoding = np.array(json.loads(perfil.encoding_facial))
-                    self.known_encodings.append(encoding)
-                    self.known_users.append(perfil.codigo_usuario)
-                except Exception as e:
-                    logger.error(f"Error cargando perfil facial {perfil.id}: {e}")
-            logger.info(f"Cargados {len(self.known_encodings)} perfiles faciales para reconocimiento.")
+            face_index.load(self.backend_name)
         except Exception as e:
             logger.error(f"Error cargando caras conocidas: {e}")
 
+    @property
+    def gallery(self) -> FaceGallery:
+        """Galería compartida del proceso; se reconstruye al cambiar un PerfilFacial o al vencer su TTL"""
+        return face_index.gallery(self.backend_name)
+
+    @property
+    def known_users(self) -> List[Usuario]:
+        return self.gallery.users
+
+    @property
+    def backend(self) -> FaceEmbeddingBackend:
+        """Backend de detección/embeddings; se carga en el primer uso (los modelos solo existen en el worker)"""
+        return get_face_backend(self.backend_name)
+
     def register_face(self, user_id: int, image_base64: str) -> bool:
         """Registra una nueva cara en el sistema"""
         try:
@@ -59,12 +76,12 @@ class FacialRecognitionService:
             if image is None:
                 return False
 
-            face_locations = face_recognition.face_locations(image)
+            face_locations = self.backend.detect(image)
             if not face_locations:
                 logger.warning("No se detectó ninguna cara en la imagen")
                 return False
 
-            face_encodings = face_recognition.face_encodings(image, face_locations)
+            face_encodings = self.backend.encode(image, face_locations)
             if not face_encodings:
                 logger.warning("No se pudo generar encoding facial")
                 return False
@@ -85,24 +102,27 @@ class FacialRecognitionService:
             perfil, created = PerfilFacial.objects.get_or_create(
                 codigo_usuario=usuario,
                 defaults={
-                    'encoding_facial': json.dumps(encoding.tolist()),
+                    **encoding_fields(self.backend_name, encoding),
                     'imagen_path': upload_result['file_path'],
                     'imagen_url': upload_result['public_url'],
+                    'imagenes_derivadas': derived_images_value(upload_result),
                     'activo': True
                 }
             )
 
             if not created:
-                if perfil.imagen_path:
-                    self.storage_service.delete_file(perfil.imagen_path)
+                # Misma foto = mismo objeto (nombre por hash): no hay nada que borrar
+                if perfil.imagen_path and perfil.imagen_path != upload_result['file_path']:
+                    self.storage_service.delete_file(perfil.imagen_path, released_by=perfil)
 
-                perfil.encoding_facial = json.dumps(encoding.tolist())
+                for field, value in encoding_fields(self.backend_name, encoding).items():
+                    setattr(perfil, field, value)
                 perfil.imagen_path = upload_result['file_path']
                 perfil.imagen_url = upload_result['public_url']
+                perfil.imagenes_derivadas = derived_images_value(upload_result)
                 perfil.activo = True
                 perfil.save()
 
-            self.load_known_faces()
 
             logger.info(f"Cara registrada para usuario {user_id}")
             return True
@@ -117,50 +137,141 @@ class FacialRecognitionService:
     def recognize_face(self, image_base64: str, camera_location: str = "Principal") -> Dict:
         """Reconoce una cara en la imagen"""
 
-        # --- ¡ESTA ES LA LÍNEA CLAVE AÑADIDA! ---
-        self.load_known_faces()  # Recargamos los perfiles justo antes de cada reconocimiento.
-        # -----------------------------------------
-
         try:
             image = self._base64_to_image(image_base64)
             if image is None:
                 return self._create_recognition_result(False, None, 0.0, image_base64, camera_location)
 
-            # ... (el resto de la función recognize_face no cambia)
-            face_locations = face_recognition.face_locations(image)
-            if not face_locations:
-                return self._create_recognition_result(False, None, 0.0, image_base64, camera_location)
+            is_resident, usuario, confidence = self.analyze_image(image)
+            return self._create_recognition_result(is_resident, usuario, confidence, image_base64, camera_location)
 
-            face_encodings = face_recognition.face_encodings(image, face_locations)
-            if not face_encodings:
-                return self._create_recognition_result(False, None, 0.0, image_base64, camera_location)
-
-            for face_encoding in face_encodings:
-                if not self.known_encodings:
-                    break
+        except Exception as e:
+            logger.error(f"Error en reconocimiento facial: {e}")
+            return self._create_recognition_result(False, None, 0.0, image_base64, camera_location)
 
-                matches = face_recognition.compare_faces(
-                    self.known_encodings, face_encoding, tolerance=self.tolerance
-                )
-                face_distances = face_recognition.face_distance(
-                    self.known_encodings, face_encoding
-                )
+    def recognize_face_sequence(self, frames_data: List[bytes], camera_location: str = "Principal",
+                                stride: Optional[int] = None) -> Dict:
+        """Reconoce a las personas de una ráfaga de frames de una misma cámara"""
+        stride = max(1, stride or self.sequence_stride)
+        sampled, frames_received = self.sample_frames(frames_data, stride)
+        return self.persist_tracks(self.track_faces(sampled), camera_location, frames_received, len(sampled), stride)
+
+    def recognize_face_video(self, video_path: str, camera_location: str = "Principal",
+                             stride: Optional[int] = None) -> Dict:
+        """Reconoce a las personas de un clip de video corto"""
+        stride = max(1, stride or self.sequence_stride)
+        sampled, frames_received = self.sample_video(video_path, stride)
+        return self.persist_tracks(self.track_faces(sampled), camera_location, frames_received, len(sampled), stride)
+
+    # Las tres partes de una secuencia por separado, para las etapas del pipeline del worker:
+    # decodificar (sample_*), inferencia (track_faces) y persistir (persist_tracks)
+
+    def sample_frames(self, frames_data: List[bytes], stride: int) -> Tuple[List[Tuple[int, np.ndarray]], int]:
+        """Decodifica uno de cada `stride` frames: ([(índice, imagen)], frames recibidos)"""
+        frames_data = frames_data[:self.sequence_max_frames]
+        sampled = []
+        for frame_index in range(0, len(frames_data), stride):
+            image = self._bytes_to_image(frames_data[frame_index])
+            if image is not None:
+                sampled.append((frame_index, image))
+        return sampled, len(frames_data)
+
+    def sample_video(self, video_path: str, stride: int) -> Tuple[List[Tuple[int, np.ndarray]], int]:
+        """Como sample_frames, leyendo un clip de video"""
+        sampled = []
+        total_frames = 0
+        capture = cv2.VideoCapture(video_path)
+        try:
+            while total_frames < self.sequence_max_frames and capture.grab():
+                # Solo se decodifican los frames que caen en el paso configurado
+                if total_frames % stride == 0:
+                    ok, frame = capture.retrieve()
+                    if ok:
+                        sampled.append((total_frames, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)))
+                total_frames += 1
+        finally:
+            capture.release()
+        return sampled, total_frames
+
+    def track_faces(self, sampled: List[Tuple[int, np.ndarray]]) -> List[Tuple[FaceTrack, Optional[Usuario], float]]:
+        """Detecta caras en los frames muestreados, las sigue por IoU y reconoce cada pista una vez"""
+        tracker = IoUTracker(self.track_iou_threshold)
+        for frame_index, image in sampled:
+            try:
+                tracker.update(frame_index, self.backend.detect(image), image)
+            except Exception as e:
+                logger.error(f"Error detectando caras en el frame {frame_index}: {e}")
+
+        return [(track, *self._match_track(track)) for track in tracker.tracks()]
+
+    def persist_tracks(self, tracked: List[Tuple[FaceTrack, Optional[Usuario], float]], camera_location: str,
+                       frames_received: int, frames_processed: int, stride: int) -> Dict:
+        """Guarda un reconocimiento por pista y arma la respuesta de la secuencia"""
+        return {
+            'camera_location': camera_location,
+            'frames_received': frames_received,
+            'frames_processed': frames_processed,
+            'stride': stride,
+            'tracks': [self._track_result(track, usuario, confidence, camera_location)
+                       for track, usuario, confidence in tracked]
+        }
+
+    def _match_track(self, track: FaceTrack) -> Tuple[Optional[Usuario], float]:
+        """Codifica la pista una sola vez, en su frame de mejor calidad"""
+        try:
+            encodings = self.backend.encode(track.best_image, [track.best_box])
+            if encodings:
+                match = self._match_encoding(encodings[0])
+                if match:
+                    return match
+        except Exception as e:
+            logger.error(f"Error codificando la pista {track.track_id}: {e}")
+        return None, 0.0
+
+    def _track_result(self, track: FaceTrack, usuario: Optional[Usuario], confidence: float,
+                      camera_location: str) -> Dict:
+        result = self._create_recognition_result(
+            usuario is not None, usuario, confidence,
+            self._image_to_base64(track.best_image), camera_location
+        )
+        result.update({
+            'track_id': track.track_id,
+            'first_frame': track.first_frame,
+            'last_frame': track.last_frame,
+            'best_frame': track.best_frame,
+            'frames_seen': track.hits
+        })
+        return result
+
+    def analyze_image(self, image: np.ndarray) -> Tuple[bool, Optional[Usuario], float]:
+        """Etapa de inferencia: detecta, codifica y compara las caras de una imagen ya decodificada"""
+        try:
+            face_locations = self.backend.detect(image)
+            if not face_locations:
+                return False, None, 0.0
 
-                if any(matches):
-                    best_match_index = np.argmin(face_distances)
-                    if matches[best_match_index]:
-                        usuario = self.known_users[best_match_index]
-                        confidence = (1 - face_distances[best_match_index]) * 100
+            face_encodings = self.backend.encode(image, face_locations)
 
-                        return self._create_recognition_result(
-                            True, usuario, confidence, image_base64, camera_location
-                        )
+            # Comparamos CADA cara encontrada en la imagen con TODAS las caras conocidas;
+            # la primera coincidencia decide.
+            for face_encoding in face_encodings:
+                match = self._match_encoding(face_encoding)
+                if match:
+                    usuario, confidence = match
+                    return True, usuario, confidence
+        except Exception as e:
+            logger.error(f"Error analizando caras: {e}")
 
-            return self._create_recognition_result(False, None, 0.0, image_base64, camera_location)
+        return False, None, 0.0
 
-        except Exception as e:
-            logger.error(f"Error en reconocimiento facial: {e}")
-            return self._create_recognition_result(False, None, 0.0, image_base64, camera_location)
+    def _match_encoding(self, face_encoding: np.ndarray) -> Optional[Tuple[Usuario, float]]:
+        """Busca el usuario más cercano en la galería dentro de la tolerancia"""
+        gallery = self.gallery
+        match = gallery.best_match(face_encoding, self.tolerance)
+        if match is None:
+            return None
+        index, distance = match
+        return gallery.users[index], (1 - distance) * 100
 
     def _create_recognition_result(self, is_resident: bool, usuario: Optional[Usuario],
                                    confidence: float, image_base64: str, camera_location: str) -> Dict:
@@ -172,43 +283,93 @@ class FacialRecognitionService:
                 prefix=f"detection_{camera_location.lower().replace(' ', '_')}"
             )
 
-            reconocimiento = ReconocimientoFacial.objects.create(
-                codigo_usuario=usuario,
-                imagen_path=upload_result['file_path'] if upload_result else None,
-                imagen_url=upload_result['public_url'] if upload_result else None,
-                confianza=confidence,
-                es_residente=is_resident,
-                ubicacion_camara=camera_location,
-                estado='permitido' if is_resident else 'denegado'
-            )
+            reconocimiento = self._build_recognition(is_resident, usuario, confidence, upload_result, camera_location)
+            reconocimiento.save()
 
-            return {
-                'id': reconocimiento.id,
-                'is_resident': is_resident,
-                'user': {
-                    'codigo': usuario.codigo if usuario else None,
-                    'nombre': f"{usuario.nombre} {usuario.apellido}" if usuario else "Desconocido",
-                    'correo': usuario.correo if usuario else None
-                } if usuario else None,
-                'confidence': round(confidence, 2),
-                'timestamp': reconocimiento.fecha_deteccion.isoformat(),
-                'camera_location': camera_location,
-                'status': 'permitido' if is_resident else 'denegado',
-                'image_url': reconocimiento.imagen_url
-            }
+            return self._recognition_payload(reconocimiento, is_resident, usuario, confidence, camera_location)
 
         except Exception as e:
             logger.error(f"Error creando resultado de reconocimiento: {e}")
-            return {
-                'id': None,
-                'is_resident': False,
-                'user': None,
-                'confidence': 0.0,
-                'timestamp': None,
-                'camera_location': camera_location,
-                'status': 'error',
-                'image_url': None
-            }
+            return self._recognition_error_payload(camera_location)
+
+    def persist_recognition_batched(self, writer: DetectionBatchWriter, is_resident: bool,
+                                    usuario: Optional[Usuario], confidence: float,
+                                    image_file, camera_location: str) -> Future:
+        """
+        Sube la imagen y encola el reconocimiento (y su reporte de intruso) en el
+        escritor por lotes. El Future devuelve la misma respuesta que
+        `_create_recognition_result_from_file` más `report_id`.
+        """
+        try:
+            upload_result = self.storage_service.upload_django_file(
+                image_file,
+                folder="facial",
+                prefix=f"detection_{camera_location.lower().replace(' ', '_')}"
+            )
+            reconocimiento = self._build_recognition(is_resident, usuario, confidence, upload_result, camera_location)
+            report = None if is_resident else ReporteSeguridad(
+                tipo_evento='intruso_detectado',
+                descripcion=f"Persona no identificada detectada en {camera_location}",
+                nivel_alerta='alto'
+            )
+
+            def build_result(saved: ReconocimientoFacial, saved_report: Optional[ReporteSeguridad]) -> Dict:
+                result = self._recognition_payload(saved, is_resident, usuario, confidence, camera_location)
+                result['report_id'] = saved_report.id if saved_report else None
+                return result
+
+            return writer.submit_detection(reconocimiento, report, build_result)
+
+        except Exception as e:
+            logger.error(f"Error encolando resultado de reconocimiento: {e}")
+            future = Future()
+            future.set_result(self._recognition_error_payload(camera_location))
+            return future
+
+    def _build_recognition(self, is_resident: bool, usuario: Optional[Usuario], confidence: float,
+                           upload_result: Optional[Dict], camera_location: str) -> ReconocimientoFacial:
+        """Reconocimiento sin guardar"""
+        return ReconocimientoFacial(
+            codigo_usuario=usuario,
+            imagen_path=upload_result['file_path'] if upload_result else None,
+            imagen_url=upload_result['public_url'] if upload_result else None,
+            imagenes_derivadas=derived_images_value(upload_result),
+            confianza=confidence,
+            es_residente=is_resident,
+            ubicacion_camara=camera_location,
+            estado='permitido' if is_resident else 'denegado'
+        )
+
+    def _recognition_payload(self, reconocimiento: ReconocimientoFacial, is_resident: bool,
+                             usuario: Optional[Usuario], confidence: float, camera_location: str) -> Dict:
+        """Respuesta de la API para un reconocimiento guardado"""
+        return {
+            'id': reconocimiento.id,
+            'is_resident': is_resident,
+            'user': {
+                'codigo': usuario.codigo if usuario else None,
+                'nombre': f"{usuario.nombre} {usuario.apellido}" if usuario else "Desconocido",
+                'correo': usuario.correo if usuario else None
+            } if usuario else None,
+            'confidence': round(confidence, 2),
+            'timestamp': reconocimiento.fecha_deteccion.isoformat(),
+            'camera_location': camera_location,
+            'status': 'permitido' if is_resident else 'denegado',
+            'image_url': reconocimiento.imagen_url
+        }
+
+    def _recognition_error_payload(self, camera_location: str) -> Dict:
+        """Respuesta de la API cuando no se pudo guardar el reconocimiento"""
+        return {
+            'id': None,
+            'is_resident': False,
+            'user': None,
+            'confidence': 0.0,
+            'timestamp': None,
+            'camera_location': camera_location,
+            'status': 'error',
+            'image_url': None
+        }
 
     def _base64_to_image(self, base64_string: str) -> Optional[np.ndarray]:
         """Convierte base64 a imagen numpy"""
@@ -227,6 +388,26 @@ class FacialRecognitionService:
         except Exception as e:
             logger.error(f"Error convirtiendo base64 a imagen: {e}")
             return None
+    def _bytes_to_image(self, image_data: bytes) -> Optional[np.ndarray]:
+        """Convierte bytes de imagen a imagen numpy"""
+        try:
+            image = Image.open(io.BytesIO(image_data))
+
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+
+            return np.array(image)
+
+        except Exception as e:
+            logger.error(f"Error convirtiendo bytes a imagen: {e}")
+            return None
+
+    def _image_to_base64(self, image: np.ndarray) -> str:
+        """Convierte una imagen numpy a JPEG en base64"""
+        output = io.BytesIO()
+        Image.fromarray(image).save(output, format='JPEG', quality=settings.AI_IMAGE_SETTINGS['JPEG_QUALITY'])
+        return base64.b64encode(output.getvalue()).decode('utf-8')
+
     def register_face_from_file(self, user_id: int, image_file: InMemoryUploadedFile) -> bool:
         """Registra una nueva cara desde un archivo Django"""
         try:
@@ -235,12 +416,12 @@ class FacialRecognitionService:
             if image is None:
                 return False
 
-            face_locations = face_recognition.face_locations(image)
+            face_locations = self.backend.detect(image)
             if not face_locations:
                 logger.warning("No se detectó ninguna cara en la imagen")
                 return False
 
-            face_encodings = face_recognition.face_encodings(image, face_locations)
+            face_encodings = self.backend.encode(image, face_locations)
             if not face_encodings:
                 logger.warning("No se pudo generar encoding facial")
                 return False
@@ -262,24 +443,27 @@ class FacialRecognitionService:
             perfil, created = PerfilFacial.objects.get_or_create(
                 codigo_usuario=usuario,
                 defaults={
-                    'encoding_facial': json.dumps(encoding.tolist()),
+                    **encoding_fields(self.backend_name, encoding),
                     'imagen_path': upload_result['file_path'],
                     'imagen_url': upload_result['public_url'],
+                    'imagenes_derivadas': derived_images_value(upload_result),
                     'activo': True
                 }
             )
 
             if not created:
-                if perfil.imagen_path:
-                    self.storage_service.delete_file(perfil.imagen_path)
+                # Misma foto = mismo objeto (nombre por hash): no hay nada que borrar
+                if perfil.imagen_path and perfil.imagen_path != upload_result['file_path']:
+                    self.storage_service.delete_file(perfil.imagen_path, released_by=perfil)
 
-                perfil.encoding_facial = json.dumps(encoding.tolist())
+                for field, value in encoding_fields(self.backend_name, encoding).items():
+                    setattr(perfil, field, value)
                 perfil.imagen_path = upload_result['file_path']
                 perfil.imagen_url = upload_result['public_url']
+                perfil.imagenes_derivadas = derived_images_value(upload_result)
                 perfil.activo = True
                 perfil.save()
 
-            self.load_known_faces()
 
             logger.info(f"Cara registrada para usuario {user_id}")
             return True
@@ -294,52 +478,15 @@ class FacialRecognitionService:
     def recognize_face_from_file(self, image_file: InMemoryUploadedFile, camera_location: str = "Principal") -> Dict:
         """Reconoce una cara desde un archivo Django"""
 
-        # --- ¡ESTA ES LA CORRECCIÓN DEFINITIVA! ---
-        # AHORA LA CARGA DE PERFILES ESTÁ EN LA FUNCIÓN CORRECTA
-        self.load_known_faces()
-        # ------------------------------------------
-
         try:
             image = self._file_to_image(image_file)
             if image is None:
                 return self._create_recognition_result_from_file(False, None, 0.0, image_file, camera_location)
 
-            face_locations = face_recognition.face_locations(image)
-            if not face_locations:
-                return self._create_recognition_result_from_file(False, None, 0.0, image_file, camera_location)
-
-            face_encodings = face_recognition.face_encodings(image, face_locations)
-            if not face_encodings:
-                return self._create_recognition_result_from_file(False, None, 0.0, image_file, camera_location)
-
-            # --- CORRECCIÓN IMPORTANTE EN LA LÓGICA DE COMPARACIÓN ---
-            # Comparamos CADA cara encontrada en la imagen de entrada con TODAS las caras conocidas.
-            for face_encoding in face_encodings:
-                if not self.known_encodings:  # Si no hay caras conocidas, no hay nada que hacer
-                    break
-
-                matches = face_recognition.compare_faces(
-                    self.known_encodings, face_encoding, tolerance=self.tolerance
-                )
-
-                # Si hubo al menos una coincidencia
-                if True in matches:
-                    face_distances = face_recognition.face_distance(
-                        self.known_encodings, face_encoding
-                    )
-                    best_match_index = np.argmin(face_distances)
-
-                    # Verificamos si la mejor coincidencia es realmente una coincidencia válida
-                    if matches[best_match_index]:
-                        usuario = self.known_users[best_match_index]
-                        confidence = (1 - face_distances[best_match_index]) * 100
-                        # Si encontramos una coincidencia, retornamos inmediatamente.
-                        return self._create_recognition_result_from_file(
-                            True, usuario, confidence, image_file, camera_location
-                        )
-
-            # Si después de revisar todas las caras no encontramos ninguna coincidencia, retornamos "no identificado".
-            return self._create_recognition_result_from_file(False, None, 0.0, image_file, camera_location)
+            is_resident, usuario, confidence = self.analyze_image(image)
+            return self._create_recognition_result_from_file(
+                is_resident, usuario, confidence, image_file, camera_location
+            )
 
         except Exception as e:
             logger.error(f"Error en reconocimiento facial desde archivo: {e}")
@@ -355,43 +502,14 @@ class FacialRecognitionService:
                 prefix=f"detection_{camera_location.lower().replace(' ', '_')}"
             )
 
-            reconocimiento = ReconocimientoFacial.objects.create(
-                codigo_usuario=usuario,
-                imagen_path=upload_result['file_path'] if upload_result else None,
-                imagen_url=upload_result['public_url'] if upload_result else None,
-                confianza=confidence,
-                es_residente=is_resident,
-                ubicacion_camara=camera_location,
-                estado='permitido' if is_resident else 'denegado'
-            )
+            reconocimiento = self._build_recognition(is_resident, usuario, confidence, upload_result, camera_location)
+            reconocimiento.save()
 
-            return {
-                'id': reconocimiento.id,
-                'is_resident': is_resident,
-                'user': {
-                    'codigo': usuario.codigo if usuario else None,
-                    'nombre': f"{usuario.nombre} {usuario.apellido}" if usuario else "Desconocido",
-                    'correo': usuario.correo if usuario else None
-                } if usuario else None,
-                'confidence': round(confidence, 2),
-                'timestamp': reconocimiento.fecha_deteccion.isoformat(),
-                'camera_location': camera_location,
-                'status': 'permitido' if is_resident else 'denegado',
-                'image_url': reconocimiento.imagen_url
-            }
+            return self._recognition_payload(reconocimiento, is_resident, usuario, confidence, camera_location)
 
         except Exception as e:
             logger.error(f"Error creando resultado de reconocimiento desde archivo: {e}")
-            return {
-                'id': None,
-                'is_resident': False,
-                'user': None,
-                'confidence': 0.0,
-                'timestamp': None,
-                'camera_location': camera_location,
-                'status': 'error',
-                'image_url': None
-            }
+            return self._recognition_error_payload(camera_location)
 
     def _file_to_image(self, image_file: InMemoryUploadedFile) -> Optional[np.ndarray]:
         """Convierte archivo Django a imagen numpy"""
@@ -453,15 +571,14 @@ class FacialRecognitionService:
                 prefix=f"{access_type}_{camera_location.lower().replace(' ', '_')}"
             )
 
-            vehiculo = None
-            if plate:
-                vehiculo = Vehiculo.objects.filter(nro_placa__iexact=plate).first()
+            vehiculo = plate_index.lookup(plate) if plate else None
 
             deteccion = DeteccionPlaca.objects.create(
                 placa_detectada=plate or "No detectada",
                 vehiculo=vehiculo,
                 imagen_path=upload_result['file_path'] if upload_result else None,
                 imagen_url=upload_result['public_url'] if upload_result else None,
+                imagenes_derivadas=derived_images_value(upload_result),
                 confianza=confidence,
                 es_autorizado=is_authorized,
                 ubicacion_camara=camera_location,
@@ -520,11 +637,27 @@ class FacialRecognitionService:
 class PlateDetectionService:
     """Servicio para detección de placas usando EasyOCR"""
 
-    def __init__(self):
+    def __init__(self, ocr_batching: bool = False):
         self.reader = easyocr.Reader(['en', 'es'])
         self.plate_pattern = re.compile(r'^[A-Z]{3}-?\d{4}$|^\d{4}-?[A-Z]{3}$')
         self.storage_service = SupabaseStorageService()
         self.confidence_threshold = settings.AI_IMAGE_SETTINGS.get('PLATE_CONFIDENCE_THRESHOLD', 0.5)
+        self.fuzzy_max_distance = settings.AI_IMAGE_SETTINGS.get('PLATE_FUZZY_MAX_DISTANCE', 0.5)
+        self.plate_allowlist = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-'
+        self.plate_max_candidates = settings.AI_IMAGE_SETTINGS.get('PLATE_MAX_CANDIDATES', 4)
+        self.plate_min_aspect, self.plate_max_aspect = settings.AI_IMAGE_SETTINGS.get('PLATE_ASPECT_RANGE', (2.0, 6.0))
+        self.plate_min_area, self.plate_max_area = settings.AI_IMAGE_SETTINGS.get('PLATE_AREA_RANGE', (0.002, 0.15))
+        # En el worker, los recortes de varias cámaras se leen juntos en una sola llamada al OCR
+        self.ocr_batcher = OCRBatcher(
+            self.reader, self.plate_allowlist,
+            max_batch=settings.AI_IMAGE_SETTINGS.get('PLATE_OCR_BATCH_SIZE', 16),
+            max_wait_ms=settings.AI_IMAGE_SETTINGS.get('PLATE_OCR_BATCH_WAIT_MS', 15)
+        ) if ocr_batching else None
+        try:
+            plate_index.ensure_loaded()
+        except Exception as e:
+            # Sin BD al arrancar: se cargará en la primera detección
+            logger.error(f"Error cargando índice de placas: {e}")
 
     def detect_plate(self, image_base64: str, camera_location: str = "Estacionamiento",
                      access_type: str = "entrada") -> Dict:
@@ -535,28 +668,124 @@ class PlateDetectionService:
                 return self._create_detection_result(None, False, 0.0, image_base64,
                                                      camera_location, access_type)
 
-            processed_image = self._preprocess_image(image)
-            results = self.reader.readtext(processed_image)
-
-            for (bbox, text, confidence) in results:
-                clean_text = self._clean_plate_text(text)
-
-                if self._is_valid_plate(clean_text) and confidence > self.confidence_threshold:
-                    is_authorized = self._check_authorization(clean_text)
-
-                    return self._create_detection_result(
-                        clean_text, is_authorized, confidence * 100,
-                        image_base64, camera_location, access_type
-                    )
-
-            return self._create_detection_result(None, False, 0.0, image_base64,
-                                                 camera_location, access_type)
+            plate, is_authorized, confidence = self.analyze_plate(image)
+            return self._deduplicated(
+                plate, is_authorized, camera_location, access_type,
+                lambda: self._create_detection_result(plate, is_authorized, confidence, image_base64,
+                                                      camera_location, access_type)
+            )
 
         except Exception as e:
             logger.error(f"Error en detección de placa: {e}")
             return self._create_detection_result(None, False, 0.0, image_base64,
                                                  camera_location, access_type)
 
+    def analyze_plate(self, image: np.ndarray) -> Tuple[Optional[str], bool, float]:
+        """Etapa de inferencia: OCR de la imagen ya decodificada y verificación de la placa"""
+        processed_image = self._preprocess_image(image)
+
+        # Primero solo las regiones con forma de placa; el OCR de todo el frame queda como respaldo
+        candidates = self._locate_plate_candidates(processed_image)
+        if candidates and self.ocr_batcher is not None:
+            futures = [(box, self.ocr_batcher.submit(processed_image[box[2]:box[3], box[0]:box[1]]))
+                       for box in candidates]
+            results = [(box, text, confidence)
+                       for box, future in futures
+                       for text, confidence in future.result()]
+        elif candidates:
+            results = self.reader.recognize(
+                processed_image,
+                horizontal_list=candidates,
+                free_list=[],
+                allowlist=self.plate_allowlist,
+                batch_size=len(candidates)
+            )
+        else:
+            return self._select_plate(self.reader.readtext(processed_image))
+
+        selected = self._select_plate(results)
+        if selected[0] is None:
+            # Ningún candidato dio una placa (contorno mal recortado, placa inclinada...): todo el frame
+            selected = self._select_plate(self.reader.readtext(processed_image))
+        return selected
+
+    def _select_plate(self, results: List) -> Tuple[Optional[str], bool, float]:
+        """Elige la lectura del OCR: autorizada exacta, autorizada aproximada o la primera válida"""
+        first_valid = None
+        for (bbox, text, confidence) in results:
+            if confidence <= self.confidence_threshold:
+                continue
+            clean_text = self._clean_plate_text(text)
+
+            if self._is_valid_plate(clean_text):
+                if self._check_authorization(clean_text):
+                    return clean_text, True, confidence * 100
+                # Una lectura bien formada se respeta: otra placa a un carácter es otro vehículo
+                first_valid = first_valid or (clean_text, False, confidence * 100)
+                continue
+
+            # Lectura con formato inválido: puede ser un residente mal leído (0/O, 1/I, 8/B, 5/S...)
+            fuzzy_plate = self._fuzzy_authorized_plate(clean_text)
+            if fuzzy_plate:
+                return fuzzy_plate, True, confidence * 100
+
+        return first_valid or (None, False, 0.0)
+
+    def _locate_plate_candidates(self, processed_image: np.ndarray) -> List[List[int]]:
+        """
+        Regiones candidatas a placa sobre la imagen preprocesada: bordes, cierre
+        morfológico horizontal y contornos filtrados por relación de aspecto y
+        área. Devuelve cajas [x_min, x_max, y_min, y_max] (formato de EasyOCR),
+        de mayor a menor área.
+        """
+        try:
+            if processed_image.ndim != 2:
+                return []
+            height, width = processed_image.shape
+            image_area = float(height * width)
+
+            edges = cv2.Canny(processed_image, 50, 200)
+            kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (17, 5))
+            closed = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, kernel)
+            contours, _ = cv2.findContours(closed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+            boxes = []
+            for contour in contours:
+                x, y, w, h = cv2.boundingRect(contour)
+                if h == 0:
+                    continue
+                area_ratio = (w * h) / image_area
+                if (self.plate_min_aspect <= w / h <= self.plate_max_aspect
+                        and self.plate_min_area <= area_ratio <= self.plate_max_area):
+                    boxes.append((w * h, x, y, w, h))
+
+            candidates = []
+            for _, x, y, w, h in sorted(boxes, reverse=True)[:self.plate_max_candidates]:
+                pad_x, pad_y = int(w * 0.1), int(h * 0.2)
+                candidates.append([max(x - pad_x, 0), min(x + w + pad_x, width),
+                                   max(y - pad_y, 0), min(y + h + pad_y, height)])
+            return candidates
+
+        except Exception as e:
+            logger.error(f"Error localizando regiones de placa: {e}")
+            return []
+
+    def _fuzzy_authorized_plate(self, text: str) -> Optional[str]:
+        """
+        Placa autorizada registrada que difiere de la lectura solo en caracteres
+        confundibles por el OCR, dentro del umbral configurado
+        """
+        try:
+            match = plate_index.fuzzy_match(text, self.fuzzy_max_distance)
+        except Exception as e:
+            logger.error(f"Error en búsqueda aproximada de placa {text}: {e}")
+            return None
+        if match is None:
+            return None
+        vehiculo, distance = match
+        logger.info(f"Placa leída '{text}' corregida a '{vehiculo.nro_placa}' (distancia {distance})")
+        return vehiculo.nro_placa
+
     def _preprocess_image(self, image: np.ndarray) -> np.ndarray:
         """Preprocesa la imagen para mejor detección de placas"""
         try:
@@ -586,13 +815,9 @@ class PlateDetectionService:
         return bool(self.plate_pattern.match(text))
 
     def _check_authorization(self, plate: str) -> bool:
-        """Verifica si la placa está autorizada"""
+        """Verifica si la placa está autorizada (índice en memoria, sin consulta a la BD)"""
         try:
-            vehiculo = Vehiculo.objects.filter(
-                nro_placa__iexact=plate,
-                estado='activo'
-            ).first()
-            return vehiculo is not None
+            return plate_index.is_authorized(plate)
         except Exception as e:
             logger.error(f"Error verificando autorización de placa {plate}: {e}")
             return False
@@ -609,52 +834,193 @@ class PlateDetectionService:
                 prefix=f"{access_type}_{camera_location.lower().replace(' ', '_')}"
             )
 
-            vehiculo = None
-            if plate:
-                vehiculo = Vehiculo.objects.filter(nro_placa__iexact=plate).first()
+            deteccion = self._build_detection(plate, is_authorized, confidence, upload_result,
+                                              camera_location, access_type)
+            deteccion.save()
 
-            deteccion = DeteccionPlaca.objects.create(
-                placa_detectada=plate or "No detectada",
-                vehiculo=vehiculo,
-                imagen_path=upload_result['file_path'] if upload_result else None,
-                imagen_url=upload_result['public_url'] if upload_result else None,
-                confianza=confidence,
-                es_autorizado=is_authorized,
-                ubicacion_camara=camera_location,
-                tipo_acceso=access_type
+            return self._detection_payload(deteccion, plate, is_authorized, confidence, camera_location, access_type)
+
+        except Exception as e:
+            logger.error(f"Error creando resultado de detección: {e}")
+            return self._detection_error_payload(plate, camera_location, access_type)
+
+    def persist_detection_batched(self, writer: DetectionBatchWriter, plate: Optional[str], is_authorized: bool,
+                                  confidence: float, image_file, camera_location: str, access_type: str) -> Future:
+        """
+        Sube la imagen y encola la detección (y su reporte de placa no autorizada)
+        en el escritor por lotes. El Future devuelve la misma respuesta que
+        `_create_detection_result_from_file` más `report_id`.
+        """
+        try:
+            upload_result = self.storage_service.upload_django_file(
+                image_file,
+                folder="plates",
+                prefix=f"{access_type}_{camera_location.lower().replace(' ', '_')}"
             )
+            deteccion = self._build_detection(plate, is_authorized, confidence, upload_result,
+                                              camera_location, access_type)
+            report = None
+            if plate and not is_authorized:
+                report = ReporteSeguridad(
+                    tipo_evento='placa_no_autorizada',
+                    descripcion=f"Placa no autorizada detectada: {plate} en {camera_location}",
+                    nivel_alerta='medio'
+                )
 
-            return {
-                'id': deteccion.id,
-                'plate': plate,
-                'is_authorized': is_authorized,
-                'vehicle': {
-                    'id': vehiculo.id if vehiculo else None,
-                    'descripcion': vehiculo.descripcion if vehiculo else None,
-                    'estado': vehiculo.estado if vehiculo else None
-                } if vehiculo else None,
-                'confidence': round(confidence, 2),
-                'timestamp': deteccion.fecha_deteccion.isoformat(),
-                'camera_location': camera_location,
-                'access_type': access_type,
-                'status': 'autorizado' if is_authorized else 'no_autorizado',
-                'image_url': deteccion.imagen_url
-            }
+            def build_result(saved: DeteccionPlaca, saved_report: Optional[ReporteSeguridad]) -> Dict:
+                result = self._detection_payload(saved, plate, is_authorized, confidence, camera_location, access_type)
+                result['report_id'] = saved_report.id if saved_report else None
+                return result
+
+            return writer.submit_detection(deteccion, report, build_result)
 
         except Exception as e:
-            logger.error(f"Error creando resultado de detección: {e}")
-            return {
-                'id': None,
-                'plate': plate,
-                'is_authorized': False,
-                'vehicle': None,
-                'confidence': 0.0,
-                'timestamp': None,
-                'camera_location': camera_location,
-                'access_type': access_type,
-                'status': 'error',
-                'image_url': None
-            }
+            logger.error(f"Error encolando resultado de detección: {e}")
+            future = Future()
+            future.set_result(self._detection_error_payload(plate, camera_location, access_type))
+            return future
+
+    def persist_detection_deduplicated(self, writer: DetectionBatchWriter, plate: Optional[str],
+                                       is_authorized: bool, confidence: float, image_file,
+                                       camera_location: str, access_type: str) -> Future:
+        """
+        Como `persist_detection_batched`, pero una placa que se repite en la misma
+        cámara dentro de la ventana no sube imagen ni crea filas: devuelve la
+        respuesta de la primera lectura con `duplicate=True`.
+        """
+        if not plate:
+            return self.persist_detection_batched(writer, plate, is_authorized, confidence, image_file,
+                                                  camera_location, access_type)
+
+        event, is_new, expired = plate_events.observe((camera_location, access_type), plate, is_authorized)
+        self.close_plate_events(expired)
+
+        if not is_new:
+            duplicate = Future()
+            event.result.add_done_callback(
+                lambda first: duplicate.set_result(self._duplicate_result(event, first, plate,
+                                                                          camera_location, access_type))
+            )
+            return duplicate
+
+        saved = self.persist_detection_batched(writer, plate, is_authorized, confidence, image_file,
+                                               camera_location, access_type)
+        saved.add_done_callback(lambda done: self._resolve_event(event, done))
+        return saved
+
+    def _deduplicated(self, plate: Optional[str], is_authorized: bool, camera_location: str, access_type: str,
+                      create: Callable[[], Dict]) -> Dict:
+        """Versión síncrona de la deduplicación: `create` solo se ejecuta para la primera lectura"""
+        if not plate:
+            return create()
+
+        event, is_new, expired = plate_events.observe((camera_location, access_type), plate, is_authorized)
+        self.close_plate_events(expired)
+
+        if not is_new:
+            try:
+                event.result.result(timeout=60)
+            except Exception:
+                pass
+            return self._duplicate_result(event, event.result, plate, camera_location, access_type)
+
+        result = None
+        try:
+            result = create()
+        finally:
+            if result is None:
+                result = self._detection_error_payload(plate, camera_location, access_type)
+            event.result.set_result(result)
+        return result
+
+    def _resolve_event(self, event: PlateEvent, saved: Future):
+        """Propaga el resultado de la primera detección al evento"""
+        if saved.exception() is not None:
+            event.result.set_exception(saved.exception())
+        else:
+            event.result.set_result(saved.result())
+
+    def _duplicate_result(self, event: PlateEvent, first: Future, plate: str,
+                          camera_location: str, access_type: str) -> Dict:
+        """Respuesta de una lectura repetida: la de la primera lectura del evento, marcada como duplicada"""
+        if first.exception() is not None:
+            result = self._detection_error_payload(plate, camera_location, access_type)
+        else:
+            result = dict(first.result())
+        result.update({
+            'duplicate': True,
+            'hits': event.hits,
+            'first_seen': event.first_seen.isoformat(),
+            'last_seen': event.last_seen.isoformat()
+        })
+        return result
+
+    def close_plate_events(self, events: Optional[List[PlateEvent]] = None):
+        """Guarda el total de lecturas de los eventos cerrados (por defecto, los vencidos)"""
+        for event in (plate_events.expire() if events is None else events):
+            detection_id = event.detection_id()
+            if detection_id is None or event.hits <= 1:
+                continue
+            try:
+                DeteccionPlaca.objects.filter(id=detection_id).update(
+                    lecturas=event.hits,
+                    ultima_deteccion=event.last_seen
+                )
+            except Exception as e:
+                logger.error(f"Error guardando lecturas de la detección {detection_id}: {e}")
+
+    def _build_detection(self, plate: Optional[str], is_authorized: bool, confidence: float,
+                         upload_result: Optional[Dict], camera_location: str, access_type: str) -> DeteccionPlaca:
+        """Detección sin guardar, con su vehículo si la placa está registrada"""
+        vehiculo = plate_index.lookup(plate) if plate else None
+
+        return DeteccionPlaca(
+            placa_detectada=plate or "No detectada",
+            vehiculo=vehiculo,
+            imagen_path=upload_result['file_path'] if upload_result else None,
+            imagen_url=upload_result['public_url'] if upload_result else None,
+            imagenes_derivadas=derived_images_value(upload_result),
+            confianza=confidence,
+            es_autorizado=is_authorized,
+            ubicacion_camara=camera_location,
+            tipo_acceso=access_type
+        )
+
+    def _detection_payload(self, deteccion: DeteccionPlaca, plate: Optional[str], is_authorized: bool,
+                           confidence: float, camera_location: str, access_type: str) -> Dict:
+        """Respuesta de la API para una detección guardada"""
+        vehiculo = deteccion.vehiculo
+        return {
+            'id': deteccion.id,
+            'plate': plate,
+            'is_authorized': is_authorized,
+            'vehicle': {
+                'id': vehiculo.id if vehiculo else None,
+                'descripcion': vehiculo.descripcion if vehiculo else None,
+                'estado': vehiculo.estado if vehiculo else None
+            } if vehiculo else None,
+            'confidence': round(confidence, 2),
+            'timestamp': deteccion.fecha_deteccion.isoformat(),
+            'camera_location': camera_location,
+            'access_type': access_type,
+            'status': 'autorizado' if is_authorized else 'no_autorizado',
+            'image_url': deteccion.imagen_url
+        }
+
+    def _detection_error_payload(self, plate: Optional[str], camera_location: str, access_type: str) -> Dict:
+        """Respuesta de la API cuando no se pudo guardar la detección"""
+        return {
+            'id': None,
+            'plate': plate,
+            'is_authorized': False,
+            'vehicle': None,
+            'confidence': 0.0,
+            'timestamp': None,
+            'camera_location': camera_location,
+            'access_type': access_type,
+            'status': 'error',
+            'image_url': None
+        }
 
     def _base64_to_image(self, base64_string: str) -> Optional[np.ndarray]:
         """Convierte base64 a imagen numpy"""
@@ -686,22 +1052,12 @@ class PlateDetectionService:
                 return self._create_detection_result_from_file(None, False, 0.0, image_file,
                                                                camera_location, access_type)
 
-            processed_image = self._preprocess_image(image)
-            results = self.reader.readtext(processed_image)
-
-            for (bbox, text, confidence) in results:
-                clean_text = self._clean_plate_text(text)
-
-                if self._is_valid_plate(clean_text) and confidence > self.confidence_threshold:
-                    is_authorized = self._check_authorization(clean_text)
-
-                    return self._create_detection_result_from_file(
-                        clean_text, is_authorized, confidence * 100,
-                        image_file, camera_location, access_type
-                    )
-
-            return self._create_detection_result_from_file(None, False, 0.0, image_file,
-                                                           camera_location, access_type)
+            plate, is_authorized, confidence = self.analyze_plate(image)
+            return self._deduplicated(
+                plate, is_authorized, camera_location, access_type,
+                lambda: self._create_detection_result_from_file(plate, is_authorized, confidence, image_file,
+                                                                camera_location, access_type)
+            )
 
         except Exception as e:
             logger.error(f"Error en detección de placa desde archivo: {e}")
@@ -719,52 +1075,15 @@ class PlateDetectionService:
                 prefix=f"{access_type}_{camera_location.lower().replace(' ', '_')}"
             )
 
-            vehiculo = None
-            if plate:
-                vehiculo = Vehiculo.objects.filter(nro_placa__iexact=plate).first()
-
-            deteccion = DeteccionPlaca.objects.create(
-                placa_detectada=plate or "No detectada",
-                vehiculo=vehiculo,
-                imagen_path=upload_result['file_path'] if upload_result else None,
-                imagen_url=upload_result['public_url'] if upload_result else None,
-                confianza=confidence,
-                es_autorizado=is_authorized,
-                ubicacion_camara=camera_location,
-                tipo_acceso=access_type
-            )
+            deteccion = self._build_detection(plate, is_authorized, confidence, upload_result,
+                                              camera_location, access_type)
+            deteccion.save()
 
-            return {
-                'id': deteccion.id,
-                'plate': plate,
-                'is_authorized': is_authorized,
-                'vehicle': {
-                    'id': vehiculo.id if vehiculo else None,
-                    'descripcion': vehiculo.descripcion if vehiculo else None,
-                    'estado': vehiculo.estado if vehiculo else None
-                } if vehiculo else None,
-                'confidence': round(confidence, 2),
-                'timestamp': deteccion.fecha_deteccion.isoformat(),
-                'camera_location': camera_location,
-                'access_type': access_type,
-                'status': 'autorizado' if is_authorized else 'no_autorizado',
-                'image_url': deteccion.imagen_url
-            }
+            return self._detection_payload(deteccion, plate, is_authorized, confidence, camera_location, access_type)
 
         except Exception as e:
             logger.error(f"Error creando resultado de detección desde archivo: {e}")
-            return {
-                'id': None,
-                'plate': plate,
-                'is_authorized': False,
-                'vehicle': None,
-                'confidence': 0.0,
-                'timestamp': None,
-                'camera_location': camera_location,
-                'access_type': access_type,
-                'status': 'error',
-                'image_url': None
-            }
+            return self._detection_error_payload(plate, camera_location, access_type)
 
     def _file_to_image(self, image_file: InMemoryUploadedFile) -> Optional[np.ndarray]:
         """Convierte archivo Django a imagen numpy"""
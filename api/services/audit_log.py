@@ -0,0 +1,94 @@
+# api/services/audit_log.py
+"""
+Bitácora escrita fuera del request: `registrar_bitacora` arma la fila (con
+la fecha y hora del evento) y la encola; un hilo la inserta con bulk_create
+junto con las demás cada AUDIT_LOG_BATCH_SIZE filas o AUDIT_LOG_FLUSH_MS
+milisegundos. Al terminar el proceso se escribe lo pendiente; si el escritor
+ya está cerrado (o AUDIT_LOG_ASYNC está desactivado) se escribe en el momento.
+"""
+import atexit
+import threading
+from typing import List, Optional
+from django.conf import settings
+from django.utils import timezone
+from ..authentication import get_usuario
+from ..models import Bitacora
+from .batch_writer import WriteBehindBatcher
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def write_bitacora(entries: List[Bitacora]) -> List[Bitacora]:
+    """Inserta filas de bitácora sin guardar en un solo INSERT"""
+    for entry in entries:
+        # Reintento de un lote fallido: el id asignado antes ya no existe
+        entry.pk = None
+    return Bitacora.objects.bulk_create(entries)
+
+
+class BitacoraWriter(WriteBehindBatcher):
+    """Escritor por lotes de Bitacora (un hilo por proceso)"""
+
+    def __init__(self, max_batch: int = 100, max_wait_ms: int = 500):
+        super().__init__(write_bitacora, max_batch, max_wait_ms, name="bitacora-writer")
+
+
+_writer: Optional[BitacoraWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_bitacora_writer() -> Optional[BitacoraWriter]:
+    """Escritor del proceso, creado en el primer uso (None si la bitácora es síncrona)"""
+    global _writer
+    if not settings.AUDIT_LOG_ASYNC:
+        return None
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = BitacoraWriter(settings.AUDIT_LOG_BATCH_SIZE, settings.AUDIT_LOG_FLUSH_MS)
+                atexit.register(close_bitacora_writer)
+    return _writer
+
+
+def close_bitacora_writer(timeout: Optional[float] = 10):
+    """Escribe lo pendiente y detiene el hilo (se llama solo al salir del proceso)"""
+    if _writer is not None:
+        _writer.close(timeout)
+
+
+def client_ip(request) -> Optional[str]:
+    forwarded = request.META.get("HTTP_X_FORWARDED_FOR")
+    return forwarded.split(",")[0].strip() if forwarded else request.META.get("REMOTE_ADDR")
+
+
+def registrar_bitacora(request, accion: str):
+    """
+    Registra una acción del usuario autenticado. No consulta nada (el Usuario
+    ya está resuelto en el request) ni espera al INSERT. Sin Usuario del
+    condominio no se registra nada.
+    """
+    usuario = get_usuario(request)
+    if usuario is None:
+        return
+    now = timezone.now()
+    entry = Bitacora(
+        codigo_usuario=usuario,
+        accion=accion,
+        fecha=now.date(),
+        hora=now.time(),
+        ip=client_ip(request),
+    )
+
+    writer = get_bitacora_writer()
+    if writer is not None:
+        try:
+            writer.submit(entry)
+            return
+        except RuntimeError:
+            # El proceso está terminando y el escritor ya se cerró
+            pass
+    try:
+        write_bitacora([entry])
+    except Exception as e:
+        logger.error(f"Error registrando bitácora '{accion}': {e}")
@@ -0,0 +1,187 @@
+# api/services/batch_writer.py
+import threading
+import queue
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Tuple
+from django.db import close_old_connections, transaction
+from ..models import ReconocimientoFacial, DeteccionPlaca, ReporteSeguridad, normalize_plate
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBatcher:
+    """
+    Agrupa escrituras en un hilo propio: junta elementos durante `max_wait_ms`
+    (o hasta `max_batch`) y los escribe de una vez con `flush_func(items)`,
+    que devuelve un resultado por elemento. Cada `submit` devuelve un Future
+    con el resultado de su elemento.
+
+    Si la escritura del lote falla se reintenta elemento por elemento, para que
+    una fila inválida no haga fallar a las demás.
+    """
+
+    def __init__(self, flush_func: Callable[[List[Any]], List[Any]], max_batch: int = 100,
+                 max_wait_ms: int = 20, name: str = "batch-writer"):
+        self.flush_func = flush_func
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: queue.Queue = queue.Queue()
+        self._closed = False
+        self.batches = 0
+        self.items = 0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        """Encola un elemento; el Future se resuelve cuando su lote se escribe"""
+        if self._closed:
+            raise RuntimeError("El escritor por lotes está cerrado")
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def close(self, timeout: Optional[float] = None):
+        """Escribe lo pendiente y detiene el hilo"""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            stop = self._collect(batch)
+            self._flush(batch)
+            if stop:
+                return
+
+    def _collect(self, batch: List[Tuple[Any, Future]]) -> bool:
+        """Completa el lote hasta llenarlo o agotar la espera; devuelve True si se pidió cerrar"""
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                entry = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                return False
+            if entry is None:
+                return True
+            batch.append(entry)
+        return False
+
+    def _flush(self, batch: List[Tuple[Any, Future]]):
+        close_old_connections()
+        items = [item for item, _ in batch]
+        try:
+            results = self.flush_func(items)
+        except Exception as e:
+            logger.error(f"Error escribiendo lote de {len(items)} elementos, reintentando uno por uno: {e}")
+            results = None
+
+        if results is not None:
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+        else:
+            for item, future in batch:
+                try:
+                    future.set_result(self.flush_func([item])[0])
+                except Exception as e:
+                    logger.error(f"Error escribiendo elemento: {e}")
+                    future.set_exception(e)
+
+        self.batches += 1
+        self.items += len(batch)
+
+
+class DetectionBatchWriter(WriteBehindBatcher):
+    """
+    Escritor por lotes de ReconocimientoFacial / DeteccionPlaca y de su
+    ReporteSeguridad asociado. Los padres se insertan con bulk_create (en
+    PostgreSQL devuelve los ids), luego se enlazan e insertan los reportes,
+    todo en una sola transacción por lote.
+    """
+
+    def __init__(self, max_batch: int = 100, max_wait_ms: int = 20):
+        super().__init__(write_detections, max_batch, max_wait_ms, name="detection-writer")
+
+    def submit_detection(self, record, report: Optional[ReporteSeguridad] = None,
+                         build_result: Optional[Callable[[Any, Optional[ReporteSeguridad]], Any]] = None) -> Future:
+        """
+        Encola un registro sin guardar (y su reporte opcional). El Future
+        devuelve `build_result(record, report)` ya con los ids asignados, o
+        la tupla (record, report) si no se indica.
+        """
+        outer = Future()
+        inner = self.submit((record, report))
+
+        def _done(done: Future):
+            try:
+                saved_record, saved_report = done.result()
+                outer.set_result(build_result(saved_record, saved_report) if build_result
+                                 else (saved_record, saved_report))
+            except Exception as e:
+                outer.set_exception(e)
+
+        inner.add_done_callback(_done)
+        return outer
+
+
+# Fecha de creación (auto_now_add) de cada modelo que escribe write_detections
+DATE_FIELDS = {ReconocimientoFacial: 'fecha_deteccion', DeteccionPlaca: 'fecha_deteccion', ReporteSeguridad: 'fecha_evento'}
+
+
+def write_detections(items: List[Tuple[Any, Optional[ReporteSeguridad]]]) -> List[Tuple[Any, Optional[ReporteSeguridad]]]:
+    """
+    Inserta en una transacción registros sin guardar (ReconocimientoFacial /
+    DeteccionPlaca) con bulk_create y después sus reportes ya enlazados.
+
+    Si un registro o reporte ya trae su fecha (p. ej. el momento del frame al
+    re-procesar una grabación) se conserva: auto_now_add la pisa en el INSERT
+    y se vuelve a escribir en la misma transacción.
+    """
+    # Si es el reintento de un lote fallido, los ids asignados antes del rollback ya no existen
+    for record, report in items:
+        record.pk = None
+        # bulk_create no pasa por save(): la clave normalizada se calcula aquí
+        if isinstance(record, DeteccionPlaca):
+            record.placa_normalizada = normalize_plate(record.placa_detectada)
+        if report is not None:
+            report.pk = None
+
+    dated = [(obj, DATE_FIELDS[type(obj)], getattr(obj, DATE_FIELDS[type(obj)]))
+             for record, report in items for obj in (record, report)
+             if obj is not None and getattr(obj, DATE_FIELDS[type(obj)]) is not None]
+
+    with transaction.atomic():
+        for model in (ReconocimientoFacial, DeteccionPlaca):
+            records = [record for record, _ in items if isinstance(record, model)]
+            if records:
+                model.objects.bulk_create(records)
+
+        reports = []
+        for record, report in items:
+            if report is None:
+                continue
+            if isinstance(record, ReconocimientoFacial):
+                report.reconocimiento_facial = record
+            else:
+                report.deteccion_placa = record
+            reports.append(report)
+        if reports:
+            ReporteSeguridad.objects.bulk_create(reports)
+
+        for obj, field, value in dated:
+            setattr(obj, field, value)
+        for model, field in DATE_FIELDS.items():
+            objs = [obj for obj, _, _ in dated if isinstance(obj, model)]
+            if objs:
+                model.objects.bulk_update(objs, [field])
+
+    return items
@@ -0,0 +1,111 @@
+# api/services/catalog_cache.py
+"""
+Cache por proceso de las tablas de catálogo (Rol, Pagos, AreasComunes, Multa,
+Tareas, Horarios): son pocas filas que casi nunca cambian y se consultan en
+cada login, estado de cuenta o recordatorio.
+
+Cada tabla se carga entera la primera vez y se guarda junto con su versión.
+La versión vive en el cache de Django y la sube `invalidate_catalog` (desde
+las señales post_save / post_delete de api/signals.py). Con CACHE_URL el
+cache de Django es compartido y el cambio llega a todos los procesos en su
+próxima lectura; sin él solo hay invalidación dentro del proceso, y
+api/checks.py exige un único proceso web.
+CATALOG_CACHE_TTL acota lo que dura una tabla aunque no llegue la invalidación
+(p. ej. un UPDATE hecho fuera de Django).
+
+Los objetos devueltos se comparten entre requests: son de solo lectura. Lo
+que no puede aceptar datos viejos (p. ej. el monto que se cobra en un pago)
+lee la tabla directamente.
+"""
+import threading
+import time
+from typing import Dict, List, Tuple, Type
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models
+from ..models import AreasComunes, Horarios, Multa, Pagos, Rol, Tareas
+import logging
+
+logger = logging.getLogger(__name__)
+
+CATALOG_MODELS = (Rol, Pagos, AreasComunes, Multa, Tareas, Horarios)
+
+# label -> (versión, cargada en, filas ordenadas por pk, filas por pk)
+_tables: Dict[str, Tuple[int, float, List[models.Model], Dict[object, models.Model]]] = {}
+_lock = threading.Lock()
+
+
+def _version_key(model: Type[models.Model]) -> str:
+    return f"catalog:version:{model._meta.label_lower}"
+
+
+def _current_version(model: Type[models.Model]) -> int:
+    return cache.get(_version_key(model)) or 0
+
+
+def _table(model: Type[models.Model]):
+    if model not in CATALOG_MODELS:
+        raise ValueError(f"{model.__name__} no es una tabla de catálogo")
+    label = model._meta.label_lower
+    version = _current_version(model)
+    cached = _tables.get(label)
+    if cached and cached[0] == version and time.monotonic() - cached[1] < settings.CATALOG_CACHE_TTL:
+        return cached
+
+    with _lock:
+        cached = _tables.get(label)
+        if cached and cached[0] == version and time.monotonic() - cached[1] < settings.CATALOG_CACHE_TTL:
+            return cached
+        rows = list(model.objects.order_by('pk'))
+        cached = (version, time.monotonic(), rows, {row.pk: row for row in rows})
+        _tables[label] = cached
+        logger.debug(f"Catálogo {model.__name__} cargado: {len(rows)} filas (versión {version})")
+        return cached
+
+
+def catalog_all(model: Type[models.Model]) -> List[models.Model]:
+    """Todas las filas del catálogo, ordenadas por pk"""
+    return list(_table(model)[2])
+
+
+def catalog_get(model: Type[models.Model], pk) -> models.Model:
+    """Fila por pk; lanza model.DoesNotExist igual que objects.get(pk=...)"""
+    try:
+        pk = model._meta.pk.to_python(pk)
+    except Exception:
+        raise model.DoesNotExist(f"{model.__name__} con pk inválida: {pk!r}")
+    row = _table(model)[3].get(pk)
+    if row is None:
+        raise model.DoesNotExist(f"No existe {model.__name__} con pk {pk}")
+    return row
+
+
+def catalog_filter(model: Type[models.Model], **lookups) -> List[models.Model]:
+    """
+    Filtro en memoria sobre el catálogo. Admite igualdad (`campo=valor`) y
+    pertenencia (`campo__in=[...]`), que es lo que usan las vistas.
+    """
+    conditions = []
+    for lookup, value in lookups.items():
+        field, _, operator = lookup.partition('__')
+        if operator == 'in':
+            values = set(value)
+            conditions.append(lambda row, field=field, values=values: getattr(row, field) in values)
+        elif not operator:
+            conditions.append(lambda row, field=field, value=value: getattr(row, field) == value)
+        else:
+            raise ValueError(f"Lookup no soportado por el cache de catálogos: {lookup}")
+    return [row for row in _table(model)[2] if all(condition(row) for condition in conditions)]
+
+
+def invalidate_catalog(model: Type[models.Model]):
+    """Sube la versión de la tabla: la próxima lectura (de cualquier proceso) la vuelve a cargar"""
+    key = _version_key(model)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # La clave expiró o fue desalojada entre add e incr
+        cache.set(key, _current_version(model) + 1, None)
+    with _lock:
+        _tables.pop(model._meta.label_lower, None)
@@ -0,0 +1,192 @@
+# api/services/face_backends.py
+
+try:
+    import cv2
+    import face_recognition
+except ImportError:
+    # Igual que en ai_detection: estas librerías solo existen en el worker.
+    cv2 = None
+    face_recognition = None
+
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+import numpy as np
+import json
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+from django.conf import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Cajas en el formato de face_recognition: (top, right, bottom, left)
+Box = Tuple[int, int, int, int]
+
+
+class FaceEmbeddingBackend(ABC):
+    """
+    Interfaz común de los backends de reconocimiento facial.
+
+    Cada backend sabe detectar caras, generar un embedding por caja y define
+    la métrica y la tolerancia con la que se comparan sus embeddings. Los
+    embeddings de backends distintos no son comparables entre sí.
+    """
+
+    name = 'base'
+    metric = 'euclidean'
+    tolerance_setting = 'FACE_TOLERANCE'
+    default_tolerance = 0.6
+
+    def __init__(self, tolerance: Optional[float] = None):
+        self.tolerance = tolerance if tolerance is not None else self.configured_tolerance()
+
+    @classmethod
+    def configured_tolerance(cls) -> float:
+        """Tolerancia configurada para este backend (sin necesidad de instanciarlo)"""
+        return settings.AI_IMAGE_SETTINGS.get(cls.tolerance_setting, cls.default_tolerance)
+
+    @abstractmethod
+    def detect(self, image: np.ndarray) -> List[Box]:
+        """Devuelve las cajas de las caras encontradas en una imagen RGB"""
+
+    @abstractmethod
+    def encode(self, image: np.ndarray, boxes: List[Box]) -> List[np.ndarray]:
+        """Devuelve un embedding por cada caja"""
+
+    def distance(self, known: np.ndarray, encoding: np.ndarray) -> np.ndarray:
+        """Distancias de un embedding contra una matriz de embeddings conocidos"""
+        known = np.asarray(known, dtype=np.float64)
+        encoding = np.asarray(encoding, dtype=np.float64)
+        if self.metric == 'cosine':
+            known = known / np.linalg.norm(known, axis=1, keepdims=True)
+            return 1.0 - known @ (encoding / np.linalg.norm(encoding))
+        return np.linalg.norm(known - encoding, axis=1)
+
+
+class DlibFaceBackend(FaceEmbeddingBackend):
+    """HOG de dlib para detección y ResNet de face_recognition para los embeddings"""
+
+    name = 'dlib'
+    metric = 'euclidean'
+
+    def detect(self, image: np.ndarray) -> List[Box]:
+        return face_recognition.face_locations(image)
+
+    def encode(self, image: np.ndarray, boxes: List[Box]) -> List[np.ndarray]:
+        return face_recognition.face_encodings(image, boxes)
+
+
+class OnnxFaceBackend(FaceEmbeddingBackend):
+    """
+    Backend optimizado para CPU: YuNet (OpenCV DNN) para detectar y un modelo
+    de embeddings tipo ArcFace (entrada 112x112) ejecutado con ONNX Runtime.
+    """
+
+    name = 'onnx'
+    metric = 'cosine'
+    tolerance_setting = 'FACE_ONNX_TOLERANCE'
+    default_tolerance = 0.5
+    input_size = (112, 112)
+
+    def __init__(self, tolerance: Optional[float] = None):
+        super().__init__(tolerance)
+        if onnxruntime is None or cv2 is None:
+            raise RuntimeError("El backend 'onnx' requiere onnxruntime y opencv instalados")
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = settings.AI_IMAGE_SETTINGS.get('FACE_ONNX_THREADS', 0)
+        self.session = onnxruntime.InferenceSession(
+            settings.AI_IMAGE_SETTINGS['FACE_ONNX_EMBEDDING_MODEL'],
+            sess_options=options,
+            providers=['CPUExecutionProvider']
+        )
+        self.input_name = self.session.get_inputs()[0].name
+        self.detector = cv2.FaceDetectorYN.create(
+            settings.AI_IMAGE_SETTINGS['FACE_ONNX_DETECTOR_MODEL'], "", (320, 320),
+            settings.AI_IMAGE_SETTINGS.get('FACE_ONNX_DETECTION_SCORE', 0.8)
+        )
+
+    def detect(self, image: np.ndarray) -> List[Box]:
+        height, width = image.shape[:2]
+        self.detector.setInputSize((width, height))
+        _, faces = self.detector.detect(cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+        if faces is None:
+            return []
+
+        boxes = []
+        for x, y, w, h in faces[:, :4]:
+            left, top = max(int(x), 0), max(int(y), 0)
+            right, bottom = min(int(x + w), width), min(int(y + h), height)
+            if right > left and bottom > top:
+                boxes.append((top, right, bottom, left))
+        return boxes
+
+    def encode(self, image: np.ndarray, boxes: List[Box]) -> List[np.ndarray]:
+        if not boxes:
+            return []
+
+        crops = []
+        for top, right, bottom, left in boxes:
+            crop = cv2.resize(image[top:bottom, left:right], self.input_size)
+            crops.append((crop.astype(np.float32) - 127.5) / 127.5)
+
+        # Todas las caras de la imagen en una sola inferencia (NCHW)
+        batch = np.ascontiguousarray(np.stack(crops).transpose(0, 3, 1, 2))
+        embeddings = self.session.run(None, {self.input_name: batch})[0]
+        embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return [embedding.astype(np.float64) for embedding in embeddings]
+
+
+def read_encoding(perfil, backend_name: str) -> Optional[List[float]]:
+    """Encoding de un PerfilFacial para un backend ('dlib' usa la columna original)"""
+    if backend_name == DlibFaceBackend.name:
+        return json.loads(perfil.encoding_facial) if perfil.encoding_facial else None
+    return json.loads(perfil.encodings_backend or '{}').get(backend_name)
+
+
+def encoding_fields(backend_name: str, encoding, perfil=None) -> Dict[str, Optional[str]]:
+    """
+    Columnas de PerfilFacial a guardar para un encoding. Sin `perfil` (registro de
+    una imagen nueva) se descartan los encodings de otros backends, que serían
+    de la imagen anterior; con `perfil` se conservan (re-codificación).
+    """
+    encoding = [float(value) for value in encoding]
+    if backend_name == DlibFaceBackend.name:
+        fields = {'encoding_facial': json.dumps(encoding)}
+        if perfil is None:
+            fields['encodings_backend'] = None
+        return fields
+
+    others = json.loads(perfil.encodings_backend or '{}') if perfil is not None else {}
+    others[backend_name] = encoding
+    fields = {'encodings_backend': json.dumps(others)}
+    if perfil is None:
+        fields['encoding_facial'] = ''
+    return fields
+
+
+FACE_BACKENDS = {
+    DlibFaceBackend.name: DlibFaceBackend,
+    OnnxFaceBackend.name: OnnxFaceBackend,
+}
+
+_backends: Dict[str, FaceEmbeddingBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_face_backend(name: Optional[str] = None) -> FaceEmbeddingBackend:
+    """Devuelve (una sola vez por proceso) el backend configurado o el pedido por nombre"""
+    name = name or settings.AI_IMAGE_SETTINGS.get('FACE_BACKEND', 'dlib')
+    if name not in FACE_BACKENDS:
+        raise ValueError(f"Backend facial desconocido: {name}")
+    if name not in _backends:
+        # Cargar un modelo dos veces a la vez (dos hilos del worker) es caro: uno solo lo crea
+        with _backends_lock:
+            if name not in _backends:
+                _backends[name] = FACE_BACKENDS[name]()
+                logger.info(f"Backend facial '{name}' inicializado")
+    return _backends[name]
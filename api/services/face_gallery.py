@@ -0,0 +1,146 @@
+# api/services/face_gallery.py
+import numpy as np
+from typing import Callable, List, Optional, Tuple, Sequence
+import logging
+
+logger = logging.getLogger(__name__)
+
+PRECISIONS = ('float32', 'int8')
+METRICS = ('euclidean', 'cosine')
+
+
+class FaceGallery:
+    """
+    Galería compacta de encodings faciales.
+
+    La primera pasada calcula distancias aproximadas sobre una representación
+    compacta (float32, o int8 con una escala por dimensión) y luego re-ordena
+    los `top_k` mejores candidatos con la distancia euclídea exacta en float64,
+    de modo que la decisión (mejor candidato y tolerancia) no cambia respecto a
+    `face_recognition.face_distance`.
+
+    Sin cargador, los encodings originales en float64 se conservan para el
+    re-ordenamiento. En modo int8 se puede pasar `exact_loader(keys)`, que
+    devuelve los encodings exactos de las claves pedidas; así en memoria solo
+    quedan los códigos int8 y el re-ordenamiento lee únicamente los `top_k`
+    candidatos.
+
+    Con `metric='cosine'` los encodings se normalizan al construir y al buscar;
+    como ||a - b||² = 2 - 2·cos(a, b) el orden es el mismo y la distancia
+    devuelta es 1 - cos(a, b).
+    """
+
+    def __init__(self, precision: str = 'float32', top_k: int = 5, chunk_size: int = 16384,
+                 exact_loader: Optional[Callable[[List], Sequence]] = None, metric: str = 'euclidean'):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Precisión de galería no soportada: {precision}")
+        if metric not in METRICS:
+            raise ValueError(f"Métrica de galería no soportada: {metric}")
+        self.precision = precision
+        self.metric = metric
+        self.top_k = max(1, int(top_k))
+        self.chunk_size = chunk_size
+        self.exact_loader = exact_loader if precision == 'int8' else None
+        self.users: List = []
+        self.keys: List = []
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+        self._exact = np.empty((0, 0), dtype=np.float64)
+        self._norms = np.empty(0, dtype=np.float32)
+        self._codes: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+
+    def __len__(self):
+        return len(self.users)
+
+    def build(self, encodings: Sequence, users: Sequence, keys: Optional[Sequence] = None) -> 'FaceGallery':
+        """Construye la galería a partir de encodings (float64), sus usuarios y claves opcionales"""
+        self.users = list(users)
+        self.keys = list(keys) if keys is not None else list(range(len(self.users)))
+        if not len(encodings):
+            self._vectors = np.empty((0, 0), dtype=np.float32)
+            self._exact = np.empty((0, 0), dtype=np.float64)
+            self._norms = np.empty(0, dtype=np.float32)
+            self._codes = None
+            self._scales = None
+            return self
+
+        exact = np.ascontiguousarray(self._prepare(encodings))
+        vectors = exact.astype(np.float32)
+        self._exact = exact if self.exact_loader is None else np.empty((0, 0), dtype=np.float64)
+
+        if self.precision == 'int8':
+            max_abs = np.abs(vectors).max(axis=0)
+            self._scales = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+            self._codes = np.clip(np.rint(vectors / self._scales), -127, 127).astype(np.int8)
+            dequantized = self._codes.astype(np.float32) * self._scales
+            self._norms = np.einsum('ij,ij->i', dequantized, dequantized)
+            # La primera pasada solo usa los códigos
+            self._vectors = np.empty((0, 0), dtype=np.float32)
+        else:
+            self._vectors = vectors
+            self._norms = np.einsum('ij,ij->i', vectors, vectors)
+
+        return self
+
+    @property
+    def nbytes(self) -> int:
+        """Memoria ocupada por la galería (sin contar la lista de usuarios)"""
+        total = self._vectors.nbytes + self._exact.nbytes + self._norms.nbytes
+        if self._codes is not None:
+            total += self._codes.nbytes + self._scales.nbytes
+        return total
+
+    def _prepare(self, vectors) -> np.ndarray:
+        """Encodings en float64, normalizados si la métrica es coseno"""
+        vectors = np.asarray(vectors, dtype=np.float64)
+        if self.metric == 'cosine':
+            norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+            vectors = vectors / np.where(norms > 0, norms, 1.0)
+        return vectors
+
+    def _approximate_distances(self, query: np.ndarray) -> np.ndarray:
+        """Distancias cuadradas aproximadas contra toda la galería"""
+        if self.precision == 'int8':
+            weighted_query = (query * self._scales).astype(np.float32)
+            dots = np.empty(len(self), dtype=np.float32)
+            for start in range(0, len(self), self.chunk_size):
+                block = self._codes[start:start + self.chunk_size].astype(np.float32)
+                dots[start:start + self.chunk_size] = block @ weighted_query
+        else:
+            dots = self._vectors @ query
+
+        return self._norms - 2.0 * dots + float(query @ query)
+
+    def search(self, encoding, top_k: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Devuelve los candidatos más cercanos como (índice, distancia exacta) ordenados"""
+        if not len(self):
+            return []
+
+        exact_query = self._prepare(encoding)
+        query = exact_query.astype(np.float32)
+        k = min(top_k or self.top_k, len(self))
+
+        approximate = self._approximate_distances(query)
+        if k < len(self):
+            candidates = np.argpartition(approximate, k - 1)[:k]
+        else:
+            candidates = np.arange(len(self))
+
+        exact = np.linalg.norm(self._exact_vectors(candidates) - exact_query, axis=1)
+        if self.metric == 'cosine':
+            exact = exact ** 2 / 2.0
+        order = np.argsort(exact)
+        return [(int(candidates[i]), float(exact[i])) for i in order]
+
+    def _exact_vectors(self, candidates: np.ndarray) -> np.ndarray:
+        """Encodings en float64 de los candidatos a re-ordenar"""
+        if self.exact_loader is None:
+            return self._exact[candidates]
+        return self._prepare(self.exact_loader([self.keys[i] for i in candidates]))
+
+    def best_match(self, encoding, tolerance: float) -> Optional[Tuple[int, float]]:
+        """Mejor coincidencia dentro de la tolerancia, o None"""
+        candidates = self.search(encoding)
+        if candidates and candidates[0][1] <= tolerance:
+            return candidates[0]
+        return None
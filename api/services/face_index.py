@@ -0,0 +1,116 @@
+# api/services/face_index.py
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+from django.conf import settings
+from ..models import PerfilFacial
+from .face_backends import FACE_BACKENDS, read_encoding
+from .face_gallery import FaceGallery
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class FaceIndex:
+    """
+    Galería de caras conocidas del proceso, una por backend de embeddings.
+
+    Se construye con una sola consulta y la comparten todas las instancias de
+    FacialRecognitionService. `invalidate()` fuerza la reconstrucción en el
+    siguiente uso (la llaman las señales de PerfilFacial y el endpoint
+    /invalidate_faces del worker); el TTL es una red de seguridad para cambios
+    hechos por otras vías (admin, SQL, otro proceso).
+
+    En modo int8 los encodings exactos de los candidatos se leen de la BD la
+    primera vez y quedan en un LRU acotado hasta la siguiente invalidación.
+    """
+
+    def __init__(self, ttl_seconds: int = 300, exact_cache_size: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self.exact_cache_size = exact_cache_size
+        self._lock = threading.Lock()
+        self._galleries: Dict[str, FaceGallery] = {}
+        self._loaded_at: Dict[str, float] = {}
+        self._exact: "OrderedDict[Tuple[str, int], List[float]]" = OrderedDict()
+        self._generation = 0
+
+    def load(self, backend_name: str) -> FaceGallery:
+        """Construye (o reconstruye) la galería de un backend con los perfiles activos"""
+        generation = self._generation
+        precision = settings.AI_IMAGE_SETTINGS.get('FACE_GALLERY_PRECISION', 'float32')
+        loader = partial(self._load_exact_encodings, backend_name) if precision == 'int8' else None
+        gallery = FaceGallery(precision, settings.AI_IMAGE_SETTINGS.get('FACE_GALLERY_TOP_K', 5),
+                              exact_loader=loader, metric=FACE_BACKENDS[backend_name].metric)
+
+        encodings = []
+        users = []
+        keys = []
+        for perfil in PerfilFacial.objects.filter(activo=True).select_related('codigo_usuario'):
+            try:
+                encoding = read_encoding(perfil, backend_name)
+                if encoding is None:
+                    # Perfil aún sin encoding para este backend (ver generar_encodings_faciales)
+                    continue
+                encodings.append(encoding)
+                users.append(perfil.codigo_usuario)
+                keys.append(perfil.id)
+            except Exception as e:
+                logger.error(f"Error cargando perfil facial {perfil.id}: {e}")
+        gallery.build(encodings, users, keys)
+
+        with self._lock:
+            self._galleries[backend_name] = gallery
+            # Si se invalidó mientras consultábamos, estos datos pueden estar viejos: se reconstruye de nuevo
+            if generation == self._generation:
+                self._loaded_at[backend_name] = time.monotonic()
+        logger.info(f"Cargados {len(gallery)} perfiles faciales para reconocimiento ({backend_name}).")
+        return gallery
+
+    def invalidate(self):
+        """Marca las galerías como desactualizadas; se reconstruyen en el próximo uso"""
+        with self._lock:
+            self._generation += 1
+            self._loaded_at.clear()
+            self._exact.clear()
+
+    def gallery(self, backend_name: str) -> FaceGallery:
+        """Galería del backend, reconstruida si nunca se cargó, se invalidó o venció el TTL"""
+        loaded_at = self._loaded_at.get(backend_name)
+        if loaded_at is None or time.monotonic() - loaded_at > self.ttl_seconds:
+            try:
+                return self.load(backend_name)
+            except Exception as e:
+                # Sin BD se sigue reconociendo con la última galería; se reintenta en el próximo uso
+                logger.error(f"Error cargando caras conocidas: {e}")
+        return self._galleries.get(backend_name) or FaceGallery(metric=FACE_BACKENDS[backend_name].metric)
+
+    def _load_exact_encodings(self, backend_name: str, perfil_ids: List[int]) -> List[List[float]]:
+        """Encodings exactos de los candidatos (solo en modo int8): del LRU o, los que falten, de la BD"""
+        generation = self._generation
+        with self._lock:
+            cached = {}
+            for perfil_id in perfil_ids:
+                encoding = self._exact.get((backend_name, perfil_id))
+                if encoding is not None:
+                    self._exact.move_to_end((backend_name, perfil_id))
+                    cached[perfil_id] = encoding
+        missing = [perfil_id for perfil_id in perfil_ids if perfil_id not in cached]
+        if missing:
+            perfiles = (PerfilFacial.objects.filter(id__in=missing)
+                        .only('id', 'encoding_facial', 'encodings_backend'))
+            loaded = {perfil.id: read_encoding(perfil, backend_name) for perfil in perfiles}
+            cached.update(loaded)
+            with self._lock:
+                # Un encoding leído antes de una invalidación puede ser el viejo: no se guarda
+                if generation == self._generation:
+                    for perfil_id, encoding in loaded.items():
+                        self._exact[(backend_name, perfil_id)] = encoding
+                    while len(self._exact) > self.exact_cache_size:
+                        self._exact.popitem(last=False)
+        return [cached[perfil_id] for perfil_id in perfil_ids]
+
+
+face_index = FaceIndex(settings.AI_IMAGE_SETTINGS.get('FACE_GALLERY_TTL', 300),
+                       settings.AI_IMAGE_SETTINGS.get('FACE_GALLERY_EXACT_CACHE', 1024))
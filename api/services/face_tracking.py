@@ -0,0 +1,116 @@
+# api/services/face_tracking.py
+import numpy as np
+from typing import List, Tuple, Optional
+
+# Cajas en el formato de face_recognition: (top, right, bottom, left)
+Box = Tuple[int, int, int, int]
+
+
+def box_iou(a: Box, b: Box) -> float:
+    """Intersección sobre unión de dos cajas (top, right, bottom, left)"""
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    if bottom <= top or right <= left:
+        return 0.0
+    intersection = (bottom - top) * (right - left)
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    return intersection / float(area_a + area_b - intersection)
+
+
+def face_quality(image: np.ndarray, box: Box) -> float:
+    """Calidad de una cara: área de la caja ponderada por su nitidez (varianza del laplaciano)"""
+    top, right, bottom, left = box
+    crop = image[max(top, 0):bottom, max(left, 0):right]
+    if crop.size == 0:
+        return 0.0
+    gray = crop.mean(axis=2) if crop.ndim == 3 else crop.astype(np.float64)
+    if gray.shape[0] < 3 or gray.shape[1] < 3:
+        return 0.0
+    laplacian = (gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:]
+                 - 4 * gray[1:-1, 1:-1])
+    return float(gray.size * np.sqrt(laplacian.var()))
+
+
+class FaceTrack:
+    """Una persona seguida a lo largo de varios frames"""
+
+    def __init__(self, track_id: int, frame_index: int, box: Box):
+        self.track_id = track_id
+        self.box = box
+        self.first_frame = frame_index
+        self.last_frame = frame_index
+        self.hits = 0
+        self.missed = 0
+        self.best_quality = -1.0
+        self.best_frame: Optional[int] = None
+        self.best_box: Optional[Box] = None
+        self.best_image: Optional[np.ndarray] = None
+
+    def update(self, frame_index: int, box: Box, image: np.ndarray):
+        self.box = box
+        self.last_frame = frame_index
+        self.hits += 1
+        self.missed = 0
+        quality = face_quality(image, box)
+        if quality > self.best_quality:
+            self.best_quality = quality
+            self.best_frame = frame_index
+            self.best_box = box
+            self.best_image = image
+
+
+class IoUTracker:
+    """
+    Seguimiento ligero por IoU: asocia las detecciones de cada frame muestreado
+    con las pistas activas de forma voraz (mayor IoU primero). Cada pista solo
+    guarda el mejor frame, que es el único que luego se codifica.
+    """
+
+    def __init__(self, iou_threshold: float = 0.3, max_missed: int = 2):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.active: List[FaceTrack] = []
+        self.finished: List[FaceTrack] = []
+        self._next_id = 1
+
+    def update(self, frame_index: int, boxes: List[Box], image: np.ndarray):
+        """Asocia las cajas detectadas en un frame con las pistas existentes"""
+        pairs = sorted(
+            ((box_iou(track.box, box), t, b)
+             for t, track in enumerate(self.active)
+             for b, box in enumerate(boxes)),
+            reverse=True
+        )
+
+        matched_tracks = set()
+        matched_boxes = set()
+        for iou, t, b in pairs:
+            if iou < self.iou_threshold:
+                break
+            if t in matched_tracks or b in matched_boxes:
+                continue
+            self.active[t].update(frame_index, boxes[b], image)
+            matched_tracks.add(t)
+            matched_boxes.add(b)
+
+        still_active = []
+        for t, track in enumerate(self.active):
+            if t not in matched_tracks:
+                track.missed += 1
+                if track.missed > self.max_missed:
+                    self.finished.append(track)
+                    continue
+            still_active.append(track)
+        self.active = still_active
+
+        for b, box in enumerate(boxes):
+            if b not in matched_boxes:
+                track = FaceTrack(self._next_id, frame_index, box)
+                track.update(frame_index, box, image)
+                self._next_id += 1
+                self.active.append(track)
+
+    def tracks(self) -> List[FaceTrack]:
+        """Todas las pistas (terminadas y activas) ordenadas por id"""
+        return sorted(self.finished + self.active, key=lambda track: track.track_id)
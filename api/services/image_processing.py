@@ -0,0 +1,196 @@
+# api/services/image_processing.py
+import io
+import math
+from typing import Dict, Optional, Tuple
+from PIL import Image
+from django.conf import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Nombre de la versión principal; los derivados usan los nombres de IMAGE_DERIVATIVES
+FULL = 'full'
+FORMATS = {
+    'JPEG': ('image/jpeg', 'jpg'),
+    'WEBP': ('image/webp', 'webp'),
+}
+# (bytes, content-type, extensión)
+Rendered = Tuple[bytes, str, str]
+
+RESAMPLING = {
+    'nearest': Image.Resampling.NEAREST,
+    'bilinear': Image.Resampling.BILINEAR,
+    'bicubic': Image.Resampling.BICUBIC,
+    'lanczos': Image.Resampling.LANCZOS,
+}
+
+
+class ImagePreset:
+    """
+    Cómo se reduce y comprime un tipo de imagen antes de guardarla.
+
+    - `draft`: en JPEG, decodifica directamente a 1/2, 1/4 o 1/8 de la
+      resolución (lo más cerca de `max_size` sin quedar por debajo), en lugar
+      de decodificar la imagen completa para luego achicarla.
+    - `passthrough_bytes`: un JPEG RGB que ya cabe en `max_size` y pesa menos
+      que esto se guarda sin decodificar ni recomprimir, solo sin sus
+      metadatos (EXIF con GPS, número de serie, miniaturas...), igual que lo
+      que se recomprime.
+    """
+
+    def __init__(self, name: str, max_size: Tuple[int, int], quality: int, optimize: bool = False,
+                 resample: str = 'bilinear', draft: bool = True, passthrough_bytes: int = 0,
+                 derivatives: Optional[Dict[str, Tuple[int, int]]] = None, derivative_format: str = 'JPEG'):
+        self.name = name
+        self.max_size = tuple(max_size)
+        self.quality = quality
+        self.optimize = optimize
+        self.resample = RESAMPLING[resample]
+        self.draft = draft
+        self.passthrough_bytes = passthrough_bytes
+        # Versiones reducidas para listados, de la más grande a la más chica
+        self.derivatives = sorted((derivatives or {}).items(), key=lambda item: -item[1][0] * item[1][1])
+        self.derivative_format = derivative_format.upper()
+
+    def process(self, data: bytes) -> Optional[bytes]:
+        """Bytes de la imagen de entrada -> JPEG listo para guardar (None si no es una imagen válida)"""
+        rendered = self.render(data, with_derivatives=False)
+        return rendered[FULL][0] if rendered else None
+
+    def render(self, data: bytes, with_derivatives: bool = True) -> Optional[Dict[str, Rendered]]:
+        """
+        Imagen completa y derivados con una sola decodificación:
+        {'full': (bytes, content_type, extensión), 'tiny': (...), ...}.
+        """
+        try:
+            image = Image.open(io.BytesIO(data))
+            derivatives = self.derivatives if with_derivatives else []
+
+            stripped = strip_jpeg_metadata(data) if self._can_pass_through(image, data) else None
+            if stripped is not None:
+                rendered = {FULL: (stripped, 'image/jpeg', 'jpg')}
+                if derivatives:
+                    # Solo hace falta decodificar a la escala del derivado más grande
+                    self._draft(image, derivatives[0][1])
+                    rendered.update(self._render_derivatives(self._to_rgb(image), derivatives))
+                return rendered
+
+            self._draft(image, self.max_size)
+            image = self._to_rgb(image)
+            image.thumbnail(self.max_size, self.resample)
+
+            rendered = {FULL: (self.encode(image), 'image/jpeg', 'jpg')}
+            rendered.update(self._render_derivatives(image, derivatives))
+            return rendered
+
+        except Exception as e:
+            logger.error(f"Error procesando imagen ({self.name}): {e}")
+            return None
+
+    def encode(self, image: Image.Image, image_format: str = 'JPEG') -> bytes:
+        output = io.BytesIO()
+        image.save(output, format=image_format, quality=self.quality, optimize=self.optimize)
+        return output.getvalue()
+
+    def _render_derivatives(self, image: Image.Image, derivatives) -> Dict[str, Rendered]:
+        content_type, extension = FORMATS[self.derivative_format]
+        rendered = {}
+        for name, size in derivatives:
+            # Cada derivado sale del anterior (ya reducido), no de la imagen completa
+            image = image.copy()
+            image.thumbnail(size, self.resample)
+            rendered[name] = (self.encode(image, self.derivative_format), content_type, extension)
+        return rendered
+
+    def _draft(self, image: Image.Image, size: Tuple[int, int]):
+        if self.draft and image.format == 'JPEG':
+            # Tamaño final real (thumbnail conserva la proporción); draft elige la mayor
+            # reducción que no quede por debajo. Solo cambia la escala de decodificación.
+            scale = min(size[0] / image.width, size[1] / image.height)
+            if scale < 1:
+                image.draft('RGB', (math.ceil(image.width * scale), math.ceil(image.height * scale)))
+
+    def _to_rgb(self, image: Image.Image) -> Image.Image:
+        return image if image.mode == 'RGB' else image.convert('RGB')
+
+    def _can_pass_through(self, image: Image.Image, data: bytes) -> bool:
+        return (
+            len(data) <= self.passthrough_bytes
+            and image.format == 'JPEG'
+            and image.mode == 'RGB'
+            and image.width <= self.max_size[0]
+            and image.height <= self.max_size[1]
+        )
+
+
+def strip_jpeg_metadata(data: bytes) -> Optional[bytes]:
+    """
+    El mismo JPEG sin los segmentos de metadatos (APP1 EXIF/XMP, APP13 IPTC,
+    comentarios...), copiando el resto byte a byte. Se conservan JFIF (APP0),
+    el perfil de color (APP2 ICC_PROFILE) y Adobe (APP14), que cambian cómo se
+    ven los colores. None si no se puede limpiar sin recomprimir (imágenes
+    secundarias MPF al final del archivo) o si la estructura no es la esperada.
+    """
+    if data[:2] != b'\xff\xd8':
+        return None
+    output = bytearray(data[:2])
+    position = 2
+    while position + 4 <= len(data):
+        if data[position] != 0xFF:
+            return None
+        marker = data[position + 1]
+        if marker == 0xFF:
+            # Relleno entre segmentos
+            position += 1
+            continue
+        if marker == 0xDA:
+            # Inicio de los datos comprimidos: de aquí al final va tal cual
+            output += data[position:]
+            return bytes(output)
+        length = int.from_bytes(data[position + 2:position + 4], 'big')
+        segment = data[position:position + 2 + length]
+        payload = segment[4:]
+        if marker == 0xE2 and payload.startswith(b'MPF\x00'):
+            return None
+        if marker in (0xE0, 0xEE) or (marker == 0xE2 and payload.startswith(b'ICC_PROFILE\x00')) or \
+                not (0xE1 <= marker <= 0xEF or marker == 0xFE):
+            output += segment
+        position += 2 + length
+    return None
+
+
+def _build_presets() -> Dict[str, ImagePreset]:
+    ai_settings = settings.AI_IMAGE_SETTINGS
+    presets = {}
+    for name, options in ai_settings['IMAGE_PRESETS'].items():
+        presets[name] = ImagePreset(
+            name,
+            options.get('max_size', ai_settings['THUMBNAIL_SIZE']),
+            options.get('quality', ai_settings['JPEG_QUALITY']),
+            optimize=options.get('optimize', False),
+            resample=options.get('resample', 'bilinear'),
+            draft=options.get('draft', True),
+            passthrough_bytes=options.get('passthrough_bytes', 0),
+            derivatives=ai_settings['IMAGE_DERIVATIVES'] if options.get('derivatives') else None,
+            derivative_format=ai_settings['IMAGE_DERIVATIVE_FORMAT']
+        )
+    return presets
+
+
+IMAGE_PRESETS = _build_presets()
+
+# Preset por defecto según la carpeta de destino
+FOLDER_PRESETS = {
+    'facial': 'evidence',
+    'plates': 'evidence',
+    'profiles': 'profile',
+    'avatars': 'avatar',
+}
+
+
+def get_preset(name: Optional[str] = None, folder: Optional[str] = None) -> ImagePreset:
+    """Preset pedido por nombre o, si no se indica, el que corresponde a la carpeta"""
+    name = name or FOLDER_PRESETS.get(folder, 'evidence')
+    if name not in IMAGE_PRESETS:
+        raise ValueError(f"Preset de imagen desconocido: {name}")
+    return IMAGE_PRESETS[name]
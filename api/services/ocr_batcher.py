@@ -0,0 +1,59 @@
+# api/services/ocr_batcher.py
+import numpy as np
+from typing import List, Tuple
+from .batch_writer import WriteBehindBatcher
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Separación vertical entre recortes en el lienzo, para que ninguna caja toque a la vecina
+CROP_GAP = 8
+
+
+class OCRBatcher(WriteBehindBatcher):
+    """
+    Micro-lotes de recortes de placa (de cualquier cámara) para EasyOCR.
+
+    Los recortes que llegan dentro de la ventana se apilan verticalmente en un
+    solo lienzo y se leen con una única llamada a `reader.recognize`, pasando
+    una caja por recorte en `horizontal_list`. Cada resultado vuelve a su
+    recorte según la coordenada vertical de su caja.
+    """
+
+    def __init__(self, reader, allowlist: str, max_batch: int = 16, max_wait_ms: int = 15):
+        self.reader = reader
+        self.allowlist = allowlist
+        super().__init__(self._recognize_batch, max_batch, max_wait_ms, name="ocr-batcher")
+
+    def _recognize_batch(self, crops: List[np.ndarray]) -> List[List[Tuple[str, float]]]:
+        width = max(crop.shape[1] for crop in crops)
+        height = sum(crop.shape[0] for crop in crops) + CROP_GAP * (len(crops) - 1)
+        canvas = np.zeros((height, width), dtype=np.uint8)
+
+        boxes = []
+        spans = []
+        y = 0
+        for crop in crops:
+            crop_height, crop_width = crop.shape[:2]
+            canvas[y:y + crop_height, :crop_width] = crop
+            boxes.append([0, crop_width, y, y + crop_height])
+            spans.append((y, y + crop_height))
+            y += crop_height + CROP_GAP
+
+        results = self.reader.recognize(
+            canvas,
+            horizontal_list=boxes,
+            free_list=[],
+            allowlist=self.allowlist,
+            batch_size=len(boxes)
+        )
+
+        # EasyOCR devuelve las cajas ordenadas a su manera: las asignamos por su centro vertical
+        per_crop: List[List[Tuple[str, float]]] = [[] for _ in crops]
+        for box, text, confidence in results:
+            center = (box[0][1] + box[2][1]) / 2.0
+            for index, (top, bottom) in enumerate(spans):
+                if top <= center < bottom:
+                    per_crop[index].append((text, confidence))
+                    break
+        return per_crop
@@ -0,0 +1,352 @@
+# api/services/offline_scan.py
+"""
+Re-procesamiento de grabaciones (un video local o un directorio de imágenes).
+
+El origen se divide en tramos de `chunk_frames` frames; cada tramo se procesa
+en un proceso del pool (que abre el video por su cuenta y solo decodifica uno
+de cada `stride` frames), y el proceso principal agrupa las lecturas seguidas
+de la misma placa / persona, las escribe con bulk_create y marca el tramo como
+terminado en un checkpoint JSON para poder reanudar.
+
+Cada registro lleva la hora del frame en la grabación, no la del escaneo:
+inicio del video (`recorded_at`, o la fecha de modificación del archivo menos
+su duración) más frame / fps; en un directorio, la fecha de cada imagen.
+
+Las lecturas se agrupan dentro de cada tramo: un vehículo o una persona que
+sigue en cámara al cruzar el límite entre dos tramos queda en dos registros
+(uno por tramo). Los tramos terminan en cualquier orden y cada uno se guarda
+apenas termina, así que no hay grupos abiertos que pasar al siguiente.
+"""
+import datetime
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+KINDS = ('plates', 'faces')
+
+# Servicios de cada proceso del pool (se crean una vez en el inicializador)
+_services: Dict[str, object] = {}
+
+
+def _init_process(kinds: Tuple[str, ...]):
+    """Inicializador del pool: Django y los modelos de IA se cargan una sola vez por proceso"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    import django
+    django.setup()
+    from django.db import connections
+    connections.close_all()
+
+    from .ai_detection import FacialRecognitionService, PlateDetectionService
+    if 'plates' in kinds:
+        _services['plates'] = PlateDetectionService()
+    if 'faces' in kinds:
+        facial_service = FacialRecognitionService()
+        facial_service.load_known_faces()
+        _services['faces'] = facial_service
+
+
+def _iter_chunk_frames(source: str, start: int, end: int, stride: int):
+    """Frames (índice, imagen RGB) de un tramo, solo los que caen en el paso"""
+    import numpy as np
+    from PIL import Image
+
+    if os.path.isdir(source):
+        files = _list_images(source)
+        for index in range(start, min(end, len(files))):
+            if index % stride == 0:
+                yield index, np.array(Image.open(files[index]).convert('RGB'))
+        return
+
+    import cv2
+    capture = cv2.VideoCapture(source)
+    try:
+        capture.set(cv2.CAP_PROP_POS_FRAMES, start)
+        index = start
+        while index < end and capture.grab():
+            if index % stride == 0:
+                ok, frame = capture.retrieve()
+                if ok:
+                    yield index, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            index += 1
+    finally:
+        capture.release()
+
+
+def _scan_chunk(source: str, chunk_id: int, start: int, end: int, stride: int) -> Dict:
+    """Tarea del pool: inferencia de placas y/o caras sobre un tramo"""
+    detections = []
+    frames = 0
+    for frame_index, image in _iter_chunk_frames(source, start, end, stride):
+        frames += 1
+        plate_service = _services.get('plates')
+        if plate_service is not None:
+            try:
+                plate, is_authorized, confidence = plate_service.analyze_plate(image)
+                if plate:
+                    detections.append({'kind': 'plate', 'frame': frame_index, 'plate': plate,
+                                       'authorized': is_authorized, 'confidence': confidence})
+            except Exception as e:
+                logger.error(f"Error leyendo placa en el frame {frame_index}: {e}")
+
+        facial_service = _services.get('faces')
+        if facial_service is not None:
+            try:
+                boxes = facial_service.backend.detect(image)
+                for encoding in (facial_service.backend.encode(image, boxes) if boxes else []):
+                    match = facial_service._match_encoding(encoding)
+                    usuario, confidence = match if match else (None, 0.0)
+                    detections.append({'kind': 'face', 'frame': frame_index,
+                                       'usuario_id': usuario.codigo if usuario else None,
+                                       'confidence': confidence})
+            except Exception as e:
+                logger.error(f"Error reconociendo caras en el frame {frame_index}: {e}")
+
+    return {'chunk_id': chunk_id, 'frames': frames, 'detections': detections}
+
+
+def parse_recording_start(value: Optional[str]) -> Optional[datetime.datetime]:
+    """Inicio de la grabación en ISO 8601 (sin zona = hora local del servidor)"""
+    if not value:
+        return None
+    from django.utils import timezone
+    from django.utils.dateparse import parse_datetime
+    started = parse_datetime(value)
+    if started is None:
+        raise ValueError(f"Fecha de inicio inválida: {value}")
+    return timezone.make_aware(started) if timezone.is_naive(started) else started
+
+
+def _file_time(path: str) -> datetime.datetime:
+    return datetime.datetime.fromtimestamp(os.path.getmtime(path), tz=datetime.timezone.utc)
+
+
+def _list_images(directory: str) -> List[str]:
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if name.lower().endswith(IMAGE_EXTENSIONS)]
+
+
+class OfflineScanner:
+    """Escanea una grabación con un pool de procesos, escritura por lotes y checkpoints"""
+
+    def __init__(self, source: str, camera_location: str, kinds: Tuple[str, ...] = KINDS, stride: int = 15,
+                 workers: int = 2, chunk_frames: int = 300, checkpoint_path: Optional[str] = None,
+                 create_reports: bool = False, access_type: str = 'entrada',
+                 progress: Optional[Callable[[Dict], None]] = None,
+                 recorded_at: Optional[datetime.datetime] = None):
+        if not os.path.exists(source):
+            raise FileNotFoundError(f"No existe el origen {source}")
+        unknown = set(kinds) - set(KINDS)
+        if unknown:
+            raise ValueError(f"Tipos de análisis desconocidos: {', '.join(sorted(unknown))}")
+        self.source = os.path.abspath(source)
+        self.camera_location = camera_location
+        self.kinds = tuple(kinds)
+        self.stride = max(1, int(stride))
+        self.workers = max(1, int(workers))
+        self.chunk_frames = max(self.stride, int(chunk_frames))
+        self.checkpoint_path = checkpoint_path or f"{self.source}.scan.json"
+        self.create_reports = create_reports
+        self.access_type = access_type
+        self.progress = progress
+        self.fps: Optional[float] = None
+        self.recorded_at = recorded_at
+        self._files: List[str] = []
+
+    # --- planificación y checkpoint ---
+
+    def _total_frames(self) -> int:
+        if os.path.isdir(self.source):
+            self._files = _list_images(self.source)
+            return len(self._files)
+        import cv2
+        capture = cv2.VideoCapture(self.source)
+        try:
+            self.fps = capture.get(cv2.CAP_PROP_FPS) or None
+            total = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        finally:
+            capture.release()
+        if self.recorded_at is None:
+            # Sin inicio explícito: el archivo se terminó de escribir al final de la grabación
+            self.recorded_at = _file_time(self.source) - datetime.timedelta(seconds=total / self.fps if self.fps else 0)
+        return total
+
+    def _load_checkpoint(self) -> Dict:
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, encoding='utf-8') as checkpoint:
+                state = json.load(checkpoint)
+            # Un checkpoint de otro origen o con otros parámetros no sirve para reanudar
+            if (state.get('source'), state.get('stride'), state.get('chunk_frames'), state.get('kinds')) == \
+                    (self.source, self.stride, self.chunk_frames, list(self.kinds)):
+                return state
+            logger.warning(f"Checkpoint {self.checkpoint_path} no coincide con este escaneo; se empieza de cero")
+        return {'source': self.source, 'stride': self.stride, 'chunk_frames': self.chunk_frames,
+                'kinds': list(self.kinds), 'completed': [], 'rows': 0}
+
+    def _save_checkpoint(self, state: Dict):
+        temporary = f"{self.checkpoint_path}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as checkpoint:
+            json.dump(state, checkpoint)
+        os.replace(temporary, self.checkpoint_path)
+
+    # --- ejecución ---
+
+    def run(self) -> Dict:
+        total_frames = self._total_frames()
+        chunks = [(chunk_id, start, min(start + self.chunk_frames, total_frames))
+                  for chunk_id, start in enumerate(range(0, total_frames, self.chunk_frames))]
+        state = self._load_checkpoint()
+        completed = set(state['completed'])
+        pending = [chunk for chunk in chunks if chunk[0] not in completed]
+
+        started = time.monotonic()
+        frames_done = 0
+        # 'spawn': el proceso padre puede tener hilos de torch/OpenCV que no sobreviven a un fork
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(self.workers, mp_context=context,
+                                 initializer=_init_process, initargs=(self.kinds,)) as pool:
+            futures = [pool.submit(_scan_chunk, self.source, chunk_id, start, end, self.stride)
+                       for chunk_id, start, end in pending]
+            for future in as_completed(futures):
+                result = future.result()
+                state['rows'] += self._write(result['detections'])
+                completed.add(result['chunk_id'])
+                state['completed'] = sorted(completed)
+                self._save_checkpoint(state)
+
+                frames_done += result['frames']
+                if self.progress:
+                    elapsed = time.monotonic() - started
+                    self.progress({
+                        'chunks_done': len(completed),
+                        'chunks_total': len(chunks),
+                        'frames_processed': frames_done,
+                        'rows_written': state['rows'],
+                        'elapsed_seconds': round(elapsed, 1),
+                        'frames_per_second': round(frames_done / elapsed, 2) if elapsed else None
+                    })
+
+        return {
+            'source': self.source,
+            'chunks_total': len(chunks),
+            'chunks_skipped': len(chunks) - len(pending),
+            'frames_processed': frames_done,
+            'rows_written': state['rows'],
+            'checkpoint': self.checkpoint_path
+        }
+
+    # --- agregación y escritura ---
+
+    def _position(self, frame_index: int) -> str:
+        """Posición legible del frame dentro de la grabación"""
+        if self.fps:
+            seconds = int(frame_index / self.fps)
+            return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+        return f"frame {frame_index}"
+
+    def _frame_time(self, frame_index: int) -> datetime.datetime:
+        """Momento en que se grabó el frame"""
+        if self._files:
+            return _file_time(self._files[frame_index])
+        if self.fps:
+            return self.recorded_at + datetime.timedelta(seconds=frame_index / self.fps)
+        return self.recorded_at
+
+    def _group(self, detections: List[Dict], same: Callable[[Dict, Dict], bool]) -> List[List[Dict]]:
+        """Agrupa lecturas seguidas (sin más de 3 muestras de hueco) de la misma placa o persona"""
+        gap = self.stride * 3
+        groups: List[List[Dict]] = []
+        for detection in sorted(detections, key=lambda d: d['frame']):
+            match = next((group for group in reversed(groups)
+                          if detection['frame'] - group[-1]['frame'] <= gap and same(group[0], detection)), None)
+            if match is not None:
+                match.append(detection)
+            else:
+                groups.append([detection])
+        return groups
+
+    @staticmethod
+    def _same_plate(a: Dict, b: Dict) -> bool:
+        """Mismo criterio que la deduplicación en vivo (PlateEventDeduplicator)"""
+        from django.conf import settings
+        from .plate_dedup import same_vehicle
+        from .plate_index import normalize_plate
+        return same_vehicle(normalize_plate(a['plate']), a['authorized'],
+                            normalize_plate(b['plate']), b['authorized'],
+                            settings.AI_IMAGE_SETTINGS['PLATE_DEDUP_MAX_DISTANCE'])
+
+    @staticmethod
+    def _same_person(a: Dict, b: Dict) -> bool:
+        """Solo se agrupa a un residente identificado; sin identidad no se sabe si es la misma persona"""
+        return a['usuario_id'] is not None and a['usuario_id'] == b['usuario_id']
+
+    def _write(self, detections: List[Dict]) -> int:
+        """Convierte las lecturas de un tramo en filas y las escribe de una vez"""
+        from django.db import close_old_connections
+        from ..models import DeteccionPlaca, ReconocimientoFacial, ReporteSeguridad
+        from .batch_writer import write_detections
+        from .plate_index import plate_index
+
+        close_old_connections()
+        source_name = os.path.basename(self.source)
+        items = []
+
+        plates = [d for d in detections if d['kind'] == 'plate']
+        for group in self._group(plates, self._same_plate):
+            first = group[0]
+            best = max(group, key=lambda d: d['confidence'])
+            deteccion = DeteccionPlaca(
+                placa_detectada=best['plate'],
+                vehiculo=plate_index.lookup(best['plate']),
+                confianza=best['confidence'],
+                es_autorizado=best['authorized'],
+                ubicacion_camara=self.camera_location,
+                tipo_acceso=self.access_type,
+                lecturas=len(group),
+                fecha_deteccion=self._frame_time(first['frame']),
+                ultima_deteccion=self._frame_time(group[-1]['frame']) if len(group) > 1 else None
+            )
+            report = None
+            if self.create_reports and not best['authorized']:
+                report = ReporteSeguridad(
+                    tipo_evento='placa_no_autorizada',
+                    descripcion=(f"Placa no autorizada detectada: {best['plate']} en {self.camera_location} "
+                                 f"(grabación {source_name}, {self._position(first['frame'])})"),
+                    nivel_alerta='medio',
+                    fecha_evento=deteccion.fecha_deteccion
+                )
+            items.append((deteccion, report))
+
+        faces = [d for d in detections if d['kind'] == 'face']
+        for group in self._group(faces, self._same_person):
+            first = group[0]
+            best = max(group, key=lambda d: d['confidence'])
+            is_resident = first['usuario_id'] is not None
+            reconocimiento = ReconocimientoFacial(
+                codigo_usuario_id=first['usuario_id'],
+                confianza=best['confidence'],
+                es_residente=is_resident,
+                ubicacion_camara=self.camera_location,
+                estado='permitido' if is_resident else 'denegado',
+                fecha_deteccion=self._frame_time(first['frame'])
+            )
+            report = None
+            if self.create_reports and not is_resident:
+                report = ReporteSeguridad(
+                    tipo_evento='intruso_detectado',
+                    descripcion=(f"Persona no identificada detectada en {self.camera_location} "
+                                 f"(grabación {source_name}, {self._position(first['frame'])})"),
+                    nivel_alerta='alto',
+                    fecha_evento=reconocimiento.fecha_deteccion
+                )
+            items.append((reconocimiento, report))
+
+        if items:
+            write_detections(items)
+        return len(items)
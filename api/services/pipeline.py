@@ -0,0 +1,112 @@
+# api/services/pipeline.py
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from django.db import close_old_connections
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (nombre, función, concurrencia) de cada etapa
+StageSpec = Tuple[str, Callable[[Any], Any], int]
+
+
+class PipelineStage:
+    """Una etapa del pipeline: su cola de entrada acotada y su propio pool de hilos"""
+
+    def __init__(self, name: str, func: Callable[[Any], Any], workers: int, queue_size: int):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"pipeline-{name}")
+        self.processed = 0
+        self.busy_seconds = 0.0
+
+    def run(self, value: Any) -> Any:
+        """Ejecuta la función de la etapa en uno de sus hilos"""
+        # Los hilos del pool viven mucho: descartamos conexiones a la BD caducadas
+        close_old_connections()
+        return self.func(value)
+
+
+class StagedPipeline:
+    """
+    Pipeline por etapas con colas acotadas entre ellas.
+
+    Cada etapa tiene su propia concurrencia (p. ej. varios hilos de
+    decodificación y de persistencia, uno solo de inferencia), de modo que
+    mientras un trabajo está en inferencia el anterior se sube a Supabase y el
+    siguiente se decodifica. Si una cola se llena, `submit` espera: la presión
+    se propaga hacia atrás en lugar de acumular imágenes en memoria.
+    """
+
+    def __init__(self, stages: List[StageSpec], queue_size: int = 8):
+        self.stage_specs = stages
+        self.queue_size = queue_size
+        self.stages: List[PipelineStage] = []
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        """Crea las colas y los consumidores (debe llamarse dentro del event loop)"""
+        self.stages = [PipelineStage(name, func, workers, self.queue_size)
+                       for name, func, workers in self.stage_specs]
+        for index, stage in enumerate(self.stages):
+            next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+            for _ in range(stage.workers):
+                self._tasks.append(asyncio.create_task(self._consume(stage, next_stage)))
+        logger.info(f"Pipeline iniciado: {', '.join(f'{s.name}x{s.workers}' for s in self.stages)}")
+
+    async def stop(self):
+        """Cancela los consumidores y libera los pools de hilos"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for stage in self.stages:
+            stage.executor.shutdown(wait=False)
+
+    async def submit(self, value: Any) -> Any:
+        """Encola un trabajo en la primera etapa y espera el resultado de la última"""
+        future = asyncio.get_running_loop().create_future()
+        await self.stages[0].queue.put((value, future))
+        return await future
+
+    async def _consume(self, stage: PipelineStage, next_stage: Optional[PipelineStage]):
+        loop = asyncio.get_running_loop()
+        while True:
+            value, future = await stage.queue.get()
+            try:
+                if future.cancelled():
+                    continue
+                start = loop.time()
+                try:
+                    result = await loop.run_in_executor(stage.executor, stage.run, value)
+                except Exception as e:
+                    logger.error(f"Error en la etapa '{stage.name}' del pipeline: {e}")
+                    if not future.done():
+                        future.set_exception(e)
+                    continue
+                finally:
+                    stage.busy_seconds += loop.time() - start
+                stage.processed += 1
+
+                if next_stage is None:
+                    if not future.done():
+                        future.set_result(result)
+                else:
+                    await next_stage.queue.put((result, future))
+            finally:
+                stage.queue.task_done()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Trabajos procesados, en cola y tiempo ocupado por etapa"""
+        return {
+            stage.name: {
+                'workers': stage.workers,
+                'queued': stage.queue.qsize(),
+                'processed': stage.processed,
+                'busy_seconds': round(stage.busy_seconds, 3)
+            }
+            for stage in self.stages
+        }
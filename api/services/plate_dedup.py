@@ -0,0 +1,108 @@
+# api/services/plate_dedup.py
+import threading
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from django.conf import settings
+from django.utils import timezone
+from .plate_index import normalize_plate
+from .plate_matcher import confusable, plate_distance
+
+
+def same_vehicle(key: str, is_authorized: bool, other_key: str, other_authorized: bool,
+                 max_distance: float) -> bool:
+    """Si dos lecturas normalizadas son del mismo vehículo (ver PlateEventDeduplicator)"""
+    if is_authorized != other_authorized:
+        return False
+    if key == other_key:
+        return True
+    return (not is_authorized and confusable(key, other_key)
+            and plate_distance(key, other_key) <= max_distance)
+
+
+class PlateEvent:
+    """Lecturas repetidas de una misma placa en una cámara, agrupadas en un solo evento"""
+
+    def __init__(self, plate: str, result: Future, now: datetime, is_authorized: bool = False):
+        self.plate = plate
+        self.is_authorized = is_authorized
+        self.result = result
+        self.first_seen = now
+        self.last_seen = now
+        self.hits = 1
+
+    def detection_id(self) -> Optional[int]:
+        """Id de la DeteccionPlaca del evento (None si aún no se guardó o falló)"""
+        if not self.result.done() or self.result.exception() is not None:
+            return None
+        return self.result.result().get('id')
+
+
+class PlateEventDeduplicator:
+    """
+    Ventana deslizante por cámara: una placa leída de nuevo antes de
+    `window_seconds` desde su última lectura se suma al evento abierto en
+    lugar de generar otra detección. La primera lectura se procesa y responde
+    como siempre.
+
+    Solo se agrupan lecturas con el mismo resultado de autorización. Una
+    placa autorizada solo se agrupa con la misma placa; una no autorizada,
+    también con lecturas que difieren solo en caracteres que el OCR confunde
+    (dentro de `max_distance`). Otra placa a un carácter es otro vehículo.
+    """
+
+    def __init__(self, window_seconds: float = 30, max_distance: float = 0.5):
+        self.window = timedelta(seconds=window_seconds)
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+        self._events: Dict[Tuple[str, str], List[PlateEvent]] = {}
+
+    def observe(self, camera: Tuple[str, str], plate: str,
+                is_authorized: bool = False) -> Tuple[PlateEvent, bool, List[PlateEvent]]:
+        """
+        Registra una lectura. Devuelve (evento, es_nuevo, eventos vencidos de esta
+        cámara). Si es nuevo, quien llama debe resolver `event.result` con la
+        respuesta de la primera detección; los duplicados la esperan y reutilizan.
+        """
+        key = normalize_plate(plate)
+        now = timezone.now()
+        with self._lock:
+            events = self._events.get(camera, [])
+            expired = [event for event in events if now - event.last_seen > self.window]
+            events = [event for event in events if now - event.last_seen <= self.window]
+
+            for event in events:
+                # Un evento cuya primera detección falló no agrupa a nadie
+                if event.result.done() and event.detection_id() is None:
+                    continue
+                if self._same_vehicle(key, is_authorized, event):
+                    event.hits += 1
+                    event.last_seen = now
+                    self._events[camera] = events
+                    return event, False, expired
+
+            event = PlateEvent(key, Future(), now, is_authorized)
+            events.append(event)
+            self._events[camera] = events
+            return event, True, expired
+
+    def _same_vehicle(self, key: str, is_authorized: bool, event: PlateEvent) -> bool:
+        return same_vehicle(key, is_authorized, event.plate, event.is_authorized, self.max_distance)
+
+    def expire(self, force: bool = False) -> List[PlateEvent]:
+        """Saca y devuelve los eventos vencidos de todas las cámaras (todos si `force`)"""
+        now = timezone.now()
+        expired = []
+        with self._lock:
+            for camera, events in self._events.items():
+                expired.extend(event for event in events if force or now - event.last_seen > self.window)
+                self._events[camera] = [] if force else [
+                    event for event in events if now - event.last_seen <= self.window
+                ]
+        return expired
+
+
+plate_events = PlateEventDeduplicator(
+    settings.AI_IMAGE_SETTINGS.get('PLATE_DEDUP_WINDOW_SECONDS', 30),
+    settings.AI_IMAGE_SETTINGS.get('PLATE_DEDUP_MAX_DISTANCE', 0.5)
+)
@@ -0,0 +1,93 @@
+# api/services/plate_index.py
+import threading
+import time
+from typing import Dict, Optional, Set, Tuple
+from django.conf import settings
+from ..models import Vehiculo, normalize_plate
+from .plate_matcher import PlateMatcher
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PlateIndex:
+    """
+    Índice en memoria de placas normalizadas -> vehículo.
+
+    Se carga con una sola consulta y responde autorización y búsqueda de
+    vehículo sin ir a la BD. `invalidate()` fuerza la recarga en el siguiente
+    uso (la llama VehiculoViewSet al crear, editar o borrar); el TTL es una red
+    de seguridad para cambios hechos por otras vías (admin, SQL, otro proceso).
+    """
+
+    def __init__(self, ttl_seconds: int = 300):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._vehicles: Dict[str, Vehiculo] = {}
+        self._authorized: Set[str] = set()
+        self._matcher = PlateMatcher(())
+        self._loaded_at: Optional[float] = None
+        self._generation = 0
+
+    def load(self):
+        """Carga (o recarga) todos los vehículos en memoria"""
+        generation = self._generation
+        vehicles = {}
+        authorized = set()
+        for vehiculo in Vehiculo.objects.exclude(nro_placa__isnull=True).order_by('id'):
+            key = vehiculo.placa_normalizada or normalize_plate(vehiculo.nro_placa)
+            if not key:
+                continue
+            # Igual que el .first() anterior: ante placas repetidas gana el id más bajo
+            vehicles.setdefault(key, vehiculo)
+            if vehiculo.estado == 'activo':
+                authorized.add(key)
+
+        matcher = PlateMatcher(authorized)
+
+        with self._lock:
+            self._vehicles = vehicles
+            self._authorized = authorized
+            self._matcher = matcher
+            # Si se invalidó mientras consultábamos, estos datos pueden estar viejos: se recarga de nuevo
+            self._loaded_at = time.monotonic() if generation == self._generation else None
+        logger.info(f"Índice de placas cargado: {len(vehicles)} vehículos, {len(authorized)} autorizados")
+
+    def invalidate(self):
+        """Marca el índice como desactualizado; se recarga en el próximo uso"""
+        with self._lock:
+            self._generation += 1
+            self._loaded_at = None
+
+    def ensure_loaded(self):
+        """Carga el índice si nunca se cargó, se invalidó o venció el TTL"""
+        loaded_at = self._loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at > self.ttl_seconds:
+            self.load()
+
+    def lookup(self, plate: Optional[str]) -> Optional[Vehiculo]:
+        """Vehículo registrado con esa placa (cualquier estado), o None"""
+        self.ensure_loaded()
+        return self._vehicles.get(normalize_plate(plate))
+
+    def is_authorized(self, plate: Optional[str]) -> bool:
+        """True si hay un vehículo activo con esa placa"""
+        self.ensure_loaded()
+        return normalize_plate(plate) in self._authorized
+
+    def fuzzy_match(self, plate: Optional[str], max_distance: float) -> Optional[Tuple[Vehiculo, float]]:
+        """Vehículo activo cuya placa está más cerca de la lectura (tolerando confusiones del OCR)"""
+        self.ensure_loaded()
+        match = self._matcher.best_match(normalize_plate(plate), max_distance)
+        if match is None:
+            return None
+        key, distance = match
+        return self._vehicles[key], distance
+
+    def authorized_plates(self) -> Set[str]:
+        """Placas normalizadas de los vehículos activos"""
+        self.ensure_loaded()
+        return self._authorized
+
+
+plate_index = PlateIndex(settings.AI_IMAGE_SETTINGS.get('PLATE_INDEX_TTL', 300))
@@ -0,0 +1,121 @@
+# api/services/plate_matcher.py
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Caracteres que EasyOCR confunde entre sí en las placas
+CONFUSION_GROUPS = ('0ODQ', '1IL', '8B', '5S', '2Z', '6G')
+CONFUSION_COST = 0.25
+
+_GROUP_OF: Dict[str, int] = {char: index for index, group in enumerate(CONFUSION_GROUPS) for char in group}
+
+
+def substitution_cost(a: str, b: str) -> float:
+    """Costo de cambiar un carácter por otro: barato si el OCR suele confundirlos"""
+    if a == b:
+        return 0.0
+    group = _GROUP_OF.get(a)
+    if group is not None and group == _GROUP_OF.get(b):
+        return CONFUSION_COST
+    return 1.0
+
+
+def confusable(a: str, b: str) -> bool:
+    """
+    True si las dos placas solo difieren en caracteres que el OCR confunde
+    (mismo largo y cada diferencia dentro de un grupo de confusión). Una
+    sustitución, inserción o borrado cualquiera es otra placa, no un error
+    de lectura.
+    """
+    return len(a) == len(b) and all(substitution_cost(x, y) < 1.0 for x, y in zip(a, b))
+
+
+def plate_distance(a: str, b: str) -> float:
+    """
+    Distancia de edición ponderada entre dos placas normalizadas. Insertar o
+    borrar cuesta 1 y sustituir cuesta 1, o CONFUSION_COST dentro de un grupo
+    de confusión. Los grupos son disjuntos, así que sigue siendo una métrica
+    (requisito del BK-tree).
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    previous = [float(j) for j in range(len(b) + 1)]
+    for i, char_a in enumerate(a, 1):
+        current = [float(i)]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1.0,
+                current[j - 1] + 1.0,
+                previous[j - 1] + substitution_cost(char_a, char_b)
+            ))
+        previous = current
+    return previous[-1]
+
+
+class BKTree:
+    """Árbol BK sobre `plate_distance`: búsqueda por radio sin recorrer todas las placas"""
+
+    def __init__(self, words: Iterable[str] = ()):
+        self._root: Optional[Tuple[str, Dict[float, tuple]]] = None
+        self.size = 0
+        for word in words:
+            self.add(word)
+
+    def add(self, word: str):
+        if self._root is None:
+            self._root = (word, {})
+            self.size = 1
+            return
+        node_word, children = self._root
+        while True:
+            distance = plate_distance(word, node_word)
+            if distance == 0:
+                return
+            child = children.get(distance)
+            if child is None:
+                children[distance] = (word, {})
+                self.size += 1
+                return
+            node_word, children = child
+
+    def search(self, word: str, max_distance: float) -> List[Tuple[float, str]]:
+        """Palabras a distancia <= max_distance, ordenadas de la más cercana a la más lejana"""
+        if self._root is None:
+            return []
+        found = []
+        pending = [self._root]
+        while pending:
+            node_word, children = pending.pop()
+            distance = plate_distance(word, node_word)
+            if distance <= max_distance:
+                found.append((distance, node_word))
+            # Desigualdad triangular: solo pueden servir los hijos en [d - r, d + r]
+            for edge, child in children.items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    pending.append(child)
+        return sorted(found)
+
+
+class PlateMatcher:
+    """Busca la placa autorizada más parecida a una lectura del OCR"""
+
+    def __init__(self, plates: Iterable[str]):
+        self.tree = BKTree(plates)
+
+    def best_match(self, plate: str, max_distance: float,
+                   confusion_only: bool = True) -> Optional[Tuple[str, float]]:
+        """
+        Mejor candidato y su distancia, o None si no hay ninguno dentro del
+        umbral o si hay un empate entre dos placas distintas (ambiguo). Con
+        `confusion_only` solo cuentan los candidatos `confusable`, sea cual
+        sea el umbral.
+        """
+        if not plate:
+            return None
+        candidates = self.tree.search(plate, max_distance)
+        if confusion_only:
+            candidates = [(distance, match) for distance, match in candidates if confusable(plate, match)]
+        if not candidates:
+            return None
+        if len(candidates) > 1 and candidates[1][0] == candidates[0][0]:
+            return None
+        distance, match = candidates[0]
+        return match, distance
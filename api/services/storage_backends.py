@@ -0,0 +1,292 @@
+# api/services/storage_backends.py
+import os
+import threading
+from abc import ABC, abstractmethod
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from django.conf import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (ruta dentro del almacenamiento, bytes, content-type)
+Upload = Tuple[str, bytes, str]
+
+
+class StorageBackend(ABC):
+    """
+    Interfaz común de los almacenamientos de imágenes.
+
+    Las rutas son relativas al almacenamiento ("facial/xxx.jpg"). Las variantes
+    por lote tienen una implementación genérica elemento a elemento que cada
+    backend puede reemplazar por algo más eficiente.
+    """
+
+    name = 'base'
+
+    def prepare(self, force: bool = False) -> bool:
+        """Deja listo el almacenamiento (bucket, directorio...) antes de escribir"""
+        return True
+
+    @abstractmethod
+    def upload_bytes(self, path: str, data: bytes, content_type: str = "image/jpeg") -> bool:
+        ...
+
+    @abstractmethod
+    def delete(self, path: str) -> bool:
+        ...
+
+    @abstractmethod
+    def exists(self, path: str) -> bool:
+        ...
+
+    @abstractmethod
+    def public_url(self, path: str) -> str:
+        ...
+
+    def size(self, path: str) -> Optional[int]:
+        """Tamaño en bytes del objeto (None si no existe o no se puede saber)"""
+        return None
+
+    def sizes(self, paths: List[str]) -> Dict[str, Optional[int]]:
+        return {path: self.size(path) for path in paths}
+
+    def upload_many(self, uploads: List[Upload]) -> List[bool]:
+        return [self.upload_bytes(path, data, content_type) for path, data, content_type in uploads]
+
+    def delete_many(self, paths: List[str]) -> List[bool]:
+        return [self.delete(path) for path in paths]
+
+
+class SupabaseStorageBackend(StorageBackend):
+    """Supabase Storage con un cliente compartido por el proceso"""
+
+    name = 'supabase'
+
+    _client = None
+    _client_lock = threading.Lock()
+    _bucket_lock = threading.Lock()
+    # Última verificación correcta de cada bucket
+    _buckets_checked: Dict[str, float] = {}
+
+    def __init__(self, bucket_name: Optional[str] = None):
+        self.bucket_name = bucket_name or settings.SUPABASE_STORAGE_BUCKET
+
+    @property
+    def client(self):
+        """Cliente de Supabase, creado en el primer uso (reutiliza su pool de conexiones HTTP)"""
+        cls = SupabaseStorageBackend
+        if cls._client is None:
+            with cls._client_lock:
+                if cls._client is None:
+                    from supabase import create_client
+                    cls._client = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
+        return cls._client
+
+    def prepare(self, force: bool = False) -> bool:
+        """
+        Verifica (y crea si falta) el bucket una vez por proceso, o de nuevo
+        pasado SUPABASE_BUCKET_CHECK_TTL segundos. Un fallo no se recuerda: se
+        vuelve a intentar en la siguiente subida.
+        """
+        if not force and self._bucket_fresh():
+            return True
+        with self._bucket_lock:
+            if not force and self._bucket_fresh():
+                return True
+            if self._ensure_bucket_exists():
+                self._buckets_checked[self.bucket_name] = time.monotonic()
+                return True
+            return False
+
+    def _bucket_fresh(self) -> bool:
+        checked_at = self._buckets_checked.get(self.bucket_name)
+        return checked_at is not None and time.monotonic() - checked_at < settings.SUPABASE_BUCKET_CHECK_TTL
+
+    def _ensure_bucket_exists(self) -> bool:
+        """Asegura que el bucket existe"""
+        try:
+            buckets = self.client.storage.list_buckets()
+            bucket_exists = any(bucket.name == self.bucket_name for bucket in buckets)
+
+            if not bucket_exists:
+                self.client.storage.create_bucket(
+                    self.bucket_name,
+                    options={"public": True}
+                )
+                logger.info(f"Bucket '{self.bucket_name}' creado exitosamente")
+            return True
+
+        except Exception as e:
+            logger.error(f"Error verificando/creando bucket: {e}")
+            return False
+
+    def upload_bytes(self, path: str, data: bytes, content_type: str = "image/jpeg") -> bool:
+        self.prepare()
+        response = self.client.storage.from_(self.bucket_name).upload(
+            path,
+            data,
+            file_options={
+                "content-type": content_type,
+                "cache-control": "3600",
+                # Los nombres son el hash del contenido: sobrescribir un objeto existente no cambia nada
+                # y evita el error de duplicado cuando dos subidas iguales compiten
+                "upsert": "true"
+            }
+        )
+        return bool(response)
+
+    def upload_many(self, uploads: List[Upload]) -> List[bool]:
+        # La API de Storage sube un objeto por petición: las lanzamos en paralelo sobre el mismo cliente
+        if len(uploads) <= 1:
+            return super().upload_many(uploads)
+        self.prepare()
+
+        def _upload(upload: Upload) -> bool:
+            try:
+                return self.upload_bytes(*upload)
+            except Exception as e:
+                logger.error(f"Error subiendo {upload[0]} a Supabase: {e}")
+                return False
+
+        with ThreadPoolExecutor(min(len(uploads), settings.AI_IMAGE_SETTINGS['STORAGE_UPLOAD_CONCURRENCY'])) as pool:
+            return list(pool.map(_upload, uploads))
+
+    def delete(self, path: str) -> bool:
+        return self.delete_many([path])[0]
+
+    def delete_many(self, paths: List[str]) -> List[bool]:
+        # `remove` acepta varias rutas en una sola petición y devuelve los objetos borrados
+        if not paths:
+            return []
+        response = self.client.storage.from_(self.bucket_name).remove(list(paths))
+        removed = {item.get('name') for item in response or [] if isinstance(item, dict)}
+        if not removed:
+            return [bool(response)] * len(paths)
+        return [path in removed for path in paths]
+
+    def exists(self, path: str) -> bool:
+        return self._entry(path) is not None
+
+    def size(self, path: str) -> Optional[int]:
+        entry = self._entry(path)
+        if entry is None:
+            return None
+        return (entry.get('metadata') or {}).get('size')
+
+    def sizes(self, paths: List[str]) -> Dict[str, Optional[int]]:
+        # Un pedido de listado por objeto: en paralelo, igual que las subidas
+        if len(paths) <= 1:
+            return super().sizes(paths)
+        with ThreadPoolExecutor(min(len(paths), settings.AI_IMAGE_SETTINGS['STORAGE_UPLOAD_CONCURRENCY'])) as pool:
+            return dict(zip(paths, pool.map(self.size, paths)))
+
+    def _entry(self, path: str) -> Optional[Dict]:
+        folder, _, filename = path.rpartition('/')
+        entries = self.client.storage.from_(self.bucket_name).list(folder, {"search": filename})
+        return next((entry for entry in entries or [] if entry.get('name') == filename), None)
+
+    def public_url(self, path: str) -> str:
+        return f"{settings.SUPABASE_STORAGE_URL}/{path}"
+
+
+class LocalStorageBackend(StorageBackend):
+    """Archivos en MEDIA_ROOT, servidos por Django en MEDIA_URL"""
+
+    name = 'local'
+
+    def __init__(self, root: Optional[str] = None, base_url: Optional[str] = None):
+        self.root = str(root or settings.MEDIA_ROOT)
+        self.base_url = (base_url or settings.MEDIA_URL).rstrip('/')
+
+    def _full_path(self, path: str) -> str:
+        full_path = os.path.normpath(os.path.join(self.root, path))
+        if not full_path.startswith(os.path.normpath(self.root) + os.sep):
+            raise ValueError(f"Ruta fuera del almacenamiento: {path}")
+        return full_path
+
+    def prepare(self, force: bool = False) -> bool:
+        os.makedirs(self.root, exist_ok=True)
+        return True
+
+    def upload_bytes(self, path: str, data: bytes, content_type: str = "image/jpeg") -> bool:
+        full_path = self._full_path(path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        # Escritura atómica: nunca se sirve un archivo a medio escribir
+        temporary = f"{full_path}.{threading.get_ident()}.tmp"
+        with open(temporary, 'wb') as output:
+            output.write(data)
+        os.replace(temporary, full_path)
+        return True
+
+    def delete(self, path: str) -> bool:
+        try:
+            os.remove(self._full_path(path))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def exists(self, path: str) -> bool:
+        return os.path.exists(self._full_path(path))
+
+    def size(self, path: str) -> Optional[int]:
+        try:
+            return os.path.getsize(self._full_path(path))
+        except OSError:
+            return None
+
+    def public_url(self, path: str) -> str:
+        return f"{self.base_url}/{path}"
+
+
+class MemoryStorageBackend(StorageBackend):
+    """Almacenamiento en memoria, para benchmarks y pruebas de carga sin red"""
+
+    name = 'memory'
+
+    def __init__(self):
+        self.objects: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def upload_bytes(self, path: str, data: bytes, content_type: str = "image/jpeg") -> bool:
+        with self._lock:
+            self.objects[path] = bytes(data)
+        return True
+
+    def delete(self, path: str) -> bool:
+        with self._lock:
+            return self.objects.pop(path, None) is not None
+
+    def exists(self, path: str) -> bool:
+        return path in self.objects
+
+    def size(self, path: str) -> Optional[int]:
+        data = self.objects.get(path)
+        return len(data) if data is not None else None
+
+    def public_url(self, path: str) -> str:
+        return f"memory://{path}"
+
+
+STORAGE_BACKENDS = {
+    SupabaseStorageBackend.name: SupabaseStorageBackend,
+    LocalStorageBackend.name: LocalStorageBackend,
+    MemoryStorageBackend.name: MemoryStorageBackend,
+}
+
+_backends: Dict[str, StorageBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_storage_backend(name: Optional[str] = None) -> StorageBackend:
+    """Devuelve (una sola vez por proceso) el almacenamiento configurado o el pedido por nombre"""
+    name = name or settings.AI_IMAGE_SETTINGS.get('STORAGE_BACKEND', 'supabase')
+    if name not in STORAGE_BACKENDS:
+        raise ValueError(f"Almacenamiento desconocido: {name}")
+    if name not in _backends:
+        with _backends_lock:
+            if name not in _backends:
+                _backends[name] = STORAGE_BACKENDS[name]()
+                logger.info(f"Almacenamiento '{name}' inicializado")
+    return _backends[name]
@@ -1,190 +1,303 @@
 # api/services/supabase_storage.py
 import base64
-import io
-import uuid
-from datetime import datetime
-from typing import Optional, Dict, Any
-from PIL import Image
-from supabase import create_client, Client
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 from django.conf import settings
+from django.db import models
 import logging
 from django.core.files.uploadedfile import InMemoryUploadedFile
+from ..models import PerfilFacial, ReconocimientoFacial, DeteccionPlaca, Usuario
+from .image_processing import FORMATS, FULL, Rendered, get_preset
+from .storage_backends import StorageBackend, get_storage_backend
 
 logger = logging.getLogger(__name__)
 
+# (bytes de la imagen, carpeta, prefijo) para upload_many
+UploadItem = Tuple[bytes, str, str]
+
+# Filas que guardan la ruta de un objeto del almacenamiento (para el conteo de referencias)
+PATH_REFERENCES = (
+    (PerfilFacial, 'imagen_path'),
+    (ReconocimientoFacial, 'imagen_path'),
+    (DeteccionPlaca, 'imagen_path'),
+)
+# ... y las que guardan directamente su URL pública
+URL_REFERENCES = (
+    (Usuario, 'foto_perfil_url'),
+)
+
+
+class KnownObjects:
+    """
+    Rutas que este proceso ya subió (LRU acotado, por proceso). Es solo una
+    pista: antes de dar una por presente se confirma con `exists()`.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._paths: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, path: str) -> bool:
+        with self._lock:
+            if path in self._paths:
+                self._paths.move_to_end(path)
+                return True
+            return False
 
-class SupabaseStorageService:
-    """Servicio para manejar almacenamiento de imágenes en Supabase Storage"""
+    def add(self, path: str):
+        with self._lock:
+            self._paths[path] = None
+            self._paths.move_to_end(path)
+            while len(self._paths) > self.max_size:
+                self._paths.popitem(last=False)
 
-    def __init__(self):
-        self.supabase: Client = create_client(
-            settings.SUPABASE_URL,
-            settings.SUPABASE_SERVICE_KEY
-        )
-        self.bucket_name = settings.SUPABASE_STORAGE_BUCKET
-        self._ensure_bucket_exists()
+    def discard(self, path: str):
+        with self._lock:
+            self._paths.pop(path, None)
 
-    def _ensure_bucket_exists(self):
-        """Asegura que el bucket existe"""
-        try:
-            buckets = self.supabase.storage.list_buckets()
-            bucket_exists = any(bucket.name == self.bucket_name for bucket in buckets)
 
-            if not bucket_exists:
-                self.supabase.storage.create_bucket(
-                    self.bucket_name,
-                    options={"public": True}
-                )
-                logger.info(f"Bucket '{self.bucket_name}' creado exitosamente")
+known_objects = KnownObjects(settings.AI_IMAGE_SETTINGS.get('STORAGE_KNOWN_OBJECTS', 10000))
 
-        except Exception as e:
-            logger.error(f"Error verificando/creando bucket: {e}")
 
-    def upload_base64_image(self, base64_string: str, folder: str, prefix: str = "img") -> Optional[Dict[str, Any]]:
-        """Sube una imagen Base64 a Supabase Storage"""
+class SupabaseStorageService:
+    """
+    Servicio para manejar almacenamiento de imágenes: procesa la imagen y la
+    guarda en el almacenamiento configurado en AI_IMAGE_SETTINGS['STORAGE_BACKEND']
+    (Supabase, disco local o memoria).
+    """
+
+    def __init__(self, backend: Optional[StorageBackend] = None):
+        # Crear el servicio es gratis: el backend es compartido y se conecta al primer uso
+        self.backend = backend or get_storage_backend()
+
+    def ensure_bucket(self, force: bool = False) -> bool:
+        """Verifica que el almacenamiento esté listo (en Supabase, que exista el bucket)"""
+        return self.backend.prepare(force)
+
+    def upload_many(self, items: List[UploadItem], preset: Optional[str] = None,
+                    concurrency: Optional[int] = None, retries: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Sube muchas imágenes (bytes, carpeta, prefijo) a la vez: cada hilo
+        procesa su imagen (PIL suelta el GIL al decodificar y comprimir) y la
+        sube por el cliente compartido, con a lo sumo `concurrency` en curso.
+        Dentro de cada hilo los derivados se suben uno tras otro, así las
+        peticiones en vuelo nunca pasan de `concurrency`.
+        Una subida fallida se reintenta `retries` veces con espera creciente.
+
+        Devuelve {'results': [resultado o None, en el orden de `items`],
+        'uploaded', 'deduplicated', 'failed', 'elapsed_seconds',
+        'images_per_second', 'latency_ms_p50', 'latency_ms_p95'}.
+        """
+        ai_settings = settings.AI_IMAGE_SETTINGS
+        concurrency = concurrency or ai_settings['STORAGE_UPLOAD_CONCURRENCY']
+        retries = ai_settings['STORAGE_UPLOAD_RETRIES'] if retries is None else retries
+
+        def _process_and_upload(item: UploadItem) -> Tuple[Optional[Dict[str, Any]], float]:
+            data, folder, prefix = item
+            start = time.perf_counter()
+            rendered = self._process_django_file_data(data, preset, folder)
+            result = self._upload_with_retries(rendered, folder, prefix, retries, parallel=False) if rendered else None
+            return result, time.perf_counter() - start
+
+        started = time.perf_counter()
+        self.backend.prepare()
+        with ThreadPoolExecutor(max(1, min(concurrency, len(items) or 1))) as pool:
+            outcomes = list(pool.map(_process_and_upload, items))
+        elapsed = time.perf_counter() - started
+
+        results = [result for result, _ in outcomes]
+        latencies = sorted(latency * 1000 for _, latency in outcomes)
+        summary = {
+            'results': results,
+            'uploaded': sum(1 for result in results if result and not result['deduplicated']),
+            'deduplicated': sum(1 for result in results if result and result['deduplicated']),
+            'failed': sum(1 for result in results if result is None),
+            'elapsed_seconds': round(elapsed, 3),
+            'images_per_second': round(len(items) / elapsed, 2) if elapsed else None,
+            'latency_ms_p50': round(latencies[len(latencies) // 2], 1) if latencies else None,
+            'latency_ms_p95': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1)
+            if latencies else None,
+        }
+        logger.info(
+            f"Subida por lotes: {len(items)} imágenes en {summary['elapsed_seconds']} s "
+            f"({summary['images_per_second']} img/s, p95 {summary['latency_ms_p95']} ms), "
+            f"{summary['deduplicated']} ya existían, {summary['failed']} fallidas"
+        )
+        return summary
+
+    def _upload_with_retries(self, rendered: Dict[str, Rendered], folder: str, prefix: str,
+                             retries: int, parallel: bool = True) -> Optional[Dict[str, Any]]:
+        for attempt in range(retries + 1):
+            try:
+                result = self._upload_processed(rendered, folder, prefix, parallel)
+                if result:
+                    return result
+            except Exception as e:
+                logger.warning(f"Error subiendo imagen a {folder} (intento {attempt + 1}): {e}")
+            if attempt < retries:
+                time.sleep(0.5 * 2 ** attempt)
+        logger.error(f"No se pudo subir la imagen a {folder} tras {retries + 1} intentos")
+        return None
+
+    def upload_base64_image(self, base64_string: str, folder: str, prefix: str = "img",
+                            preset: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Sube una imagen Base64 al almacenamiento (`preset` por defecto según la carpeta)"""
         try:
-            processed_image = self._process_base64_image(base64_string)
-            if not processed_image:
+            rendered = self._process_base64_image(base64_string, preset, folder)
+            if not rendered:
                 return None
-
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            unique_id = uuid.uuid4().hex[:8]
-            filename = f"{prefix}_{timestamp}_{unique_id}.jpg"
-            file_path = f"{folder}/{filename}"
-
-            response = self.supabase.storage.from_(self.bucket_name).upload(
-                file_path,
-                processed_image,
-                file_options={
-                    "content-type": "image/jpeg",
-                    "cache-control": "3600"
-                }
-            )
-
-            if response:
-                public_url = self.get_public_url(file_path)
-
-                return {
-                    'file_path': file_path,
-                    'public_url': public_url,
-                    'filename': filename,
-                    'folder': folder,
-                    'size_bytes': len(processed_image)
-                }
-
-            return None
+            return self._upload_processed(rendered, folder, prefix)
 
         except Exception as e:
             logger.error(f"Error subiendo imagen a Supabase: {e}")
             return None
 
-    def _process_base64_image(self, base64_string: str) -> Optional[bytes]:
+    def _upload_processed(self, rendered: Dict[str, Rendered], folder: str, prefix: str,
+                          parallel: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Guarda una imagen ya procesada (y sus derivados) con el hash de la
+        imagen completa como nombre: si este proceso ya la subió y sigue en el
+        almacenamiento (otro proceso o `limpiar_imagenes` pudo borrarla) no se
+        vuelve a subir; si otro la subió, el upsert la sobrescribe con los
+        mismos bytes. `prefix` ya no forma parte del nombre (lo haría distinto
+        para los mismos bytes). Con `parallel` los derivados se suben a la vez;
+        si no, en serie (cuando quien llama ya sube en paralelo).
+        """
+        processed_image = rendered[FULL][0]
+        digest = hashlib.sha256(processed_image).hexdigest()
+        filename = f"{digest}.jpg"
+        file_path = f"{folder}/{filename}"
+        derivative_paths = {
+            name: f"{folder}/{digest}_{name}.{extension}"
+            for name, (_, _, extension) in rendered.items() if name != FULL
+        }
+
+        # Solo se consulta el almacenamiento por las rutas ya vistas, no en cada subida
+        deduplicated = file_path in known_objects and self.backend.exists(file_path)
+        if not deduplicated:
+            # Los derivados primero: si la completa existe, sus derivados también
+            names = list(derivative_paths) + [FULL]
+            uploads = [(derivative_paths.get(name, file_path), rendered[name][0], rendered[name][1]) for name in names]
+            if parallel:
+                uploaded = self.backend.upload_many(uploads)
+            else:
+                uploaded = [self.backend.upload_bytes(*upload) for upload in uploads]
+            results = dict(zip(names, uploaded))
+            if not results[FULL]:
+                return None
+            derivative_paths = {name: path for name, path in derivative_paths.items() if results[name]}
+        known_objects.add(file_path)
+
+        return {
+            'file_path': file_path,
+            'public_url': self.get_public_url(file_path),
+            'filename': filename,
+            'folder': folder,
+            'size_bytes': len(processed_image),
+            'deduplicated': deduplicated,
+            'derivatives': derivative_paths
+        }
+
+    def _process_base64_image(self, base64_string: str, preset: Optional[str] = None,
+                              folder: Optional[str] = None) -> Optional[Dict[str, Rendered]]:
         """Procesa y optimiza imagen Base64"""
         try:
             if base64_string.startswith('data:image'):
                 base64_string = base64_string.split(',', 1)[1]
-
             image_data = base64.b64decode(base64_string)
-            image = Image.open(io.BytesIO(image_data))
-
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-
-            max_size = settings.AI_IMAGE_SETTINGS['THUMBNAIL_SIZE']
-            image.thumbnail(max_size, Image.Resampling.LANCZOS)
-
-            output = io.BytesIO()
-            image.save(
-                output,
-                format='JPEG',
-                quality=settings.AI_IMAGE_SETTINGS['JPEG_QUALITY'],
-                optimize=True
-            )
-
-            return output.getvalue()
-
         except Exception as e:
             logger.error(f"Error procesando imagen Base64: {e}")
             return None
+        return get_preset(preset, folder).render(image_data)
 
     def get_public_url(self, file_path: str) -> str:
         """Obtiene URL pública de un archivo"""
-        return f"{settings.SUPABASE_STORAGE_URL}/{file_path}"
-
-    def delete_file(self, file_path: str) -> bool:
-        """Elimina un archivo del storage"""
+        return self.backend.public_url(file_path)
+
+    def delete_file(self, file_path: str, released_by: Optional[models.Model] = None) -> bool:
+        """
+        Elimina un archivo del storage, salvo que otra fila lo siga usando
+        (varias filas pueden apuntar al mismo objeto). `released_by` es la fila
+        que deja de usarlo y no cuenta como referencia.
+        """
         try:
-            response = self.supabase.storage.from_(self.bucket_name).remove([file_path])
-            return len(response) > 0
+            references = self.count_references(file_path, exclude=released_by)
+            if references:
+                logger.info(f"Archivo {file_path} conservado: lo usan {references} registros más")
+                return True
+            known_objects.discard(file_path)
+            # Los derivados comparten el nombre (hash) de la imagen completa; un solo pedido de borrado
+            return self.backend.delete_many([file_path] + derivative_paths(file_path))[0]
         except Exception as e:
             logger.error(f"Error eliminando archivo {file_path}: {e}")
             return False
 
-    def upload_django_file(self, django_file: InMemoryUploadedFile, folder: str, prefix: str = "img") -> Optional[
-        Dict[str, Any]]:
-        """Sube un archivo Django a Supabase Storage"""
+    def count_references(self, file_path: str, exclude: Optional[models.Model] = None) -> int:
+        """Cuántas filas apuntan a este objeto (sin contar `exclude`)"""
+        public_url = self.get_public_url(file_path)
+        lookups = [(model, {field: file_path}) for model, field in PATH_REFERENCES]
+        lookups += [(model, {field: public_url}) for model, field in URL_REFERENCES]
+
+        total = 0
+        for model, lookup in lookups:
+            queryset = model.objects.filter(**lookup)
+            if exclude is not None and isinstance(exclude, model):
+                queryset = queryset.exclude(pk=exclude.pk)
+            total += queryset.count()
+        return total
+
+    def upload_django_file(self, django_file: InMemoryUploadedFile, folder: str, prefix: str = "img",
+                           preset: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Sube un archivo Django al almacenamiento (`preset` por defecto según la carpeta)"""
         try:
             # Leer y procesar el archivo
             django_file.seek(0)  # Asegurar que estamos al inicio
             file_data = django_file.read()
 
             # Procesar la imagen
-            processed_image = self._process_django_file_data(file_data)
-            if not processed_image:
+            rendered = self._process_django_file_data(file_data, preset, folder)
+            if not rendered:
                 return None
-
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            unique_id = uuid.uuid4().hex[:8]
-            filename = f"{prefix}_{timestamp}_{unique_id}.jpg"
-            file_path = f"{folder}/{filename}"
-
-            response = self.supabase.storage.from_(self.bucket_name).upload(
-                file_path,
-                processed_image,
-                file_options={
-                    "content-type": "image/jpeg",
-                    "cache-control": "3600"
-                }
-            )
-
-            if response:
-                public_url = self.get_public_url(file_path)
-
-                return {
-                    'file_path': file_path,
-                    'public_url': public_url,
-                    'filename': filename,
-                    'folder': folder,
-                    'size_bytes': len(processed_image)
-                }
-
-            return None
+            return self._upload_processed(rendered, folder, prefix)
 
         except Exception as e:
             logger.error(f"Error subiendo archivo Django a Supabase: {e}")
             return None
 
-    def _process_django_file_data(self, file_data: bytes) -> Optional[bytes]:
+    def _process_django_file_data(self, file_data: bytes, preset: Optional[str] = None,
+                                  folder: Optional[str] = None) -> Optional[Dict[str, Rendered]]:
         """Procesa y optimiza datos de archivo Django"""
-        try:
-            image = Image.open(io.BytesIO(file_data))
+        return get_preset(preset, folder).render(file_data)
 
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
 
-            max_size = settings.AI_IMAGE_SETTINGS['THUMBNAIL_SIZE']
-            image.thumbnail(max_size, Image.Resampling.LANCZOS)
+def derivative_paths(file_path: str) -> List[str]:
+    """Rutas posibles de los derivados de una imagen (en cualquiera de los formatos)"""
+    base, _, _ = file_path.rpartition('.')
+    return [f"{base}_{name}.{extension}"
+            for name in settings.AI_IMAGE_SETTINGS['IMAGE_DERIVATIVES']
+            for _, extension in FORMATS.values()]
 
-            output = io.BytesIO()
-            image.save(
-                output,
-                format='JPEG',
-                quality=settings.AI_IMAGE_SETTINGS['JPEG_QUALITY'],
-                optimize=True
-            )
 
-            return output.getvalue()
+def derived_images_value(upload_result: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Valor de `imagenes_derivadas` (JSON {"tiny": ruta, ...}) para una subida"""
+    if not upload_result or not upload_result.get('derivatives'):
+        return None
+    return json.dumps(upload_result['derivatives'])
 
-        except Exception as e:
-            logger.error(f"Error procesando datos de archivo Django: {e}")
-            return None
\ No newline at end of file
+
+def derived_image_url(obj, size: str) -> Optional[str]:
+    """URL del derivado `size` de una fila, o la de la imagen completa si no lo tiene"""
+    if size != FULL and getattr(obj, 'imagenes_derivadas', None):
+        try:
+            path = json.loads(obj.imagenes_derivadas).get(size)
+        except ValueError:
+            path = None
+        if path:
+            return get_storage_backend().public_url(path)
+    return obj.imagen_url
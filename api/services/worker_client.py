@@ -0,0 +1,22 @@
+# api/services/worker_client.py
+import os
+import requests
+from django.conf import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+AI_WORKER_URL = os.getenv("AI_WORKER_URL")
+
+
+def notify_worker(path: str, what: str):
+    """Avisa al worker de IA (con X-Worker-Token) que `what` cambió; sin AI_WORKER_URL no hace nada"""
+    if not AI_WORKER_URL:
+        return
+    try:
+        response = requests.post(f"{AI_WORKER_URL}{path}",
+                                 headers={'X-Worker-Token': settings.AI_WORKER_TOKEN}, timeout=2)
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        # No es crítico: el worker recarga sus datos al vencer el TTL
+        logger.warning(f"No se pudo invalidar {what} del worker: {e}")
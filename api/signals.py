@@ -0,0 +1,87 @@
+# api/signals.py
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from .authentication import invalidate_tokens, invalidate_user, invalidate_usuarios, token_cache
+from .models import PerfilFacial, Rol, Usuario
+from .services.catalog_cache import CATALOG_MODELS, invalidate_catalog
+from .services.face_index import face_index
+from .services.worker_client import notify_worker
+
+
+# --- Invalidación del cache de tokens (CachedTokenAuthentication) ---
+
+@receiver(post_delete, sender=Token)
+def token_borrado(sender, instance, **kwargs):
+    # LogoutView (una sesión o todas) y el borrado en cascada del usuario
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def usuario_django_cambiado(sender, instance, update_fields=None, **kwargs):
+    # El login solo actualiza last_login: no cambia nada de lo cacheado
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Usuario)
+@receiver(post_delete, sender=Usuario)
+def usuario_cambiado(sender, instance, **kwargs):
+    # Cambio de rol o de correo: el Usuario cacheado con el token ya no sirve
+    invalidate_usuarios([instance])
+
+
+@receiver(pre_save, sender=Usuario)
+def recordar_contrasena(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Valor guardado antes de este save, para que contrasena_cambiada solo actúe si de verdad cambió
+    if raw or instance.pk is None or (update_fields is not None and 'contrasena' not in update_fields):
+        return
+    instance._contrasena_anterior = (Usuario.objects.filter(pk=instance.pk)
+                                     .values_list('contrasena', flat=True).first())
+
+
+@receiver(post_save, sender=Usuario)
+def contrasena_cambiada(sender, instance, created, update_fields=None, **kwargs):
+    # El hash de auth.User deja de servir si cambió Usuario.contrasena: se marca como no utilizable
+    # (sin hashear nada) y el próximo login lo regenera comparando con la nueva
+    anterior = instance.__dict__.pop('_contrasena_anterior', instance.contrasena)
+    if created or (update_fields is not None and 'contrasena' not in update_fields):
+        return
+    if instance.correo and instance.contrasena is not None and instance.contrasena != anterior:
+        (User.objects.filter(username=instance.correo)
+         .exclude(password__startswith='!')
+         .update(password=make_password(None)))
+
+
+@receiver(post_save, sender=Rol)
+@receiver(post_delete, sender=Rol)
+def rol_cambiado(sender, instance, **kwargs):
+    invalidate_usuarios(Usuario.objects.filter(idrol=instance))
+    # Entradas locales de usuarios que tenían este rol (aunque ya lo hayan cambiado)
+    token_cache.delete_where(lambda entry: entry[2] is not None and entry[2].idrol_id == instance.pk)
+
+
+# --- Invalidación de la galería facial ---
+
+@receiver(post_save, sender=PerfilFacial)
+@receiver(post_delete, sender=PerfilFacial)
+def perfil_facial_cambiado(sender, instance, **kwargs):
+    # La galería de este proceso se reconstruye en el próximo reconocimiento; la del worker, tras el commit
+    face_index.invalidate()
+    transaction.on_commit(lambda: notify_worker("/invalidate_faces", "la galería facial"))
+
+
+# --- Invalidación del cache de catálogos ---
+
+def catalogo_cambiado(sender, **kwargs):
+    invalidate_catalog(sender)
+
+
+for catalog_model in CATALOG_MODELS:
+    post_save.connect(catalogo_cambiado, sender=catalog_model, dispatch_uid=f"catalog_{catalog_model.__name__}_save")
+    post_delete.connect(catalogo_cambiado, sender=catalog_model, dispatch_uid=f"catalog_{catalog_model.__name__}_delete")
@@ -1,3 +1,371 @@
-from django.test import TestCase
+import re
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from .models import normalize_plate
+from .services.plate_matcher import PlateMatcher, confusable
+
+
+class FakePlateIndex:
+    """Índice de placas en memoria con el PlateMatcher real (sin BD)"""
+
+    def __init__(self, plates):
+        self.vehicles = {normalize_plate(plate): SimpleNamespace(nro_placa=plate) for plate in plates}
+        self.matcher = PlateMatcher(self.vehicles)
+
+    def is_authorized(self, plate):
+        return normalize_plate(plate) in self.vehicles
+
+    def fuzzy_match(self, plate, max_distance):
+        match = self.matcher.best_match(normalize_plate(plate), max_distance)
+        if match is None:
+            return None
+        key, distance = match
+        return self.vehicles[key], distance
+
+
+class PlateMatcherTests(SimpleTestCase):
+    def setUp(self):
+        self.matcher = PlateMatcher(['ABC1234'])
+        self.max_distance = settings.AI_IMAGE_SETTINGS['PLATE_FUZZY_MAX_DISTANCE']
+
+    def test_confusable_characters_match(self):
+        self.assertEqual(self.matcher.best_match('A8C1234', self.max_distance), ('ABC1234', 0.25))
+
+    def test_one_character_non_confusable_difference_is_rejected(self):
+        for plate in ('ABC1235', 'ABD1234', 'ABC123', 'AB01234'):
+            with self.subTest(plate=plate):
+                self.assertIsNone(self.matcher.best_match(plate, self.max_distance))
+
+    def test_non_confusable_difference_rejected_even_with_large_threshold(self):
+        self.assertIsNone(self.matcher.best_match('ABC1235', 2.0))
+        self.assertFalse(confusable('ABC1234', 'ABC1239'))
+        self.assertTrue(confusable('ABC1234', 'A8C1Z34'))
+
+
+class SelectPlateTests(SimpleTestCase):
+    def setUp(self):
+        from .services.ai_detection import PlateDetectionService
+        # Sin __init__: no hace falta EasyOCR para probar la elección de la lectura
+        self.service = PlateDetectionService.__new__(PlateDetectionService)
+        self.service.plate_pattern = re.compile(r'^[A-Z]{3}-?\d{4}$|^\d{4}-?[A-Z]{3}$')
+        self.service.confidence_threshold = 0.5
+        self.service.fuzzy_max_distance = settings.AI_IMAGE_SETTINGS['PLATE_FUZZY_MAX_DISTANCE']
+        patcher = mock.patch('api.services.ai_detection.plate_index', FakePlateIndex(['ABC-1234']))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_well_formed_unauthorized_read_is_not_rewritten(self):
+        for text in ('ABC1235', 'ABD1234'):
+            with self.subTest(text=text):
+                plate, authorized, _ = self.service._select_plate([(None, text, 0.9)])
+                self.assertFalse(authorized)
+                self.assertEqual(normalize_plate(plate), text)
+
+    def test_invalid_read_with_one_non_confusable_difference_is_rejected(self):
+        for text in ('ABC123', 'AB01234'):
+            with self.subTest(text=text):
+                self.assertEqual(self.service._select_plate([(None, text, 0.9)]), (None, False, 0.0))
+
+    def test_invalid_read_with_ocr_confusion_is_corrected(self):
+        plate, authorized, _ = self.service._select_plate([(None, 'A8C1234', 0.9)])
+        self.assertEqual((plate, authorized), ('ABC-1234', True))
+
+    def test_full_frame_is_read_when_candidates_give_no_plate(self):
+        self.service.ocr_batcher = None
+        self.service.plate_allowlist = None
+        self.service.reader = mock.Mock()
+        self.service.reader.recognize.return_value = [(None, 'RESIDENTES', 0.9)]
+        self.service.reader.readtext.return_value = [(None, 'ABC-1234', 0.9)]
+        with mock.patch.object(self.service, '_preprocess_image', side_effect=lambda image: image), \
+                mock.patch.object(self.service, '_locate_plate_candidates', return_value=[[0, 10, 0, 5]]):
+            plate, authorized, _ = self.service.analyze_plate('frame')
+        self.assertEqual((plate, authorized), ('ABC-1234', True))
+        self.service.reader.readtext.assert_called_once_with('frame')
+
+
+class PlateEventDeduplicatorTests(SimpleTestCase):
+    camera = ('Entrada', 'entrada')
+
+    def setUp(self):
+        from .services.plate_dedup import PlateEventDeduplicator
+        self.events = PlateEventDeduplicator(window_seconds=30,
+                                             max_distance=settings.AI_IMAGE_SETTINGS['PLATE_DEDUP_MAX_DISTANCE'])
+
+    def test_repeated_read_joins_the_event(self):
+        first, is_new, _ = self.events.observe(self.camera, 'ABC-1234', True)
+        self.assertTrue(is_new)
+        again, is_new, _ = self.events.observe(self.camera, 'ABC1234', True)
+        self.assertFalse(is_new)
+        self.assertIs(again, first)
+
+    def test_other_car_one_character_away_is_a_new_event(self):
+        self.events.observe(self.camera, 'ABC1234', True)
+        for plate, authorized in (('ABC1239', False), ('ABC1239', True), ('ABD1234', False)):
+            with self.subTest(plate=plate, authorized=authorized):
+                _, is_new, _ = self.events.observe(self.camera, plate, authorized)
+                self.assertTrue(is_new)
+
+    def test_different_authorization_never_merges(self):
+        self.events.observe(self.camera, 'ABC1234', False)
+        _, is_new, _ = self.events.observe(self.camera, 'ABC1234', True)
+        self.assertTrue(is_new)
+
+    def test_unauthorized_ocr_confusion_joins_the_event(self):
+        self.events.observe(self.camera, 'XYZ1234', False)
+        _, is_new, _ = self.events.observe(self.camera, 'XYZ1Z34', False)
+        self.assertFalse(is_new)
+
+
+class OfflineScanGroupingTests(SimpleTestCase):
+    def setUp(self):
+        from .services.offline_scan import OfflineScanner
+        # Sin __init__: solo se prueba la agrupación de lecturas
+        self.scanner = OfflineScanner.__new__(OfflineScanner)
+        self.scanner.stride = 5
+
+    def plates(self, *reads):
+        return [{'kind': 'plate', 'frame': frame, 'plate': plate, 'authorized': authorized, 'confidence': 0.9}
+                for frame, plate, authorized in reads]
+
+    def test_plate_groups_follow_live_deduplication(self):
+        groups = self.scanner._group(self.plates((0, 'XYZ1234', False), (5, 'XYZ1Z34', False),
+                                                 (10, 'ABC1234', True), (15, 'ABC1239', True),
+                                                 (20, 'ABC1234', False)), self.scanner._same_plate)
+        self.assertEqual([[d['plate'] for d in group] for group in groups],
+                         [['XYZ1234', 'XYZ1Z34'], ['ABC1234'], ['ABC1239'], ['ABC1234']])
+
+    def test_unknown_faces_are_never_grouped(self):
+        faces = [{'kind': 'face', 'frame': frame, 'usuario_id': usuario_id, 'confidence': 0.9}
+                 for frame, usuario_id in ((0, None), (5, None), (10, 7), (15, 7))]
+        groups = self.scanner._group(faces, self.scanner._same_person)
+        self.assertEqual([len(group) for group in groups], [1, 1, 2])
+
+
+class FaceIndexTests(SimpleTestCase):
+    def setUp(self):
+        import json
+        import numpy as np
+        from .services.face_index import FaceIndex
+        rng = np.random.default_rng(0)
+        self.encodings = {perfil_id: rng.normal(0, 0.1, 128).tolist() for perfil_id in (1, 2, 3)}
+        self.perfiles = [SimpleNamespace(id=perfil_id, encoding_facial=json.dumps(encoding),
+                                         codigo_usuario=f"usuario {perfil_id}")
+                         for perfil_id, encoding in self.encodings.items()]
+        self.queries = []
+
+        def filter(**lookups):
+            self.queries.append(lookups)
+            ids = lookups.get('id__in')
+            result = mock.MagicMock()
+            perfiles = [perfil for perfil in self.perfiles if ids is None or perfil.id in ids]
+            result.select_related.return_value = perfiles
+            result.only.return_value = perfiles
+            return result
+
+        patcher = mock.patch('api.services.face_index.PerfilFacial')
+        patcher.start().objects.filter.side_effect = filter
+        self.addCleanup(patcher.stop)
+        self.index = FaceIndex(ttl_seconds=300)
+
+    def test_gallery_is_built_once_until_invalidated(self):
+        first = self.index.gallery('dlib')
+        self.assertIs(self.index.gallery('dlib'), first)
+        self.assertEqual(len(self.queries), 1)
+        self.index.invalidate()
+        self.assertIsNot(self.index.gallery('dlib'), first)
+        self.assertEqual(len(self.queries), 2)
+
+    def test_int8_exact_encodings_are_read_once(self):
+        with self.settings(AI_IMAGE_SETTINGS={**settings.AI_IMAGE_SETTINGS, 'FACE_GALLERY_PRECISION': 'int8'}):
+            gallery = self.index.gallery('dlib')
+        for _ in range(3):
+            index, distance = gallery.best_match(self.encodings[2], 0.6)
+            self.assertEqual((gallery.users[index], distance), ('usuario 2', 0.0))
+        self.assertEqual([lookups for lookups in self.queries if 'id__in' in lookups], [{'id__in': [1, 2, 3]}])
+
+
+class FaceGalleryTests(SimpleTestCase):
+    def test_float32_rerank_uses_the_original_float64_encodings(self):
+        import numpy as np
+        from .services.face_gallery import FaceGallery
+        rng = np.random.default_rng(1)
+        known = rng.normal(0.0, 0.055, size=(50, 128))
+        query = known[7] + rng.normal(0.0, 0.01, 128)
+        gallery = FaceGallery('float32', top_k=5).build(known, range(len(known)))
+        index, distance = gallery.search(query)[0]
+        self.assertEqual(index, 7)
+        self.assertEqual(distance, float(np.linalg.norm(known[7] - query)))
+
+
+class CachedTokenAuthenticationTests(SimpleTestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from rest_framework.authtoken.models import Token
+        from .authentication import token_cache
+        from .models import Usuario
+        self.user = User(id=1, username='residente', email='residente@example.com')
+        self.usuario = Usuario(codigo=1, correo='residente@example.com', foto_perfil_url='antes')
+        token_cache.set('clave', (self.user, Token(key='clave', user=self.user), self.usuario))
+        self.addCleanup(token_cache.delete_many, ['clave'])
+
+    def test_each_request_gets_its_own_instances(self):
+        from .authentication import CachedTokenAuthentication
+        authentication = CachedTokenAuthentication()
+        first_user, first_token = authentication.authenticate_credentials('clave')
+        second_user, _ = authentication.authenticate_credentials('clave')
+        self.assertIsNot(first_user, self.user)
+        self.assertIsNot(first_user, second_user)
+        self.assertIs(first_token.user, first_user)
+
+    def test_usuario_changes_do_not_leak_into_the_cache(self):
+        from rest_framework.test import APIRequestFactory
+        from rest_framework.request import Request
+        from .authentication import CachedTokenAuthentication, get_usuario
+        request = Request(APIRequestFactory().get('/', HTTP_AUTHORIZATION='Token clave'))
+        request.user, _ = CachedTokenAuthentication().authenticate(request)
+        usuario = get_usuario(request)
+        usuario.foto_perfil_url = 'despues'
+        self.assertIsNot(usuario, self.usuario)
+        self.assertEqual(self.usuario.foto_perfil_url, 'antes')
+
+
+class VerificarCredencialesTests(SimpleTestCase):
+    def login_row(self, auth_password, contrasena):
+        return SimpleNamespace(auth_user_id=1, auth_password=auth_password, contrasena=contrasena)
+
+    def test_plaintext_is_not_a_second_password_when_the_hash_is_usable(self):
+        from django.contrib.auth.hashers import make_password
+        from .views import _verificar_credenciales
+        u = self.login_row(make_password('nueva'), 'anterior')
+        self.assertFalse(_verificar_credenciales(u, 'anterior'))
+        self.assertFalse(u.auth_password_pendiente)
+
+    def test_plaintext_is_checked_when_the_hash_is_unusable(self):
+        from django.contrib.auth.hashers import make_password
+        from .views import _verificar_credenciales
+        u = self.login_row(make_password(None), 'nueva')
+        self.assertTrue(_verificar_credenciales(u, 'nueva'))
+        self.assertTrue(u.auth_password_pendiente)
+        self.assertFalse(_verificar_credenciales(self.login_row(None, 'nueva'), 'otra'))
+
+
+class KeysetPaginationTests(SimpleTestCase):
+    def paginate(self, url):
+        from rest_framework.request import Request
+        from rest_framework.test import APIRequestFactory
+        from .pagination import BitacoraPagination
+        paginator = BitacoraPagination()
+        paginator.request = Request(APIRequestFactory().get(url))
+        return paginator
+
+    def test_null_keys_sort_last_and_do_not_break_the_cursor(self):
+        paginator = self.paginate('/bitacora/?cursor=')
+        paginator.fields = ['fecha', 'hora', 'id']
+        from .models import Bitacora
+        paginator.model = Bitacora
+        # La clave de una fila sin fecha ni hora viaja como null y vuelve como None
+        link = paginator._link([None, None, 7], reverse=False)
+        paginator.request = self.paginate(link).request
+        self.assertEqual(paginator._decode_cursor(paginator.request), ([None, None, 7], False))
+        after = str(paginator._after([None, None, 7], reverse=False))
+        self.assertIn("'fecha__isnull', True", after)
+        self.assertNotIn("'fecha__lt'", after)
+
+
+class UploadManyTests(SimpleTestCase):
+    def test_in_flight_uploads_never_exceed_the_concurrency(self):
+        import io
+        import threading
+        import time
+        from PIL import Image
+        from .services.storage_backends import MemoryStorageBackend
+        from .services.supabase_storage import SupabaseStorageService
+
+        class CountingBackend(MemoryStorageBackend):
+            def __init__(self):
+                super().__init__()
+                self.in_flight = self.peak = 0
+                self.counter_lock = threading.Lock()
+
+            def upload_bytes(self, path, data, content_type="image/jpeg"):
+                with self.counter_lock:
+                    self.in_flight += 1
+                    self.peak = max(self.peak, self.in_flight)
+                time.sleep(0.01)
+                with self.counter_lock:
+                    self.in_flight -= 1
+                return super().upload_bytes(path, data, content_type)
+
+            def upload_many(self, uploads):
+                # Como SupabaseStorageBackend: un hilo por objeto
+                from concurrent.futures import ThreadPoolExecutor
+                with ThreadPoolExecutor(len(uploads)) as pool:
+                    return list(pool.map(lambda upload: self.upload_bytes(*upload), uploads))
+
+        def image(color):
+            buffer = io.BytesIO()
+            Image.new('RGB', (800, 600), color).save(buffer, 'JPEG')
+            return buffer.getvalue()
+
+        backend = CountingBackend()
+        items = [(image((index * 20, 0, 0)), 'facial', 'img') for index in range(6)]
+        summary = SupabaseStorageService(backend).upload_many(items, concurrency=2)
+        self.assertEqual(summary['failed'], 0)
+        self.assertGreater(len(backend.objects), len(items))
+        self.assertLessEqual(backend.peak, 2)
+
+
+class UploadDeduplicationTests(SimpleTestCase):
+    def test_known_object_deleted_elsewhere_is_uploaded_again(self):
+        import base64
+        import io
+        from PIL import Image
+        from .services.storage_backends import MemoryStorageBackend
+        from .services.supabase_storage import SupabaseStorageService
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (640, 480), (0, 90, 180)).save(buffer, 'JPEG')
+        image = base64.b64encode(buffer.getvalue()).decode()
+        backend = MemoryStorageBackend()
+        service = SupabaseStorageService(backend)
+
+        first = service.upload_base64_image(image, 'facial')
+        self.assertTrue(service.upload_base64_image(image, 'facial')['deduplicated'])
+
+        # Otro proceso (o limpiar_imagenes) borra el objeto: la ruta sigue en known_objects
+        backend.delete_many([first['file_path']])
+        again = service.upload_base64_image(image, 'facial')
+        self.assertFalse(again['deduplicated'])
+        self.assertTrue(backend.exists(first['file_path']))
+
+
+class StripJpegMetadataTests(SimpleTestCase):
+    def jpeg(self, **options):
+        import io
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new('RGB', (320, 240), (10, 200, 30)).save(buffer, 'JPEG', **options)
+        return buffer.getvalue()
+
+    def test_passthrough_drops_exif_and_comments_but_keeps_the_color_profile(self):
+        import io
+        from PIL import Image
+        from .services.image_processing import FULL, get_preset
+        exif = Image.Exif()
+        exif[0x010F] = 'Camara'
+        data = self.jpeg(exif=exif.tobytes(), comment=b'serie 1234', icc_profile=b'\0' * 64)
+        stored = get_preset('evidence').render(data)[FULL][0]
+        info = Image.open(io.BytesIO(stored)).info
+        self.assertNotIn('exif', info)
+        self.assertNotIn('comment', info)
+        self.assertIn('icc_profile', info)
+
+    def test_clean_jpeg_is_stored_byte_for_byte(self):
+        from .services.image_processing import strip_jpeg_metadata
+        data = self.jpeg()
+        self.assertEqual(strip_jpeg_metadata(data), data)
+        self.assertIsNone(strip_jpeg_metadata(b'\x89PNG\r\n'))
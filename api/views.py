@@ -14,13 +14,21 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
 from django.contrib.auth.models import User
+from django.contrib.auth.hashers import check_password, is_password_usable, make_password
+from django.utils.crypto import constant_time_compare
 from rest_framework.authtoken.models import Token
 from rest_framework.decorators import action
 from django.utils import timezone
 from datetime import timedelta
 from .permissions import IsAdminOrReadOnly
 from .permissions import IsAdmin
-from .services.supabase_storage import SupabaseStorageService
+from .pagination import BitacoraPagination
+from .services.supabase_storage import SupabaseStorageService, derived_image_url
+from .services.plate_index import plate_index, normalize_plate
+from .services.worker_client import notify_worker
+from .authentication import require_usuario
+from .services.catalog_cache import catalog_filter, catalog_get
+from .services.audit_log import registrar_bitacora
 import logging
 from rest_framework.parsers import MultiPartParser, FormParser
 import traceback
@@ -33,7 +41,7 @@ from io import BytesIO
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4, landscape
 from datetime import datetime, timedelta
-from django.db.models import Q, Sum
+from django.db.models import OuterRef, Q, Subquery, Sum
 from .models import Bitacora, Usuario
 from django.http import HttpResponse
 from io import BytesIO
@@ -117,17 +125,7 @@ class PropiedadViewSet(BaseModelViewSet):
                     {'detail': f'Ya existe una unidad con número {nro_casa} en piso {piso}'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-        try:
-            usuario = Usuario.objects.get(correo=request.user.email)
-            Bitacora.objects.create(
-                codigo_usuario=usuario,
-                accion=f"Creación de unidad habitacional {nro_casa}",
-                fecha=timezone.now().date(),
-                hora=timezone.now().time(),
-                ip=self._get_client_ip(request)
-            )
-        except Usuario.DoesNotExist:
-            pass
+        registrar_bitacora(request, f"Creación de unidad habitacional {nro_casa}")
         try:
             with transaction.atomic():
                 return super().create(request, *args, **kwargs)
@@ -152,17 +150,7 @@ class PropiedadViewSet(BaseModelViewSet):
                 {"detail": f"Ya existe una unidad con número {nro_casa} en piso {piso}"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        try:
-            usuario = Usuario.objects.get(correo=request.user.email)
-            Bitacora.objects.create(
-                codigo_usuario=usuario,
-                accion=f"Edición de unidad habitacional {instance.nro_casa}",
-                fecha=timezone.now().date(),
-                hora=timezone.now().time(),
-                ip=self._get_client_ip(request)
-            )
-        except Usuario.DoesNotExist:
-            pass
+        registrar_bitacora(request, f"Edición de unidad habitacional {instance.nro_casa}")
         try:
             with transaction.atomic():
                 return super().update(request, *args, **kwargs)
@@ -208,35 +196,12 @@ class PropiedadViewSet(BaseModelViewSet):
             result.append(prop_data)
 
         return result
-
-    def _get_client_ip(self, request):
-        """Obtiene la IP del cliente"""
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
     # --- FIN DE LA CORRECCIÓN DE INDENTACIÓN ---
 
 
 class BitacoraMixin:
     def _bitacora(self, request, accion: str):
-        try:
-            usuario = Usuario.objects.get(correo=getattr(request.user, "email", None))
-            Bitacora.objects.create(
-                codigo_usuario=usuario,
-                accion=accion,
-                fecha=timezone.now().date(),
-                hora=timezone.now().time(),
-                ip=self._get_client_ip(request),
-            )
-        except Usuario.DoesNotExist:
-            pass
-
-    def _get_client_ip(self, request):
-        xf = request.META.get("HTTP_X_FORWARDED_FOR")
-        return xf.split(",")[0] if xf else request.META.get("REMOTE_ADDR")
+        registrar_bitacora(request, accion)
 
 
 class MultaViewSet(BitacoraMixin, viewsets.ModelViewSet):
@@ -354,28 +319,61 @@ class TareasViewSet(BaseModelViewSet):
     ordering_fields = ['id', 'vigencia', 'costos']
 
 
+def _invalidar_indice_placas():
+    """Invalida el índice de placas en memoria de este proceso y avisa al worker de IA"""
+    plate_index.invalidate()
+    notify_worker("/invalidate_plates", "el índice de placas")
+
+
+def _filtrar_por_placa(queryset, params, parametro: str):
+    """
+    Filtra por la placa normalizada (usa los índices de placa_normalizada):
+    `?<parametro>=abc-123` busca la placa exacta y `?placa_prefijo=AB` las que
+    empiezan así, sin importar mayúsculas, guiones ni espacios.
+    """
+    placa = params.get(parametro)
+    if placa:
+        queryset = queryset.filter(placa_normalizada=normalize_plate(placa))
+    prefijo = normalize_plate(params.get('placa_prefijo'))
+    if prefijo:
+        queryset = queryset.filter(placa_normalizada__startswith=prefijo)
+    return queryset
+
+
 class VehiculoViewSet(BaseModelViewSet):
     serializer_class = VehiculoSerializer
-    filterset_fields = ['estado', 'nro_placa', 'codigo_usuario']  # <-- CAMBIADO
+    # nro_placa se filtra por la clave normalizada en get_queryset
+    filterset_fields = ['estado', 'codigo_usuario']  # <-- CAMBIADO
     search_fields = ['nro_placa', 'descripcion', 'estado']
     ordering_fields = ['id']
 
     def get_queryset(self):
         try:
-            usuario = Usuario.objects.get(correo=self.request.user.email)
+            usuario = require_usuario(self.request)
             if usuario.idrol and usuario.idrol.tipo == 'admin':
-                return Vehiculo.objects.all().order_by('id')
-            return Vehiculo.objects.filter(codigo_usuario=usuario).order_by('id')
+                queryset = Vehiculo.objects.all().order_by('id')
+            else:
+                queryset = Vehiculo.objects.filter(codigo_usuario=usuario).order_by('id')
+            return _filtrar_por_placa(queryset, self.request.query_params, 'nro_placa')
         except Usuario.DoesNotExist:
             return Vehiculo.objects.none()
 
     def perform_create(self, serializer):
         try:
-            usuario = Usuario.objects.get(correo=self.request.user.email)
+            usuario = require_usuario(self.request)
             serializer.save(codigo_usuario=usuario, estado='activo')
         except Usuario.DoesNotExist:
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("Tu usuario no está registrado en el catálogo para realizar esta acción.")
+        _invalidar_indice_placas()
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        _invalidar_indice_placas()
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        _invalidar_indice_placas()
 
 
 # ---------------------------------------------------------------------
@@ -443,7 +441,7 @@ class PerteneceViewSet(BaseModelViewSet):
         queryset = super().get_queryset()
 
         try:
-            usuario_actual = Usuario.objects.get(correo=user.email)
+            usuario_actual = require_usuario(self.request)
             if not (usuario_actual.idrol and usuario_actual.idrol.tipo == 'admin'):
                 # Si no es admin, filtramos por su propio código de usuario.
                 queryset = queryset.filter(codigo_usuario=usuario_actual)
@@ -517,17 +515,7 @@ class PerteneceViewSet(BaseModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-        try:
-            admin_usuario = Usuario.objects.get(correo=request.user.email)
-            Bitacora.objects.create(
-                codigo_usuario=admin_usuario,
-                accion=f"Vinculación de {usuario.nombre} a unidad {propiedad.nro_casa} como {rol_asignado}",
-                fecha=timezone.now().date(),
-                hora=timezone.now().time(),
-                ip=self._get_client_ip(request)
-            )
-        except Exception:
-            pass
+        registrar_bitacora(request, f"Vinculación de {usuario.nombre} a unidad {propiedad.nro_casa} como {rol_asignado}")
 
         return super().create(request, *args, **kwargs)
 
@@ -535,28 +523,10 @@ class PerteneceViewSet(BaseModelViewSet):
         instance = self.get_object()
         usuario_asignado = instance.codigo_usuario
         propiedad_asignada = instance.codigo_propiedad
-        try:
-            admin_usuario = Usuario.objects.get(correo=request.user.email)
-            Bitacora.objects.create(
-                codigo_usuario=admin_usuario,
-                accion=f"Desvinculación de {usuario_asignado.nombre} de la unidad {propiedad_asignada.nro_casa}",
-                fecha=timezone.now().date(),
-                hora=timezone.now().time(),
-                ip=self._get_client_ip(request)
-            )
-        except Exception:
-            pass
+        registrar_bitacora(request, f"Desvinculación de {usuario_asignado.nombre} de la unidad {propiedad_asignada.nro_casa}")
         self.perform_destroy(instance)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-    def _get_client_ip(self, request):
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
-
 
 class ListaVisitantesViewSet(BaseModelViewSet):
     queryset = ListaVisitantes.objects.all().order_by('id')
@@ -663,7 +633,7 @@ class ReservaViewSet(BaseModelViewSet):
         user = self.request.user
         queryset = super().get_queryset()
         try:
-            usuario_actual = Usuario.objects.get(correo=user.email)
+            usuario_actual = require_usuario(self.request)
             if usuario_actual.idrol and usuario_actual.idrol.tipo != 'admin':
                 # CORREGIDO: 'codigo_usuario' con guion bajo
                 queryset = queryset.filter(codigo_usuario=usuario_actual)
@@ -677,7 +647,7 @@ class ReservaViewSet(BaseModelViewSet):
         """
         try:
             # Busca nuestro modelo 'Usuario' a partir del usuario autenticado
-            usuario_actual = Usuario.objects.get(correo=self.request.user.email)
+            usuario_actual = require_usuario(self.request)
             # Guarda la reserva asociándola con este usuario
             serializer.save(codigo_usuario=usuario_actual)
         except Usuario.DoesNotExist:
@@ -765,13 +735,48 @@ class RegistroViewSet(BaseModelViewSet):
 
 
 class BitacoraViewSet(BaseModelViewSet):
-    queryset = Bitacora.objects.all().order_by('-fecha', '-hora')
+    queryset = Bitacora.objects.all().order_by('-fecha', '-hora', '-id')
     serializer_class = BitacoraSerializer
+    # ?page= como siempre; con ?cursor= pagina por (fecha, hora, id) sin OFFSET para las páginas profundas
+    pagination_class = BitacoraPagination
     filterset_fields = ['codigousuario', 'fecha', 'accion', 'ip']
     search_fields = ['accion', 'ip']
     ordering_fields = ['id', 'fecha', 'hora']
 
 
+def _login_queryset(email):
+    """Usuario con su Rol, y la contraseña y el token de su auth.User (username = correo) anotados"""
+    auth_user = User.objects.filter(username=OuterRef("correo"))
+    return Usuario.objects.select_related("idrol").filter(correo=email).annotate(
+        auth_user_id=Subquery(auth_user.values("id")[:1]),
+        auth_password=Subquery(auth_user.values("password")[:1]),
+        token_key=Subquery(Token.objects.filter(user__username=OuterRef("correo")).values("key")[:1]),
+    )
+
+
+def _verificar_credenciales(u, password):
+    """
+    Verifica la contraseña con el hash de auth.User (un solo cálculo del
+    hasher configurado). Si el hash usa otros parámetros u otro algoritmo,
+    check_password lo regenera vía `setter`; si no, no se escribe nada.
+
+    Solo sin hash utilizable (primer login, o Usuario.contrasena cambió y la
+    señal lo invalidó) se compara con Usuario.contrasena y el hash queda
+    pendiente de guardar. Con un hash válido no hay segunda contraseña
+    aceptada.
+    """
+    u.auth_password_pendiente = False
+    if u.auth_password and is_password_usable(u.auth_password):
+        def _rehash(raw_password):
+            User.objects.filter(pk=u.auth_user_id).update(password=make_password(raw_password))
+        return check_password(password, u.auth_password, setter=_rehash)
+
+    if u.contrasena is None or not constant_time_compare(u.contrasena, password):
+        return False
+    u.auth_password_pendiente = True
+    return True
+
+
 # CU01. Iniciar sesion
 class LoginView(APIView):
     permission_classes = [permissions.AllowAny]  # sin auth para poder loguear
@@ -784,45 +789,43 @@ class LoginView(APIView):
             return Response({"detail": "email y password son requeridos."},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        # 1) Buscar en TU tabla Usuario
-        try:
-            u = Usuario.objects.get(correo=email)
-        except Usuario.DoesNotExist:
+        # 1) Usuario + Rol + auth.User + token en una sola consulta
+        u = _login_queryset(email).first()
+        if u is None:
             return Response({"detail": "Usuario no existe."}, status=status.HTTP_404_NOT_FOUND)
 
-            # 2) Comparación simple (demo). En prod: NO uses texto plano.
-        if u.contrasena != password:
-            return Response({"detail": "Credenciales inválidas."}, status=status.HTTP_401_UNAUTHORIZED)
-
-        # 2) Comparación simple (demo). En prod: NO uses texto plano.
-        if u.contrasena != password:
+        # 2) Una sola verificación de contraseña (con hash si auth.User ya tiene uno)
+        if not _verificar_credenciales(u, password):
             return Response({"detail": "Credenciales inválidas."}, status=status.HTTP_401_UNAUTHORIZED)
 
-        # 3) Sincronizar/crear auth.User para usar TokenAuth
-        dj_user, _ = User.objects.get_or_create(username=email, defaults={"email": email})
-        if not dj_user.has_usable_password() or not dj_user.check_password(password):
+        # 3) Sincronizar/crear auth.User para usar TokenAuth (solo la primera vez)
+        dj_user_id = u.auth_user_id
+        if dj_user_id is None:
+            dj_user, _ = User.objects.get_or_create(username=email, defaults={"email": email})
             dj_user.set_password(password)
-            dj_user.save()
+            dj_user.save(update_fields=["password"])
+            dj_user_id = dj_user.pk
+        elif u.auth_password_pendiente:
+            User.objects.filter(pk=dj_user_id).update(password=make_password(password))
 
         # 4) Crear/obtener token
-        token, _ = Token.objects.get_or_create(user=dj_user)
+        token_key = u.token_key
+        if token_key is None:
+            token_key = Token.objects.get_or_create(user_id=dj_user_id)[0].key
 
-        # 5) Armar payload con datos del usuario (y rol)
+        # 5) Armar payload con datos del usuario (y rol, ya traído con select_related)
         rol_obj = None
-        if u.idrol_id:
-            try:
-                r = Rol.objects.get(pk=u.idrol_id)
-                rol_obj = {
-                    "id": r.id,
-                    "descripcion": r.descripcion,
-                    "tipo": r.tipo,
-                    "estado": r.estado,
-                }
-            except Rol.DoesNotExist:
-                pass
+        r = u.idrol
+        if r is not None:
+            rol_obj = {
+                "id": r.id,
+                "descripcion": r.descripcion,
+                "tipo": r.tipo,
+                "estado": r.estado,
+            }
 
         return Response({
-            "token": token.key,
+            "token": token_key,
             "user": {
                 "codigo": u.codigo,
                 "nombre": u.nombre,
@@ -897,7 +900,7 @@ class RegisterView(APIView):
         rol_obj = None
         if u.idrol_id:
             try:
-                r = Rol.objects.get(pk=u.idrol_id)
+                r = catalog_get(Rol, u.idrol_id)
                 rol_obj = {
                     "id": r.id,
                     "descripcion": r.descripcion,
@@ -949,7 +952,18 @@ class LogoutView(APIView):
 
 # Agregar estos ViewSets al final de api/views.py, después de LogoutView y antes de AIDetectionViewSet:
 
-class ReconocimientoFacialViewSet(BaseModelViewSet):
+class ImagenDerivadaViewMixin:
+    """Listados con la miniatura y detalle con la imagen completa (se puede forzar con ?image_size=)"""
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['image_size'] = self.request.query_params.get('image_size') or (
+            'tiny' if self.action == 'list' else 'full'
+        )
+        return context
+
+
+class ReconocimientoFacialViewSet(ImagenDerivadaViewMixin, BaseModelViewSet):
     queryset = ReconocimientoFacial.objects.all().order_by('-fecha_deteccion')
     serializer_class = ReconocimientoFacialSerializer
     filterset_fields = ['codigo_usuario', 'es_residente', 'ubicacion_camara', 'estado', 'fecha_deteccion']
@@ -957,16 +971,19 @@ class ReconocimientoFacialViewSet(BaseModelViewSet):
     ordering_fields = ['id', 'fecha_deteccion', 'confianza']
 
 
-class DeteccionPlacaViewSet(BaseModelViewSet):
+class DeteccionPlacaViewSet(ImagenDerivadaViewMixin, BaseModelViewSet):
     queryset = DeteccionPlaca.objects.all().order_by('-fecha_deteccion')
     serializer_class = DeteccionPlacaSerializer
-    filterset_fields = ['placa_detectada', 'vehiculo', 'es_autorizado', 'ubicacion_camara', 'tipo_acceso',
-                        'fecha_deteccion']
+    # placa_detectada se filtra por la clave normalizada en get_queryset
+    filterset_fields = ['vehiculo', 'es_autorizado', 'ubicacion_camara', 'tipo_acceso', 'fecha_deteccion']
     search_fields = ['placa_detectada', 'ubicacion_camara', 'tipo_acceso']
     ordering_fields = ['id', 'fecha_deteccion', 'confianza']
 
+    def get_queryset(self):
+        return _filtrar_por_placa(super().get_queryset(), self.request.query_params, 'placa_detectada')
+
 
-class PerfilFacialViewSet(BaseModelViewSet):
+class PerfilFacialViewSet(ImagenDerivadaViewMixin, BaseModelViewSet):
     queryset = PerfilFacial.objects.all().order_by('-fecha_registro')
     serializer_class = PerfilFacialSerializer
     filterset_fields = ['codigo_usuario', 'activo', 'fecha_registro']
@@ -1034,7 +1051,8 @@ if FacialRecognitionService and PlateDetectionService:
                 worker_endpoint = f"{AI_WORKER_URL}/recognize_face"
 
                 # Hacemos la petición a tu PC
-                response = requests.post(worker_endpoint, files=files, timeout=60)  # Timeout de 60 segundos
+                response = requests.post(worker_endpoint, files=files, data={'camera_location': camera_location},
+                                         timeout=60)  # Timeout de 60 segundos
                 response.raise_for_status()  # Lanza un error si la respuesta no es 2xx
 
                 # El resultado que viene desde tu PC
@@ -1047,7 +1065,8 @@ if FacialRecognitionService and PlateDetectionService:
 
             # 3. Usar el resultado para crear el Reporte de Seguridad (esta lógica se queda aquí)
             try:
-                if not result.get('is_resident'):
+                # Si el worker ya guardó el reporte junto con el reconocimiento, trae 'report_id'
+                if not result.get('is_resident') and 'report_id' not in result:
                     ReporteSeguridad.objects.create(
                         tipo_evento='intruso_detectado',
                         reconocimiento_facial_id=result.get('id'),
@@ -1067,6 +1086,64 @@ if FacialRecognitionService and PlateDetectionService:
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR
                 )
 
+        @action(detail=False, methods=['post'])
+        def recognize_face_sequence(self, request):
+            """Envía una ráfaga de frames (o un clip) al worker y recibe una decisión por persona"""
+            frames = request.FILES.getlist('frames')
+            video = request.FILES.get('video')
+            camera_location = request.data.get('camera_location', 'Principal')
+
+            if not frames and not video:
+                return Response(
+                    {'error': 'Se requieren los frames o un video de la cámara'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            try:
+                if not AI_WORKER_URL:
+                    logger.error("AI_WORKER_URL no está configurada en las variables de entorno.")
+                    return Response({'error': 'El servicio de IA no está configurado'}, status=503)
+
+                if video:
+                    files = [('video', (video.name, video.read(), video.content_type))]
+                else:
+                    files = [('frames', (frame.name, frame.read(), frame.content_type)) for frame in frames]
+
+                data = {'camera_location': camera_location}
+                if request.data.get('stride'):
+                    data['stride'] = request.data.get('stride')
+
+                response = requests.post(f"{AI_WORKER_URL}/recognize_face_sequence", files=files, data=data,
+                                         timeout=120)
+                response.raise_for_status()
+                result = response.json()
+
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Error contactando al worker de IA: {e}")
+                return Response({'error': 'El servicio de IA no está disponible o tardó demasiado en responder'},
+                                status=503)
+
+            try:
+                for track in result.get('tracks', []):
+                    if not track.get('is_resident') and track.get('id'):
+                        ReporteSeguridad.objects.create(
+                            tipo_evento='intruso_detectado',
+                            reconocimiento_facial_id=track.get('id'),
+                            descripcion=f"Persona no identificada detectada en {camera_location}",
+                            nivel_alerta='alto'
+                        )
+
+                logger.info(f"Secuencia procesada por el worker - personas: {len(result.get('tracks', []))}")
+                return Response(result, status=status.HTTP_200_OK)
+
+            except Exception as e:
+                logger.error(f"Error guardando el resultado de la secuencia: {e}")
+                logger.error(f"Traceback: {traceback.format_exc()}")
+                return Response(
+                    {'error': 'Error interno del servidor al procesar el resultado'},
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                )
+
         # ============= REGISTRO DE PERFILES FACIALES =============
         @action(detail=False, methods=['post'])
         def register_profile(self, request):
@@ -1139,7 +1216,7 @@ if FacialRecognitionService and PlateDetectionService:
 
                 # Obtener usuario autenticado desde token
                 try:
-                    usuario = Usuario.objects.get(correo=request.user.email)
+                    usuario = require_usuario(request)
                     logger.info(f"Usuario encontrado: {usuario.nombre} {usuario.apellido}")
                 except Usuario.DoesNotExist:
                     return Response({
@@ -1206,6 +1283,7 @@ if FacialRecognitionService and PlateDetectionService:
                         'user_name': f"{profile.codigo_usuario.nombre} {profile.codigo_usuario.apellido}",
                         'user_email': profile.codigo_usuario.correo,
                         'image_url': profile.imagen_url,
+                        'thumbnail_url': derived_image_url(profile, 'tiny'),
                         'fecha_registro': profile.fecha_registro.isoformat(),
                         'activo': profile.activo
                     })
@@ -1238,7 +1316,7 @@ if FacialRecognitionService and PlateDetectionService:
 
                     # Eliminar imagen de Supabase Storage
                     if perfil.imagen_path:
-                        delete_success = self.storage_service.delete_file(perfil.imagen_path)
+                        delete_success = self.storage_service.delete_file(perfil.imagen_path, released_by=perfil)
                         if not delete_success:
                             logger.warning(f"No se pudo eliminar la imagen {perfil.imagen_path} de Supabase.")
 
@@ -1279,6 +1357,7 @@ if FacialRecognitionService and PlateDetectionService:
                         'user_name': f"{perfil.codigo_usuario.nombre} {perfil.codigo_usuario.apellido}",
                         'user_email': perfil.codigo_usuario.correo,
                         'image_url': perfil.imagen_url,
+                        'thumbnail_url': derived_image_url(perfil, 'tiny'),
                         'fecha_registro': perfil.fecha_registro.isoformat(),
                         'activo': perfil.activo
                     })
@@ -1304,15 +1383,13 @@ if FacialRecognitionService and PlateDetectionService:
 
                 # Eliminar imagen de Supabase Storage
                 if perfil.imagen_path:
-                    self.storage_service.delete_file(perfil.imagen_path)
+                    self.storage_service.delete_file(perfil.imagen_path, released_by=perfil)
 
                 # Eliminar registro
                 user_name = f"{perfil.codigo_usuario.nombre} {perfil.codigo_usuario.apellido}"
+                # La señal de PerfilFacial invalida la galería de este proceso y la del worker
                 perfil.delete()
 
-                # Recargar perfiles faciales en el servicio
-                self.facial_service.load_known_faces()
-
                 return Response({
                     'success': True,
                     'message': f'Perfil facial de {user_name} eliminado exitosamente'
@@ -1352,8 +1429,8 @@ if FacialRecognitionService and PlateDetectionService:
                     image_file, camera_location, access_type
                 )
 
-                # Crear reporte de seguridad si la placa no está autorizada
-                if result['plate'] and not result['is_authorized']:
+                # Crear reporte de seguridad si la placa no está autorizada (una sola vez por evento)
+                if result['plate'] and not result['is_authorized'] and not result.get('duplicate'):
                     ReporteSeguridad.objects.create(
                         tipo_evento='placa_no_autorizada',
                         deteccion_placa_id=result['id'],
@@ -1435,18 +1512,7 @@ def _month_range(yyyy_mm: str):
 
 
 def _bitacora(request, accion: str):
-    try:
-        u = Usuario.objects.get(correo=request.user.email)
-        Bitacora.objects.create(
-            codigo_usuario=u,
-            accion=accion,
-            fecha=timezone.now().date(),
-            hora=timezone.now().time(),
-            ip=request.META.get("HTTP_X_FORWARDED_FOR", "").split(",")[0] or request.META.get(
-                "REMOTE_ADDR") or "0.0.0.0",
-        )
-    except Usuario.DoesNotExist:
-        pass
+    registrar_bitacora(request, accion)
 
 
 # -------- Endpoint: Estado de Cuenta ----------
@@ -1455,7 +1521,7 @@ class EstadoCuentaView(APIView):
 
     def get(self, request):
         try:
-            user = Usuario.objects.get(correo=request.user.email)
+            user = require_usuario(request)
         except Usuario.DoesNotExist:
             return Response({"detail": "Usuario no encontrado."}, status=404)
 
@@ -1471,9 +1537,7 @@ class EstadoCuentaView(APIView):
         ).values_list('id_pago_id', flat=True)
 
         cargos = []
-        pagos_catalogo_qs = Pagos.objects.filter(
-            tipo__in=['Mantenimiento', 'Extraordinaria']
-        )
+        pagos_catalogo_qs = catalog_filter(Pagos, tipo__in=['Mantenimiento', 'Extraordinaria'])
 
         for p in pagos_catalogo_qs:
             cargos.append({
@@ -1527,7 +1591,7 @@ class ComprobantePDFView(APIView):
 
     def get(self, request, pk: int):
         try:
-            user = Usuario.objects.get(correo=request.user.email)
+            user = require_usuario(request)
             factura = (
                 Factura.objects
                 .select_related("id_pago", "codigo_usuario")
@@ -1587,7 +1651,7 @@ class SolicitudMantenimientoViewSet(BaseModelViewSet):
         Residentes ven solo las suyas.
         """
         try:
-            usuario = Usuario.objects.get(correo=self.request.user.email)
+            usuario = require_usuario(self.request)
             if usuario.idrol and usuario.idrol.tipo == 'admin':
                 return SolicitudMantenimiento.objects.all().select_related('codigo_usuario', 'codigo_propiedad',
                                                                            'id_pago')
@@ -1602,7 +1666,7 @@ class SolicitudMantenimientoViewSet(BaseModelViewSet):
         Asigna automáticamente el usuario y su propiedad al crear la solicitud.
         """
         try:
-            usuario = Usuario.objects.get(correo=self.request.user.email)
+            usuario = require_usuario(self.request)
             pertenencia_activa = Pertenece.objects.filter(codigo_usuario=usuario, fecha_fin__isnull=True).first()
             if not pertenencia_activa:
                 raise serializers.ValidationError("No tienes una propiedad activa asignada para crear una solicitud.")
@@ -1639,7 +1703,7 @@ class SolicitudMantenimientoViewSet(BaseModelViewSet):
         Devuelve una lista de todos los items del catálogo de Pagos
         que están marcados como 'Servicio'.
         """
-        servicios = Pagos.objects.filter(tipo='Servicio')
+        servicios = catalog_filter(Pagos, tipo='Servicio')
         serializer = PagoSerializer(servicios, many=True)
         return Response(serializer.data)
 
@@ -1804,7 +1868,8 @@ class PagarCuotaView(APIView):
 
         try:
             with transaction.atomic():
-                usuario = Usuario.objects.get(correo=request.user.email)
+                usuario = require_usuario(request)
+                # El monto va a Stripe: se lee de la tabla, no del cache de catálogos
                 pago_info = Pagos.objects.get(id=id_pago)
 
                 # Validar si ya existe una factura pagada (la lógica de antes)
@@ -2128,7 +2193,7 @@ class HistorialPagosView(APIView):
         export_param = request.query_params.get('export')
 
         try:
-            usuario = Usuario.objects.get(correo=request.user.email)
+            usuario = require_usuario(request)
             history_data = self._get_history_data(usuario)
 
             if export_param == 'pdf':
@@ -2151,7 +2216,7 @@ class MisNotificacionesView(APIView):
 
     def get(self, request):
         try:
-            usuario = Usuario.objects.get(correo=request.user.email)
+            usuario = require_usuario(request)
             # Buscamos en la tabla Envio las notificaciones para este usuario
             envios = Envio.objects.filter(
                 codigo_usuario=usuario
@@ -2186,7 +2251,7 @@ class MiPropiedadView(APIView):
 
     def get(self, request):
         try:
-            usuario = Usuario.objects.get(correo=request.user.email)
+            usuario = require_usuario(request)
 
             # Buscamos la asignación activa (sin fecha de fin o con fecha de fin en el futuro)
             asignacion_activa = Pertenece.objects.filter(
@@ -2221,7 +2286,7 @@ class ActualizarFotoPerfilView(APIView):
 
     def post(self, request, *args, **kwargs):
         try:
-            usuario = Usuario.objects.get(correo=request.user.email)
+            usuario = require_usuario(request)
             image_file = request.FILES.get('avatar')
 
             if not image_file:
@@ -2240,7 +2305,7 @@ class ActualizarFotoPerfilView(APIView):
 
             # Actualizamos el usuario con la nueva URL
             usuario.foto_perfil_url = upload_result['public_url']
-            usuario.save()
+            usuario.save(update_fields=['foto_perfil_url'])
 
             # Devolvemos el objeto de usuario completo y actualizado
             serializer = UsuarioSerializer(usuario)
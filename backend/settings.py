@@ -143,6 +143,30 @@ if "supabase" in _db_url:
 # ------------------------------------
 # Password validators
 # ------------------------------------
+# Hasher de contraseñas de auth.User. Argon2 (si está argon2-cffi) con costo calibrable
+# (`python manage.py benchmark_password_hasher`); PBKDF2 queda para verificar hashes viejos
+# y como respaldo. Cambiar el costo regenera cada hash en el siguiente login de su usuario.
+# Los valores por defecto son los de Django.
+PASSWORD_HASHER_ARGON2 = {
+    "time_cost": int(os.getenv("PASSWORD_ARGON2_TIME_COST", "2")),
+    "memory_cost": int(os.getenv("PASSWORD_ARGON2_MEMORY_COST", "102400")),  # KiB
+    "parallelism": int(os.getenv("PASSWORD_ARGON2_PARALLELISM", "8")),
+}
+PASSWORD_HASHER_PBKDF2_ITERATIONS = int(os.getenv("PASSWORD_PBKDF2_ITERATIONS", "1000000"))
+
+try:
+    import argon2  # noqa: F401
+    ARGON2_AVAILABLE = True
+except ImportError:
+    ARGON2_AVAILABLE = False
+
+PASSWORD_HASHERS = [
+    "api.hashers.TunedPBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+]
+if ARGON2_AVAILABLE and os.getenv("PASSWORD_HASHER", "argon2").lower() == "argon2":
+    PASSWORD_HASHERS.insert(0, "api.hashers.TunedArgon2PasswordHasher")
+
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
     {"NAME": "django.contrib.auth.password_validation.MinimumLengthValidator", "OPTIONS": {"min_length": 8}},
@@ -165,15 +189,43 @@ STATIC_URL = "/static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
+# Imágenes de evidencia cuando AI_STORAGE_BACKEND=local
+MEDIA_URL = "/media/"
+MEDIA_ROOT = Path(os.getenv("MEDIA_ROOT", str(BASE_DIR / "media")))
+
 # ------------------------------------
 # DRF
 # ------------------------------------
+# Cache de Django. Con CACHE_URL (redis://...) es compartido entre procesos: la invalidación de tokens y de
+# catálogos llega a todos. Sin él es un LocMem por proceso, que solo es correcto con un único proceso web
+# (WEB_CONCURRENCY=1); api/checks.py lo hace cumplir
+CACHE_URL = os.getenv("CACHE_URL", "")
+if CACHE_URL:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": CACHE_URL}}
+else:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+# Cache de tokens de CachedTokenAuthentication: TTL (segundos), máximo de entradas en memoria y si se usa
+# el cache de Django (requiere CACHE_URL) en lugar de uno local por proceso
+TOKEN_CACHE_TTL = int(os.getenv("TOKEN_CACHE_TTL", "60"))
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+TOKEN_CACHE_SHARED = os.getenv("TOKEN_CACHE_SHARED", "False").lower() in ("1", "true", "yes")
+
+# Segundos que dura una tabla de catálogo (Rol, Pagos...) en el cache del proceso si no llega una invalidación
+CATALOG_CACHE_TTL = int(os.getenv("CATALOG_CACHE_TTL", "300"))
+
+# Bitácora: se escribe por lotes en un hilo aparte (cada N filas o M ms) salvo AUDIT_LOG_ASYNC=False
+AUDIT_LOG_ASYNC = os.getenv("AUDIT_LOG_ASYNC", "True").lower() in ("1", "true", "yes")
+AUDIT_LOG_BATCH_SIZE = int(os.getenv("AUDIT_LOG_BATCH_SIZE", "100"))
+AUDIT_LOG_FLUSH_MS = int(os.getenv("AUDIT_LOG_FLUSH_MS", "500"))
+
 REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "api.authentication.CachedTokenAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
@@ -229,15 +281,106 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 SUPABASE_STORAGE_BUCKET = os.getenv("SUPABASE_STORAGE_BUCKET", "ai-detection-images")
 SUPABASE_STORAGE_URL = f"{SUPABASE_URL}/storage/v1/object/public/{SUPABASE_STORAGE_BUCKET}"
+# Cada proceso verifica el bucket al primer uso y vuelve a hacerlo pasado este tiempo (segundos)
+SUPABASE_BUCKET_CHECK_TTL = int(os.getenv("SUPABASE_BUCKET_CHECK_TTL", "3600"))
 
 # ------------------------------------
 # Configuración de IA
 # ------------------------------------
+# Secreto compartido con el worker de IA: los endpoints administrativos del worker exigen la cabecera
+# X-Worker-Token con este valor (sin él quedan desactivados)
+AI_WORKER_TOKEN = os.getenv("AI_WORKER_TOKEN", "")
 AI_IMAGE_SETTINGS = {
     'MAX_SIZE': (1920, 1080),
     'THUMBNAIL_SIZE': (800, 600),
     'JPEG_QUALITY': int(os.getenv("AI_JPEG_QUALITY", "85")),
+    # Procesado por tipo de imagen (tamaño por defecto THUMBNAIL_SIZE, calidad por defecto JPEG_QUALITY).
+    # La evidencia de las cámaras prioriza CPU: remuestreo bilineal, sin optimize y sin recomprimir JPEG chicos.
+    'IMAGE_PRESETS': {
+        'evidence': {
+            'quality': int(os.getenv("AI_EVIDENCE_JPEG_QUALITY", "80")),
+            'optimize': False,
+            'resample': 'bilinear',
+            'passthrough_bytes': int(os.getenv("AI_EVIDENCE_PASSTHROUGH_BYTES", str(250 * 1024))),
+            'derivatives': True,
+        },
+        'profile': {'optimize': True, 'resample': 'lanczos', 'derivatives': True},
+        'avatar': {'optimize': True, 'resample': 'lanczos'},
+    },
+    # Versiones reducidas que se generan al subir (presets con 'derivatives') para los listados
+    'IMAGE_DERIVATIVES': {'tiny': (160, 120), 'medium': (480, 360)},
+    'IMAGE_DERIVATIVE_FORMAT': os.getenv("AI_IMAGE_DERIVATIVE_FORMAT", "JPEG"),
+    # Días que se conservan las imágenes de detección, por carpeta y tipo de evento (comando limpiar_imagenes).
+    # Las ligadas a un ReporteSeguridad sin revisar se conservan siempre.
+    'IMAGE_RETENTION_DAYS': {
+        'facial': {
+            'residente': int(os.getenv("AI_RETENTION_FACIAL_RESIDENTE_DAYS", "30")),
+            'desconocido': int(os.getenv("AI_RETENTION_FACIAL_DESCONOCIDO_DAYS", "90")),
+        },
+        'plates': {
+            'autorizada': int(os.getenv("AI_RETENTION_PLACA_AUTORIZADA_DAYS", "30")),
+            'no_autorizada': int(os.getenv("AI_RETENTION_PLACA_NO_AUTORIZADA_DAYS", "90")),
+        },
+    },
+    # Dónde se guardan las imágenes: 'supabase', 'local' (MEDIA_ROOT) o 'memory' (benchmarks)
+    'STORAGE_BACKEND': os.getenv("AI_STORAGE_BACKEND", "supabase"),
+    'STORAGE_UPLOAD_CONCURRENCY': int(os.getenv("AI_STORAGE_UPLOAD_CONCURRENCY", "8")),
+    'STORAGE_UPLOAD_RETRIES': int(os.getenv("AI_STORAGE_UPLOAD_RETRIES", "2")),
+    # Rutas (hash del contenido) que cada proceso recuerda como ya subidas
+    'STORAGE_KNOWN_OBJECTS': int(os.getenv("AI_STORAGE_KNOWN_OBJECTS", "10000")),
     'MAX_FILE_SIZE_MB': 5,
     'FACE_TOLERANCE': float(os.getenv("AI_FACE_TOLERANCE", "0.6")),
+    # Galería compacta: 'float32' (por defecto) o 'int8' para la primera pasada
+    'FACE_GALLERY_PRECISION': os.getenv("AI_FACE_GALLERY_PRECISION", "float32"),
+    'FACE_GALLERY_TOP_K': int(os.getenv("AI_FACE_GALLERY_TOP_K", "5")),
+    # Galería en memoria: segundos antes de reconstruirla aunque nadie la invalide, y encodings exactos
+    # (modo int8) que cada proceso recuerda para no volver a leerlos de la BD en cada reconocimiento
+    'FACE_GALLERY_TTL': int(os.getenv("AI_FACE_GALLERY_TTL", "300")),
+    'FACE_GALLERY_EXACT_CACHE': int(os.getenv("AI_FACE_GALLERY_EXACT_CACHE", "1024")),
+    # Ráfagas de frames: se detecta cada N frames y se sigue cada cara por IoU
+    'FACE_SEQUENCE_STRIDE': int(os.getenv("AI_FACE_SEQUENCE_STRIDE", "3")),
+    'FACE_SEQUENCE_MAX_FRAMES': int(os.getenv("AI_FACE_SEQUENCE_MAX_FRAMES", "60")),
+    'FACE_TRACK_IOU': float(os.getenv("AI_FACE_TRACK_IOU", "0.3")),
+    # Backend de embeddings faciales: 'dlib' (face_recognition) u 'onnx' (YuNet + ONNX Runtime en CPU)
+    'FACE_BACKEND': os.getenv("AI_FACE_BACKEND", "dlib"),
+    'FACE_ONNX_DETECTOR_MODEL': os.getenv("AI_FACE_ONNX_DETECTOR_MODEL", str(BASE_DIR / "models" / "face_detection_yunet.onnx")),
+    'FACE_ONNX_EMBEDDING_MODEL': os.getenv("AI_FACE_ONNX_EMBEDDING_MODEL", str(BASE_DIR / "models" / "face_embedding.onnx")),
+    'FACE_ONNX_TOLERANCE': float(os.getenv("AI_FACE_ONNX_TOLERANCE", "0.5")),
+    'FACE_ONNX_DETECTION_SCORE': float(os.getenv("AI_FACE_ONNX_DETECTION_SCORE", "0.8")),
+    'FACE_ONNX_THREADS': int(os.getenv("AI_FACE_ONNX_THREADS", "0")),
     'PLATE_CONFIDENCE_THRESHOLD': float(os.getenv("AI_PLATE_CONFIDENCE_THRESHOLD", "0.5")),
+    # Índice de placas en memoria: segundos antes de recargarlo aunque nadie lo invalide
+    'PLATE_INDEX_TTL': int(os.getenv("AI_PLATE_INDEX_TTL", "300")),
+    # Distancia máxima (edición ponderada; una confusión típica del OCR cuesta 0.25) para corregir una lectura con
+    # formato inválido a una placa registrada. Solo se aceptan diferencias en caracteres confundibles (0/O, 1/I, 8/B...):
+    # 0.5 = hasta dos confusiones
+    'PLATE_FUZZY_MAX_DISTANCE': float(os.getenv("AI_PLATE_FUZZY_MAX_DISTANCE", "0.5")),
+    # Localización de placas antes del OCR: cuántas regiones leer y qué forma/tamaño (fracción del frame) aceptar
+    'PLATE_MAX_CANDIDATES': int(os.getenv("AI_PLATE_MAX_CANDIDATES", "4")),
+    'PLATE_ASPECT_RANGE': (2.0, 6.0),
+    'PLATE_AREA_RANGE': (0.002, 0.15),
+    # OCR por micro-lotes en el worker: máximo de recortes por llamada y espera máxima para juntarlos
+    'PLATE_OCR_BATCH_SIZE': int(os.getenv("AI_PLATE_OCR_BATCH_SIZE", "16")),
+    'PLATE_OCR_BATCH_WAIT_MS': int(os.getenv("AI_PLATE_OCR_BATCH_WAIT_MS", "15")),
+    # Lecturas repetidas de una placa en la misma cámara dentro de esta ventana forman un solo evento. Solo se
+    # agrupan lecturas con la misma autorización que difieren en caracteres confundibles por el OCR (0.25 cada uno)
+    'PLATE_DEDUP_WINDOW_SECONDS': int(os.getenv("AI_PLATE_DEDUP_WINDOW_SECONDS", "30")),
+    'PLATE_DEDUP_MAX_DISTANCE': float(os.getenv("AI_PLATE_DEDUP_MAX_DISTANCE", "0.5")),
+    # Re-procesamiento de grabaciones: se analiza 1 de cada STRIDE frames, en tramos de CHUNK_FRAMES por proceso
+    'OFFLINE_SCAN_STRIDE': int(os.getenv("AI_OFFLINE_SCAN_STRIDE", "15")),
+    'OFFLINE_SCAN_CHUNK_FRAMES': int(os.getenv("AI_OFFLINE_SCAN_CHUNK_FRAMES", "300")),
+    'OFFLINE_SCAN_WORKERS': int(os.getenv("AI_OFFLINE_SCAN_WORKERS", str(max(1, (os.cpu_count() or 2) - 1)))),
+    # POST /scan_recording del worker: solo grabaciones dentro de OFFLINE_SCAN_ROOT (vacío = endpoint desactivado);
+    # los checkpoints van a un directorio propio del worker, nunca junto a la grabación
+    'OFFLINE_SCAN_ROOT': os.getenv("AI_OFFLINE_SCAN_ROOT", ""),
+    'OFFLINE_SCAN_CHECKPOINT_DIR': os.getenv("AI_OFFLINE_SCAN_CHECKPOINT_DIR", str(BASE_DIR / "scan_checkpoints")),
+    # Pipeline del worker: hilos por etapa (decodificar / inferencia / persistir) y tamaño de cada cola
+    'PIPELINE_DECODE_WORKERS': int(os.getenv("AI_PIPELINE_DECODE_WORKERS", "2")),
+    'PIPELINE_INFERENCE_WORKERS': int(os.getenv("AI_PIPELINE_INFERENCE_WORKERS", "1")),
+    'PIPELINE_PLATE_INFERENCE_WORKERS': int(os.getenv("AI_PIPELINE_PLATE_INFERENCE_WORKERS", "4")),
+    'PIPELINE_PERSIST_WORKERS': int(os.getenv("AI_PIPELINE_PERSIST_WORKERS", "4")),
+    'PIPELINE_QUEUE_SIZE': int(os.getenv("AI_PIPELINE_QUEUE_SIZE", "8")),
+    # Escritura por lotes de reconocimientos/detecciones y sus reportes
+    'BATCH_WRITER_MAX_ROWS': int(os.getenv("AI_BATCH_WRITER_MAX_ROWS", "100")),
+    'BATCH_WRITER_MAX_WAIT_MS': int(os.getenv("AI_BATCH_WRITER_MAX_WAIT_MS", "20")),
 }
\ No newline at end of file
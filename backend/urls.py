@@ -1,11 +1,19 @@
 # En el archivo: backend/urls.py
 
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
+from django.views.static import serve
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     # Esta única línea se encarga de todas las rutas de tu API.
     # Delega todo lo que empiece con 'api/' al archivo de URLs de tu app 'api'.
     path('api/', include('api.urls')),
-]
\ No newline at end of file
+]
+
+# Con el almacenamiento local, Django sirve las imágenes de evidencia (también con DEBUG=False)
+if settings.AI_IMAGE_SETTINGS['STORAGE_BACKEND'] == 'local':
+    urlpatterns += [
+        re_path(r'^media/(?P<path>.*)$', serve, {'document_root': settings.MEDIA_ROOT}),
+    ]
@@ -10,28 +10,300 @@ django.setup()
 # ---------------------------------
 
 # Ahora que Django está configurado, podemos importar el resto.
-from fastapi import FastAPI, UploadFile, File
+import asyncio
+import hashlib
+import hmac
+import io
+import tempfile
+import threading
+import uuid
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from django.conf import settings
+from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException
 from api.services.ai_detection import FacialRecognitionService, PlateDetectionService
+from api.services.pipeline import StagedPipeline
+from api.services.batch_writer import DetectionBatchWriter
+from api.services.plate_index import plate_index
+from api.services.face_index import face_index
+from api.services.plate_dedup import plate_events
+from api.services.offline_scan import OfflineScanner, parse_recording_start
 import uvicorn
 
-app = FastAPI()
+# Estado del worker: se construye en el arranque de la app (lifespan), no al importar el módulo. Los procesos
+# 'spawn' del escaneo de grabaciones vuelven a importar este archivo y no deben cargar modelos ni pipelines.
+facial_service: Optional[FacialRecognitionService] = None
+plate_service: Optional[PlateDetectionService] = None
+detection_writer: Optional[DetectionBatchWriter] = None
+face_pipeline: Optional[StagedPipeline] = None
+plate_pipeline: Optional[StagedPipeline] = None
 
-# Esta parte necesita que Django esté cargado para acceder a los settings.
-facial_service = FacialRecognitionService()
-plate_service = PlateDetectionService()
+
+# --- Etapas del pipeline: decodificar -> inferencia -> persistir ---
+
+# Los trabajos de secuencia (ráfaga de frames o clip) pasan por las mismas etapas que una imagen suelta:
+# su detección y codificación ocupan el mismo hilo de inferencia que el resto de las caras
+
+def decode_face(job):
+    if 'frames' in job:
+        job['sampled'], job['frames_received'] = facial_service.sample_frames(job['frames'], job['stride'])
+    elif 'video_path' in job:
+        job['sampled'], job['frames_received'] = facial_service.sample_video(job['video_path'], job['stride'])
+    else:
+        job['image'] = facial_service._file_to_image(io.BytesIO(job['data']))
+    return job
+
+
+def analyze_face(job):
+    if 'sampled' in job:
+        job['tracked'] = facial_service.track_faces(job['sampled'])
+    elif job['image'] is None:
+        job['analysis'] = (False, None, 0.0)
+    else:
+        job['analysis'] = facial_service.analyze_image(job['image'])
+    return job
+
+
+def persist_face(job):
+    if 'tracked' in job:
+        return facial_service.persist_tracks(job['tracked'], job['camera_location'], job['frames_received'],
+                                             len(job['sampled']), job['stride'])
+    is_resident, usuario, confidence = job['analysis']
+    return facial_service.persist_recognition_batched(
+        detection_writer, is_resident, usuario, confidence, io.BytesIO(job['data']), job['camera_location']
+    )
+
+
+def decode_plate(job):
+    job['image'] = plate_service._file_to_image(io.BytesIO(job['data']))
+    return job
+
+
+def analyze_plate(job):
+    job['analysis'] = (None, False, 0.0) if job['image'] is None else plate_service.analyze_plate(job['image'])
+    return job
+
+
+def persist_plate(job):
+    plate, is_authorized, confidence = job['analysis']
+    return plate_service.persist_detection_deduplicated(
+        detection_writer, plate, is_authorized, confidence, io.BytesIO(job['data']),
+        job['camera_location'], job['access_type']
+    )
+
+
+def build_pipeline(decode, analyze, persist, inference_workers: int) -> StagedPipeline:
+    ai_settings = settings.AI_IMAGE_SETTINGS
+    return StagedPipeline([
+        ('decode', decode, ai_settings['PIPELINE_DECODE_WORKERS']),
+        ('inference', analyze, inference_workers),
+        ('persist', persist, ai_settings['PIPELINE_PERSIST_WORKERS']),
+    ], queue_size=ai_settings['PIPELINE_QUEUE_SIZE'])
+
+
+def build_worker_state():
+    global facial_service, plate_service, detection_writer, face_pipeline, plate_pipeline
+    ai_settings = settings.AI_IMAGE_SETTINGS
+    facial_service = FacialRecognitionService()
+    plate_service = PlateDetectionService(ocr_batching=True)
+
+    # Los resultados (y sus reportes de seguridad) se escriben por lotes cada pocos milisegundos
+    detection_writer = DetectionBatchWriter(
+        max_batch=ai_settings['BATCH_WRITER_MAX_ROWS'],
+        max_wait_ms=ai_settings['BATCH_WRITER_MAX_WAIT_MS']
+    )
+
+    face_pipeline = build_pipeline(decode_face, analyze_face, persist_face, ai_settings['PIPELINE_INFERENCE_WORKERS'])
+    # Varios hilos de inferencia de placas: localizan en paralelo y esperan juntos al lote de OCR
+    plate_pipeline = build_pipeline(decode_plate, analyze_plate, persist_plate,
+                                    ai_settings['PIPELINE_PLATE_INFERENCE_WORKERS'])
+
+
+async def close_plate_events_periodically():
+    # Guarda el total de lecturas de los eventos de placa que ya vencieron
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(5)
+        await loop.run_in_executor(None, plate_service.close_plate_events)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    build_worker_state()
+    await face_pipeline.start()
+    await plate_pipeline.start()
+    closer = asyncio.create_task(close_plate_events_periodically())
+    yield
+    closer.cancel()
+    await face_pipeline.stop()
+    await plate_pipeline.stop()
+    detection_writer.close()
+    plate_service.ocr_batcher.close()
+    # Con el escritor ya vaciado, todos los eventos abiertos tienen su id de detección
+    plate_service.close_plate_events(plate_events.expire(force=True))
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 @app.post("/recognize_face")
-def recognize_face_endpoint(image: UploadFile = File(...)):
-    # Pasamos el archivo directamente al servicio.
-    result = facial_service.recognize_face_from_file(image.file)
-    return result
+async def recognize_face_endpoint(image: UploadFile = File(...),
+                                  camera_location: str = Form("Principal")):
+    # Las peticiones consecutivas se solapan: mientras una está en inferencia
+    # la anterior se sube a Supabase y la siguiente se decodifica.
+    data = await image.read()
+    saved = await face_pipeline.submit({'data': data, 'camera_location': camera_location})
+    # La etapa de persistencia devuelve el Future del escritor por lotes (ids reales al resolverse)
+    return await asyncio.wrap_future(saved)
+
+
+@app.post("/recognize_face_sequence")
+async def recognize_face_sequence_endpoint(frames: Optional[List[UploadFile]] = File(None),
+                                           video: Optional[UploadFile] = File(None),
+                                           camera_location: str = Form("Principal"),
+                                           stride: Optional[int] = Form(None)):
+    # Una ráfaga de frames (o un clip corto) de una sola cámara: una decisión por persona.
+    job = {'camera_location': camera_location, 'stride': max(1, stride or facial_service.sequence_stride)}
+    if video is not None:
+        suffix = os.path.splitext(video.filename or "")[1] or ".mp4"
+        # El clip tiene que seguir en disco hasta que la etapa de decodificación lo lea
+        with tempfile.NamedTemporaryFile(suffix=suffix) as clip:
+            clip.write(await video.read())
+            clip.flush()
+            job['video_path'] = clip.name
+            return await face_pipeline.submit(job)
+
+    if not frames:
+        raise HTTPException(status_code=400, detail="Se requieren frames o un video")
+
+    job['frames'] = [await frame.read() for frame in frames]
+    return await face_pipeline.submit(job)
 
 
 @app.post("/detect_plate")
-def detect_plate_endpoint(image: UploadFile = File(...)):
-    result = plate_service.detect_plate_from_file(image.file)
-    return result
+async def detect_plate_endpoint(image: UploadFile = File(...),
+                                camera_location: str = Form("Estacionamiento"),
+                                access_type: str = Form("entrada")):
+    data = await image.read()
+    saved = await plate_pipeline.submit({
+        'data': data,
+        'camera_location': camera_location,
+        'access_type': access_type
+    })
+    return await asyncio.wrap_future(saved)
+
+
+def require_worker_token(token: Optional[str]):
+    # Endpoints administrativos: sin AI_WORKER_TOKEN configurado quedan desactivados
+    if not settings.AI_WORKER_TOKEN:
+        raise HTTPException(status_code=503, detail="AI_WORKER_TOKEN no está configurado en el worker")
+    if not token or not hmac.compare_digest(token, settings.AI_WORKER_TOKEN):
+        raise HTTPException(status_code=401, detail="Token del worker inválido")
+
+
+@app.post("/invalidate_plates")
+def invalidate_plates_endpoint(x_worker_token: Optional[str] = Header(None)):
+    # Lo llama Django (con X-Worker-Token) cuando se crea, edita o borra un vehículo
+    require_worker_token(x_worker_token)
+    plate_index.invalidate()
+    return {'invalidated': True}
+
+
+@app.post("/invalidate_faces")
+def invalidate_faces_endpoint(x_worker_token: Optional[str] = Header(None)):
+    # Lo llama Django (con X-Worker-Token) cuando se crea, edita o borra un perfil facial
+    require_worker_token(x_worker_token)
+    face_index.invalidate()
+    return {'invalidated': True}
+
+
+# Escaneos de grabaciones en curso o terminados, por id de trabajo
+scan_jobs = {}
+
+
+def run_scan_job(job_id: str, scanner: OfflineScanner):
+    job = scan_jobs[job_id]
+    try:
+        job['result'] = scanner.run()
+        job['status'] = 'completed'
+    except Exception as e:
+        job['status'] = 'failed'
+        job['error'] = str(e)
+
+
+def resolve_recording(path: str) -> str:
+    """Ruta real de la grabación, que debe quedar dentro de OFFLINE_SCAN_ROOT (también tras seguir enlaces)"""
+    root = settings.AI_IMAGE_SETTINGS['OFFLINE_SCAN_ROOT']
+    if not root:
+        raise HTTPException(status_code=503, detail="AI_OFFLINE_SCAN_ROOT no está configurado en el worker")
+    root = os.path.realpath(root)
+    source = os.path.realpath(os.path.join(root, path))
+    if source == root or os.path.commonpath([root, source]) != root:
+        raise HTTPException(status_code=400, detail="La grabación debe estar dentro del directorio de grabaciones")
+    return source
+
+
+def checkpoint_for(source: str) -> str:
+    # Un checkpoint por grabación en el directorio del worker, nunca junto a la grabación
+    directory = settings.AI_IMAGE_SETTINGS['OFFLINE_SCAN_CHECKPOINT_DIR']
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{hashlib.sha256(source.encode()).hexdigest()[:32]}.scan.json")
+
+
+@app.post("/scan_recording")
+def scan_recording_endpoint(path: str = Form(...),
+                            camera_location: str = Form("Principal"),
+                            kinds: str = Form("plates,faces"),
+                            stride: Optional[int] = Form(None),
+                            create_reports: bool = Form(False),
+                            recorded_at: Optional[str] = Form(None),
+                            x_worker_token: Optional[str] = Header(None)):
+    # Re-procesa una grabación que ya está en disco del worker (ruta relativa a AI_OFFLINE_SCAN_ROOT);
+    # se consulta con GET /scan_recording/{job_id}
+    require_worker_token(x_worker_token)
+    source = resolve_recording(path)
+    try:
+        started = parse_recording_start(recorded_at)
+        scanner = OfflineScanner(
+            source,
+            camera_location,
+            kinds=tuple(kind.strip() for kind in kinds.split(',') if kind.strip()),
+            stride=stride or settings.AI_IMAGE_SETTINGS['OFFLINE_SCAN_STRIDE'],
+            workers=settings.AI_IMAGE_SETTINGS['OFFLINE_SCAN_WORKERS'],
+            chunk_frames=settings.AI_IMAGE_SETTINGS['OFFLINE_SCAN_CHUNK_FRAMES'],
+            checkpoint_path=checkpoint_for(source),
+            create_reports=create_reports,
+            recorded_at=started
+        )
+    except FileNotFoundError:
+        raise HTTPException(status_code=400, detail="No existe la grabación")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    job_id = uuid.uuid4().hex
+    scan_jobs[job_id] = {'status': 'running', 'progress': None}
+    scanner.progress = lambda progress: scan_jobs[job_id].update(progress=progress)
+    threading.Thread(target=run_scan_job, args=(job_id, scanner), name=f"scan-{job_id[:8]}", daemon=True).start()
+    return {'job_id': job_id}
+
+
+@app.get("/scan_recording/{job_id}")
+def scan_recording_status_endpoint(job_id: str, x_worker_token: Optional[str] = Header(None)):
+    require_worker_token(x_worker_token)
+    if job_id not in scan_jobs:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return scan_jobs[job_id]
+
+
+@app.get("/pipeline_stats")
+def pipeline_stats_endpoint(x_worker_token: Optional[str] = Header(None)):
+    require_worker_token(x_worker_token)
+    return {
+        'face': face_pipeline.stats(),
+        'plate': plate_pipeline.stats(),
+        'writer': {'batches': detection_writer.batches, 'rows': detection_writer.items},
+        'ocr': {'batches': plate_service.ocr_batcher.batches, 'crops': plate_service.ocr_batcher.items}
+    }
 
 
 if __name__ == "__main__":